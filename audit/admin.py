@@ -2,7 +2,7 @@
 Admin configuration for audit module.
 """
 from django.contrib import admin
-from .models import AuditLog
+from .models import AuditLog, AuditCheckpoint
 
 
 @admin.register(AuditLog)
@@ -13,10 +13,13 @@ class AuditLogAdmin(admin.ModelAdmin):
     ]
     list_filter = ['action_type', 'entity_type', 'created_at']
     search_fields = ['actor_name', 'entity_type', 'entity_id']
+    # Skip the unfiltered COUNT(*) over the whole log on every page
+    show_full_result_count = False
     readonly_fields = [
         'action_type', 'entity_type', 'entity_id', 'user',
         'actor_name', 'old_values', 'new_values', 'metadata',
-        'ip_address', 'user_agent', 'created_at'
+        'ip_address', 'user_agent', 'created_at', 'event_id',
+        'prev_hash', 'entry_hash'
     ]
     
     def has_add_permission(self, request):
@@ -26,3 +29,18 @@ class AuditLogAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         """Prevent deletion of audit logs."""
         return False
+
+
+@admin.register(AuditCheckpoint)
+class AuditCheckpointAdmin(admin.ModelAdmin):
+    list_display = ['sequence', 'entry_id', 'created_at', 'verified_at']
+    list_filter = ['verified_at']
+    readonly_fields = ['entry_id', 'entry_hash', 'sequence', 'created_at', 'verified_at']
+    
+    def has_add_permission(self, request):
+        """Checkpoints are written by the audit chain only."""
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        """Prevent deletion of checkpoints."""
+        return False
@@ -0,0 +1,321 @@
+"""
+Monthly roll-off of audit entries into compressed, indexed segment files.
+
+Closed months are moved out of the live AuditLog table into
+``audit-YYYY-MM.jsonl.gz`` segments. A segment is a series of independent
+gzip members, each holding a block of JSON lines sorted by entity, and the
+``.idx`` file beside it lists ``entity_type, entity_id, offset, length`` for
+every block an entity appears in, in the same order. Looking up an entity
+binary-searches the index and decompresses only its blocks.
+"""
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.functions import Collate
+from django.utils import timezone
+from .models import AuditLog, AuditCheckpoint
+
+
+SEGMENT_SUFFIX = '.jsonl.gz'
+INDEX_SUFFIX = '.idx'
+MANIFEST_SUFFIX = '.json'
+
+EXPORTED_FIELDS = (
+    'id', 'event_id', 'action_type', 'entity_type', 'entity_id', 'user_id',
+    'actor_name', 'old_values', 'new_values', 'metadata', 'ip_address',
+    'user_agent', 'created_at', 'prev_hash', 'entry_hash',
+)
+
+
+class ArchiveError(Exception):
+    """Raised when a month cannot be archived safely."""
+
+
+class NothingToArchive(ArchiveError):
+    """Raised when a month has no live entries left to export."""
+
+
+def archive_dir():
+    return Path(settings.AUDIT_ARCHIVE_DIR)
+
+
+def month_bounds(month):
+    """
+    Return the UTC [start, end) datetimes of a 'YYYY-MM' month.
+    """
+    start = datetime.strptime(month, '%Y-%m').replace(tzinfo=dt_timezone.utc)
+    if start.month == 12:
+        end = start.replace(year=start.year + 1, month=1)
+    else:
+        end = start.replace(month=start.month + 1)
+    return start, end
+
+
+def closed_months(now=None):
+    """
+    Months old enough to leave the live table, oldest first.
+
+    The current month and the AUDIT_LIVE_MONTHS before it stay live; months
+    without live entries (such as gaps after an archived month) are skipped.
+    """
+    now = now or datetime.now(dt_timezone.utc)
+    keep = settings.AUDIT_LIVE_MONTHS
+    year, month = now.year, now.month - keep
+    while month < 1:
+        year, month = year - 1, month + 12
+    cutoff = datetime(year, month, 1, tzinfo=dt_timezone.utc)
+
+    oldest = AuditLog.objects.order_by('created_at').values_list('created_at', flat=True).first()
+    months = []
+    if oldest is None:
+        return months
+    cursor = datetime(oldest.year, oldest.month, 1, tzinfo=dt_timezone.utc)
+    while cursor < cutoff:
+        month = cursor.strftime('%Y-%m')
+        start, cursor = month_bounds(month)
+        if AuditLog.objects.filter(created_at__gte=start, created_at__lt=cursor).exists():
+            months.append(month)
+    return months
+
+
+def _segment_paths(month, directory=None):
+    base = (directory or archive_dir()) / f'audit-{month}'
+    return (
+        base.with_name(base.name + SEGMENT_SUFFIX),
+        base.with_name(base.name + INDEX_SUFFIX),
+        base.with_name(base.name + MANIFEST_SUFFIX),
+    )
+
+
+def _archived_through(month, directory):
+    """Last entry id exported to the segments of months before ``month``."""
+    last_id = 0
+    for path in directory.glob(f'audit-*{MANIFEST_SUFFIX}'):
+        if path.name[len('audit-'):-len(MANIFEST_SUFFIX)] < month:
+            last_id = max(last_id, json.loads(path.read_text())['last_id'])
+    return last_id
+
+
+def _row_to_json(row):
+    row = dict(row)
+    row['created_at'] = row['created_at'].astimezone(dt_timezone.utc).isoformat()
+    if row['event_id'] is not None:
+        row['event_id'] = str(row['event_id'])
+    return json.dumps(row, separators=(',', ':'), default=str)
+
+
+def _entity_ordering():
+    # Index lookups compare entity types bytewise; make the database agree
+    if connection.vendor == 'postgresql':
+        return Collate('entity_type', 'C')
+    return 'entity_type'
+
+
+def archive_month(month, directory=None, block_rows=1000, chunk_size=5000, delete=True):
+    """
+    Export one closed month to a segment file and drop it from the live table.
+
+    Months are archived oldest first; live entries from earlier months are
+    swept into the segment as well, starting after the last entry of the
+    previous segment (which is still live with ``delete=False``).
+
+    Only entries already covered by a verified hash-chain checkpoint can be
+    archived. A verified checkpoint is recorded at the month's last chained
+    entry so verification of the live table can start right after it.
+
+    Args:
+        month: Month in 'YYYY-MM' form
+        directory: Output directory (defaults to AUDIT_ARCHIVE_DIR)
+        block_rows: Target rows per compressed block
+        chunk_size: Rows fetched per query while exporting and deleting
+        delete: Remove the exported rows from the live table
+
+    Returns:
+        dict: The segment manifest
+    """
+    directory = Path(directory or archive_dir())
+    directory.mkdir(parents=True, exist_ok=True)
+    _, end = month_bounds(month)
+
+    # Cut at an id so the live chain stays contiguous; buffered writes can put
+    # a few early next-month entries below it, and they travel with the month
+    after = _archived_through(month, directory)
+    last_id = AuditLog.objects.filter(
+        id__gt=after, created_at__lt=end
+    ).order_by('-id').values_list('id', flat=True).first()
+    if last_id is None:
+        raise NothingToArchive(f'No live audit entries for {month}.')
+    rows = AuditLog.objects.filter(id__gt=after, id__lte=last_id)
+    first_id = rows.order_by('id').values_list('id', flat=True).first()
+
+    verified = AuditCheckpoint.objects.filter(
+        verified_at__isnull=False
+    ).order_by('-entry_id').values_list('entry_id', flat=True).first() or 0
+    if last_id > verified:
+        raise ArchiveError(
+            f'{month} has entries after the last verified checkpoint ({verified}); '
+            'run verify_audit_chain first.'
+        )
+    segment_path, index_path, manifest_path = _segment_paths(month, directory)
+    tmp_segment = segment_path.with_name(segment_path.name + '.tmp')
+    tmp_index = index_path.with_name(index_path.name + '.tmp')
+
+    digest = hashlib.sha256()
+    count = 0
+    with open(tmp_segment, 'wb') as segment, open(tmp_index, 'w', encoding='utf-8') as index:
+        block, block_keys = [], []
+        last_key = None
+
+        def emit():
+            offset = segment.tell()
+            data = gzip.compress(''.join(block).encode('utf-8'))
+            segment.write(data)
+            digest.update(data)
+            for key in block_keys:
+                index.write(f'{key[0]}\t{key[1]}\t{offset}\t{len(data)}\n')
+            block.clear()
+            block_keys.clear()
+
+        # A streaming cursor keeps memory flat regardless of month size
+        ordering = (_entity_ordering(), 'entity_id', 'id')
+        for row in rows.order_by(*ordering).values(*EXPORTED_FIELDS).iterator(chunk_size=chunk_size):
+            key = (row['entity_type'], row['entity_id'])
+            if key != last_key and len(block) >= block_rows:
+                emit()
+            if not block_keys or block_keys[-1] != key:
+                block_keys.append(key)
+            block.append(_row_to_json(row) + '\n')
+            last_key = key
+            count += 1
+        if block:
+            emit()
+
+    last_entry = AuditLog.objects.filter(id=last_id).values('entry_hash').first()
+    manifest = {
+        'month': month,
+        'rows': count,
+        'first_id': first_id,
+        'last_id': last_id,
+        'last_entry_hash': last_entry['entry_hash'],
+        'segment_sha256': digest.hexdigest(),
+        'created_at': datetime.now(dt_timezone.utc).isoformat(),
+    }
+    os.replace(tmp_segment, segment_path)
+    os.replace(tmp_index, index_path)
+    manifest_path.write_text(json.dumps(manifest, indent=2))
+
+    if delete:
+        _record_boundary_checkpoint(last_id, last_entry['entry_hash'])
+        _delete_rows(rows, chunk_size)
+    return manifest
+
+
+def _record_boundary_checkpoint(entry_id, entry_hash):
+    """Make sure a verified checkpoint sits on the last archived entry."""
+    if not entry_hash or AuditCheckpoint.objects.filter(entry_id=entry_id).exists():
+        return
+    previous = AuditCheckpoint.objects.filter(entry_id__lt=entry_id).order_by('-entry_id').first()
+    if previous is None:
+        return
+    between = AuditLog.objects.filter(id__gt=previous.entry_id, id__lte=entry_id).count()
+    AuditCheckpoint.objects.create(
+        entry_id=entry_id,
+        entry_hash=entry_hash,
+        sequence=previous.sequence + between,
+        verified_at=timezone.now()
+    )
+
+
+def _delete_rows(rows, chunk_size):
+    """Delete exported rows in id chunks; queryset deletes bypass AuditLog.delete()."""
+    while True:
+        ids = list(rows.order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return
+        with transaction.atomic():
+            AuditLog.objects.filter(id__in=ids).delete()
+
+
+def _entity_key(line):
+    entity_type, entity_id, _ = line.split('\t', 2)
+    return entity_type, int(entity_id)
+
+
+def _index_blocks(index_path, key):
+    """
+    Binary-search a sorted index file for an entity's blocks.
+
+    Returns:
+        list: (offset, length) of every block holding the entity
+    """
+    target = (key[0], int(key[1]))
+    blocks = []
+    with open(index_path, 'rb') as index:
+        index.seek(0, os.SEEK_END)
+        lo, hi = 0, index.tell()
+        # Find the first line whose key is >= target
+        while lo < hi:
+            mid = (lo + hi) // 2
+            index.seek(mid)
+            if mid:
+                index.readline()
+            line = index.readline()
+            if not line or _entity_key(line.decode('utf-8')) >= target:
+                hi = mid
+            else:
+                lo = mid + 1
+        index.seek(lo)
+        if lo:
+            index.readline()
+        for raw in index:
+            line = raw.decode('utf-8')
+            if _entity_key(line) != target:
+                break
+            _, _, offset, length = line.rstrip('\n').split('\t')
+            blocks.append((int(offset), int(length)))
+    return blocks
+
+
+def list_segments(directory=None):
+    """Archived months with a segment on disk, newest first."""
+    directory = Path(directory or archive_dir())
+    if not directory.exists():
+        return []
+    months = [
+        path.name[len('audit-'):-len(SEGMENT_SUFFIX)]
+        for path in directory.glob(f'audit-*{SEGMENT_SUFFIX}')
+    ]
+    return sorted(months, reverse=True)
+
+
+def search_archive(entity_type, entity_id, directory=None):
+    """
+    Read an entity's archived history, newest entries first.
+
+    Returns:
+        list: Row dicts as exported (created_at as an ISO string)
+    """
+    results = []
+    for month in list_segments(directory):
+        segment_path, index_path, _ = _segment_paths(month, Path(directory or archive_dir()))
+        if not index_path.exists():
+            continue
+        blocks = _index_blocks(index_path, (entity_type, entity_id))
+        if not blocks:
+            continue
+        month_rows = []
+        with open(segment_path, 'rb') as segment:
+            for offset, length in blocks:
+                segment.seek(offset)
+                for line in gzip.decompress(segment.read(length)).decode('utf-8').splitlines():
+                    row = json.loads(line)
+                    if row['entity_type'] == entity_type and row['entity_id'] == int(entity_id):
+                        month_rows.append(row)
+        month_rows.sort(key=lambda row: row['id'], reverse=True)
+        results.extend(month_rows)
+    return results
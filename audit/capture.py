@@ -0,0 +1,142 @@
+"""
+Automatic audit capture for billing and payment models.
+
+Models mix in ``AuditTrackedMixin`` and list the attributes worth auditing.
+The values an instance was loaded with are remembered in ``from_db``, so the
+"before" state of a change is diffed in memory without another SELECT.
+"""
+from contextvars import ContextVar
+from datetime import date, datetime
+from decimal import Decimal
+from django.conf import settings
+from .writer import record_action
+
+
+_current_request = ContextVar('audit_current_request', default=None)
+
+
+def _jsonable(value):
+    """Convert a field value to the form stored in AuditLog JSON columns."""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def set_current_request(request):
+    """Bind the request whose user is recorded as the actor. Returns a reset token."""
+    return _current_request.set(request)
+
+
+def reset_current_request(token):
+    _current_request.reset(token)
+
+
+def current_request():
+    """The request bound by AuditContextMiddleware, or None outside one."""
+    return _current_request.get()
+
+
+def actor_context():
+    """
+    Describe who is acting, from the request bound by AuditContextMiddleware.
+
+    DRF authenticates inside the view and sets ``user`` on the underlying
+    request, so it is read here at capture time rather than in the middleware.
+
+    Returns:
+        dict: actor_name, user, ip_address and user_agent for log_action
+    """
+    request = _current_request.get()
+    if request is None:
+        return {'actor_name': 'system', 'user': None, 'ip_address': None, 'user_agent': ''}
+
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        actor_name = user.get_username()
+    else:
+        user = None
+        actor_name = 'anonymous'
+    return {
+        'actor_name': actor_name,
+        'user': user,
+        'ip_address': request.META.get('REMOTE_ADDR') or None,
+        'user_agent': request.META.get('HTTP_USER_AGENT', ''),
+    }
+
+
+def capture(action_type, instance, old_values=None, new_values=None, metadata=None):
+    """
+    Record an audit event for a model instance if capture is enabled.
+
+    Args:
+        action_type: One of AuditLog.ACTION_TYPES
+        instance: The affected model instance
+        old_values: Changed fields before the write
+        new_values: Changed fields after the write
+        metadata: Additional context
+    """
+    if not settings.AUDIT_CAPTURE:
+        return
+    record_action(
+        action_type=action_type,
+        entity_type=instance.__class__.__name__,
+        entity_id=instance.pk,
+        old_values=old_values,
+        new_values=new_values,
+        metadata=metadata,
+        **actor_context()
+    )
+
+
+class AuditTrackedMixin:
+    """
+    Remembers loaded values of ``audit_fields`` and reports changes on save.
+
+    Subclasses override ``audit_saved(created, old_values, new_values)`` to
+    decide which changes are worth an audit entry.
+    """
+    audit_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._audit_loaded = instance.audit_snapshot()
+        return instance
+
+    def audit_snapshot(self):
+        """Current values of the tracked attributes that are loaded on this instance."""
+        return {
+            name: _jsonable(self.__dict__[name])
+            for name in self.audit_fields
+            if name in self.__dict__
+        }
+
+    def audit_changes(self):
+        """
+        Diff tracked attributes against the values last loaded or saved.
+
+        Returns:
+            tuple: (old_values, new_values) holding only changed attributes
+        """
+        loaded = getattr(self, '_audit_loaded', None)
+        current = self.audit_snapshot()
+        if loaded is None:
+            return {}, current
+        old_values, new_values = {}, {}
+        for name, value in current.items():
+            if name in loaded and loaded[name] != value:
+                old_values[name] = loaded[name]
+                new_values[name] = value
+        return old_values, new_values
+
+    def save(self, *args, **kwargs):
+        created = self._state.adding
+        old_values, new_values = self.audit_changes()
+        super().save(*args, **kwargs)
+        self._audit_loaded = self.audit_snapshot()
+        self.audit_saved(created, old_values, new_values)
+
+    def audit_saved(self, created, old_values, new_values):
+        """Hook called after save with the changes made by it."""
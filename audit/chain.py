@@ -0,0 +1,214 @@
+"""
+Tamper-evident hash chain over the audit log.
+
+Every entry stores the hash of its predecessor and a SHA-256 over its own
+content plus that predecessor hash, so editing, deleting or reordering rows
+in the database breaks the chain from that point on. Every
+AUDIT_CHECKPOINT_INTERVAL entries the chain state is written to
+AuditCheckpoint; verification resumes from the newest verified checkpoint.
+"""
+import hashlib
+import json
+from dataclasses import dataclass
+from datetime import timezone as dt_timezone
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import AuditLog, AuditChainHead, AuditCheckpoint
+
+
+HASHED_FIELDS = (
+    'event_id', 'action_type', 'entity_type', 'entity_id', 'user_id',
+    'actor_name', 'old_values', 'new_values', 'metadata',
+    'ip_address', 'user_agent', 'created_at',
+)
+
+
+def compute_hash(prev_hash, values):
+    """
+    Hash one entry.
+
+    Args:
+        prev_hash: entry_hash of the preceding entry ('' at the start)
+        values: Mapping holding HASHED_FIELDS as read from the model or database
+
+    Returns:
+        str: Hex SHA-256 digest
+    """
+    created_at = values['created_at']
+    event_id = values['event_id']
+    payload = [
+        prev_hash,
+        str(event_id) if event_id is not None else None,
+        values['action_type'],
+        values['entity_type'],
+        values['entity_id'],
+        values['user_id'],
+        values['actor_name'],
+        values['old_values'],
+        values['new_values'],
+        values['metadata'],
+        values['ip_address'],
+        values['user_agent'],
+        created_at.astimezone(dt_timezone.utc).isoformat(),
+    ]
+    encoded = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def _instance_values(entry):
+    return {name: getattr(entry, name) for name in HASHED_FIELDS}
+
+
+def append_entries(entries):
+    """
+    Chain and insert new AuditLog instances in one transaction.
+
+    The chain head row is locked for the duration, which serializes audit
+    writers; batching through the buffered writer keeps that cheap. Call it
+    in its own transaction, not one doing other work (``record_action``
+    waits for the audited transaction to commit).
+
+    Args:
+        entries: Unsaved AuditLog instances, in the order they happened
+
+    Returns:
+        list: The inserted instances with ids and hashes set
+    """
+    if not entries:
+        return entries
+    interval = settings.AUDIT_CHECKPOINT_INTERVAL
+
+    with transaction.atomic():
+        head, _ = AuditChainHead.objects.select_for_update().get_or_create(pk=1)
+        prev_hash = head.last_hash
+        for entry in entries:
+            if entry.created_at is None:
+                entry.created_at = timezone.now()
+            entry.prev_hash = prev_hash
+            entry.entry_hash = compute_hash(prev_hash, _instance_values(entry))
+            prev_hash = entry.entry_hash
+
+        AuditLog.objects.bulk_create(entries)
+
+        checkpoints = []
+        sequence = head.sequence
+        for entry in entries:
+            sequence += 1
+            if interval and sequence % interval == 0:
+                checkpoints.append(AuditCheckpoint(
+                    entry_id=entry.pk,
+                    entry_hash=entry.entry_hash,
+                    sequence=sequence
+                ))
+        if checkpoints:
+            AuditCheckpoint.objects.bulk_create(checkpoints)
+
+        head.last_entry_id = entries[-1].pk
+        head.last_hash = prev_hash
+        head.sequence = sequence
+        head.save(update_fields=['last_entry_id', 'last_hash', 'sequence'])
+    return entries
+
+
+@dataclass
+class VerificationResult:
+    """Outcome of a chain verification run."""
+    start_entry_id: int
+    entries_checked: int = 0
+    checkpoints_verified: int = 0
+    last_entry_id: int = 0
+    broken_entry_id: int = None
+    reason: str = ''
+
+    @property
+    def ok(self):
+        return self.broken_entry_id is None
+
+
+def verify_chain(full=False, chunk_size=5000):
+    """
+    Re-hash the audit log and compare it with the stored chain.
+
+    Entries are streamed in id order with keyset pagination, so memory use
+    is bounded by ``chunk_size``. Checkpoints passed without a break are
+    marked verified, letting the next run start after them.
+
+    Args:
+        full: Start from the oldest checkpoint instead of the newest verified one
+        chunk_size: Rows fetched per query
+
+    Returns:
+        VerificationResult
+    """
+    checkpoints = AuditCheckpoint.objects.order_by('entry_id')
+    if full:
+        # Archived months leave the live chain starting at their boundary checkpoint
+        genesis = checkpoints.first()
+        first_live = AuditLog.objects.filter(
+            id__gt=genesis.entry_id if genesis else 0
+        ).order_by('id').values_list('id', flat=True).first()
+        if first_live is None:
+            start = checkpoints.last()
+        else:
+            start = checkpoints.filter(entry_id__lt=first_live).last()
+    else:
+        start = checkpoints.filter(verified_at__isnull=False).last()
+
+    start_id = start.entry_id if start else 0
+    prev_hash = start.entry_hash if start else ''
+
+    # Only verify up to the tail as it stood when the run began
+    head = AuditChainHead.objects.filter(pk=1).first()
+    end_id = head.last_entry_id if head else 0
+    end_hash = head.last_hash if head else ''
+
+    pending = dict(
+        checkpoints.filter(entry_id__gt=start_id, entry_id__lte=end_id)
+        .values_list('entry_id', 'entry_hash')
+    )
+    passed = []
+    result = VerificationResult(start_entry_id=start_id, last_entry_id=start_id)
+
+    last_id = start_id
+    while last_id < end_id:
+        rows = list(
+            AuditLog.objects.filter(id__gt=last_id, id__lte=end_id)
+            .order_by('id')
+            .values('id', 'prev_hash', 'entry_hash', *HASHED_FIELDS)[:chunk_size]
+        )
+        if not rows:
+            break
+        for row in rows:
+            if row['prev_hash'] != prev_hash:
+                result.broken_entry_id = row['id']
+                result.reason = 'previous hash does not match; an entry before it was removed or altered'
+                break
+            computed = compute_hash(prev_hash, row)
+            if computed != row['entry_hash']:
+                result.broken_entry_id = row['id']
+                result.reason = 'entry content does not match its hash'
+                break
+            checkpoint_hash = pending.get(row['id'])
+            if checkpoint_hash is not None:
+                if checkpoint_hash != computed:
+                    result.broken_entry_id = row['id']
+                    result.reason = 'checkpoint hash does not match the chain'
+                    break
+                passed.append(row['id'])
+            prev_hash = computed
+            result.entries_checked += 1
+            result.last_entry_id = row['id']
+        if not result.ok:
+            break
+        last_id = rows[-1]['id']
+
+    if result.ok and prev_hash != end_hash:
+        result.broken_entry_id = result.last_entry_id
+        result.reason = 'chain ends before the recorded tail; entries were removed'
+
+    if passed:
+        result.checkpoints_verified = AuditCheckpoint.objects.filter(
+            entry_id__in=passed
+        ).update(verified_at=timezone.now())
+    return result
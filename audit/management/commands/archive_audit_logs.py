@@ -0,0 +1,58 @@
+"""
+Management command to roll closed months of audit entries into segment files.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from audit.archive import ArchiveError, NothingToArchive, archive_month, closed_months
+
+
+class Command(BaseCommand):
+    help = 'Exports closed months of audit entries to compressed segments and removes them from the live table'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--month',
+            action='append',
+            help='Month to archive (YYYY-MM); repeatable. Defaults to every closed month'
+        )
+        parser.add_argument(
+            '--output-dir',
+            help='Segment directory (defaults to AUDIT_ARCHIVE_DIR)'
+        )
+        parser.add_argument(
+            '--keep-rows',
+            action='store_true',
+            help='Write segments without deleting the exported rows'
+        )
+        parser.add_argument(
+            '--block-rows',
+            type=int,
+            default=1000,
+            help='Target rows per compressed block'
+        )
+
+    def handle(self, *args, **options):
+        months = options['month'] or closed_months()
+        if not months:
+            self.stdout.write('No closed months to archive')
+            return
+
+        for month in months:
+            try:
+                manifest = archive_month(
+                    month,
+                    directory=options['output_dir'],
+                    block_rows=options['block_rows'],
+                    delete=not options['keep_rows']
+                )
+            except NothingToArchive as e:
+                # Already exported, or only swept into an earlier segment
+                self.stdout.write(f'{e} Skipped.')
+                continue
+            except ArchiveError as e:
+                raise CommandError(str(e))
+            except ValueError:
+                raise CommandError(f'Invalid month: {month} (expected YYYY-MM)')
+            self.stdout.write(self.style.SUCCESS(
+                f"Archived {manifest['rows']} entries for {month}"
+            ))
@@ -0,0 +1,103 @@
+"""
+Management command to benchmark charge throughput with auditing off, synchronous and buffered.
+"""
+import tempfile
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from audit.writer import AuditWriter, set_writer
+from billing.models import Guest, Folio
+from services.models import Service, PricingRule
+
+
+BENCH_DESCRIPTION = 'bench_audit charge'
+
+
+class Command(BaseCommand):
+    help = 'Measures charges per second with auditing off, synchronous and buffered'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--charges', type=int, default=1000, help='Charges per mode')
+        parser.add_argument('--batch-size', type=int, default=500, help='Buffered writer batch size')
+
+    def handle(self, *args, **options):
+        count = options['charges']
+
+        # Everything runs in one transaction that is rolled back at the end:
+        # benchmark audit rows can't be deleted afterwards without breaking
+        # the hash chain
+        with transaction.atomic():
+            service = Service.objects.create(
+                name='Benchmark Valet',
+                service_type='per_unit',
+                base_price=Decimal('5.00')
+            )
+            PricingRule.objects.create(
+                service=service,
+                name='VAT',
+                rule_type='tax',
+                value=Decimal('16.00')
+            )
+            folio = Folio.objects.create(
+                guest=Guest.objects.create(
+                    name='Benchmark Guest',
+                    room_number='BENCH-AUDIT',
+                    check_in=timezone.now()
+                )
+            )
+
+            with tempfile.TemporaryDirectory() as spool_dir:
+                writer = AuditWriter(
+                    batch_size=options['batch_size'],
+                    flush_interval=0,
+                    spool_dir=spool_dir
+                )
+                previous_writer = set_writer(writer)
+                modes = [
+                    ('off', {'AUDIT_CAPTURE': False}),
+                    ('sync', {'AUDIT_CAPTURE': True, 'AUDIT_BUFFERED': False}),
+                    ('buffered', {'AUDIT_CAPTURE': True, 'AUDIT_BUFFERED': True}),
+                ]
+                try:
+                    # Warm up connections and caches before timing
+                    with override_settings(AUDIT_CAPTURE=False):
+                        self._run(folio, service, min(count, 50))
+                    results = []
+                    for name, overrides in modes:
+                        with override_settings(**overrides):
+                            elapsed = self._run(folio, service, count)
+                        if name == 'buffered':
+                            start = time.perf_counter()
+                            writer.flush()
+                            elapsed += time.perf_counter() - start
+                        results.append((name, elapsed))
+                finally:
+                    set_writer(previous_writer)
+
+            transaction.set_rollback(True)
+
+        baseline = results[0][1]
+        self.stdout.write(f'{count} charges per mode')
+        for name, elapsed in results:
+            self.stdout.write(
+                f'{name:>9}: {count / elapsed:10.1f} charges/s '
+                f'({elapsed / count * 1000:.3f} ms/charge, '
+                f'{(elapsed / baseline - 1) * 100:+.1f}% vs off)'
+            )
+
+    def _run(self, folio, service, count):
+        start = time.perf_counter()
+        for i in range(count):
+            # Audit entries are recorded on commit, which the enclosing
+            # transaction never reaches; run each charge's callbacks as its
+            # own commit would
+            with TestCase.captureOnCommitCallbacks(execute=True):
+                folio.add_charge(
+                    service=service,
+                    quantity=1 + i % 3,
+                    description=BENCH_DESCRIPTION
+                )
+        return time.perf_counter() - start
@@ -0,0 +1,30 @@
+"""
+Management command to replay audit events left in the writer spool or staged
+by processes that died before chaining them.
+"""
+from django.core.management.base import BaseCommand
+from audit.writer import drain_pending, recover_spool
+
+
+class Command(BaseCommand):
+    help = 'Writes audit events spooled by crashed processes or failed flushes, and staged events never chained'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--spool-dir',
+            help='Spool directory (defaults to AUDIT_SPOOL_DIR)'
+        )
+        parser.add_argument(
+            '--include-live',
+            action='store_true',
+            help='Also replay failed flushes of running processes (their open spools are left alone)'
+        )
+
+    def handle(self, *args, **options):
+        written = recover_spool(
+            spool_dir=options['spool_dir'],
+            include_live=options['include_live']
+        )
+        written += drain_pending()
+        self.stdout.write(self.style.SUCCESS(f'Recovered {written} audit events'))
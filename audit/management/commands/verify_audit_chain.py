@@ -0,0 +1,36 @@
+"""
+Management command to verify the audit log hash chain.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from audit.chain import verify_chain
+
+
+class Command(BaseCommand):
+    help = 'Verifies audit entries added since the last verified checkpoint'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Verify from the start of the chain instead of the last verified checkpoint'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Entries fetched per query'
+        )
+
+    def handle(self, *args, **options):
+        result = verify_chain(full=options['full'], chunk_size=options['chunk_size'])
+
+        self.stdout.write(
+            f'Checked {result.entries_checked} entries after entry {result.start_entry_id}, '
+            f'{result.checkpoints_verified} checkpoints verified'
+        )
+        if not result.ok:
+            raise CommandError(
+                f'Audit chain broken at entry {result.broken_entry_id}: {result.reason}'
+            )
+        self.stdout.write(self.style.SUCCESS('Audit chain intact'))
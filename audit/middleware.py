@@ -0,0 +1,37 @@
+"""
+Middleware binding the current request for automatic audit capture.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from .capture import set_current_request, reset_current_request
+
+
+class AuditContextMiddleware:
+    """
+    Makes the request available to audit capture for actor, IP and user agent.
+    
+    Supports both sync and async chains so async views under ASGI don't pay
+    a thread switch for it.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = set_current_request(request)
+        try:
+            return self.get_response(request)
+        finally:
+            reset_current_request(token)
+
+    async def __acall__(self, request):
+        token = set_current_request(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            reset_current_request(token)
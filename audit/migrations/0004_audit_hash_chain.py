@@ -0,0 +1,64 @@
+# Generated by Django 4.2.7 on 2026-10-18 22:50
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def start_chain(apps, schema_editor):
+    """Start the chain after existing rows, which predate hashing."""
+    AuditLog = apps.get_model('audit', 'AuditLog')
+    AuditChainHead = apps.get_model('audit', 'AuditChainHead')
+    AuditCheckpoint = apps.get_model('audit', 'AuditCheckpoint')
+    
+    last = AuditLog.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    AuditChainHead.objects.create(pk=1, last_entry_id=last, last_hash='', sequence=0)
+    AuditCheckpoint.objects.create(
+        entry_id=last,
+        entry_hash='',
+        sequence=0,
+        verified_at=django.utils.timezone.now()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0003_auditlog_event_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditChainHead',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_entry_id', models.BigIntegerField(default=0)),
+                ('last_hash', models.CharField(blank=True, default='', max_length=64)),
+                ('sequence', models.BigIntegerField(default=0, help_text='Entries chained so far')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AuditCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_id', models.BigIntegerField(unique=True)),
+                ('entry_hash', models.CharField(blank=True, max_length=64)),
+                ('sequence', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('verified_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-entry_id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='auditlog',
+            name='entry_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='auditlog',
+            name='prev_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.RunPython(start_chain, migrations.RunPython.noop),
+    ]
@@ -3,6 +3,7 @@ Audit logging models for immutable transaction tracking.
 """
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 
 class AuditLog(models.Model):
@@ -42,13 +43,24 @@ class AuditLog(models.Model):
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(blank=True, default='')
     
-    # Timestamp (immutable)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set when the event is captured, so buffered writes keep the real event time
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    
+    # Set by the buffered writer so replayed spool entries are never duplicated
+    event_id = models.UUIDField(null=True, blank=True, unique=True, editable=False)
+    
+    # Hash chain (see audit.chain)
+    prev_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
+    entry_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
     
     class Meta:
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['entity_type', 'entity_id']),
+            # Entity history, newest first (keyset on id)
+            models.Index(fields=['entity_type', 'entity_id', '-id']),
+            # Actor activity over a time range
+            models.Index(fields=['actor_name', '-created_at', '-id']),
+            models.Index(fields=['user', '-created_at', '-id']),
             models.Index(fields=['action_type']),
             models.Index(fields=['-created_at']),
         ]
@@ -57,16 +69,70 @@ class AuditLog(models.Model):
         return f"{self.action_type} - {self.entity_type}:{self.entity_id} by {self.actor_name}"
     
     def save(self, *args, **kwargs):
-        """Override save to prevent updates after creation."""
+        """Override save to prevent updates and append new entries to the hash chain."""
         if self.pk is not None:
             raise ValueError('AuditLog entries are immutable and cannot be updated.')
-        super().save(*args, **kwargs)
+        from .chain import append_entries
+        append_entries([self])
     
     def delete(self, *args, **kwargs):
         """Prevent deletion of audit logs."""
         raise ValueError('AuditLog entries cannot be deleted.')
 
 
+class AuditChainHead(models.Model):
+    """
+    Single-row tail of the audit hash chain.
+    
+    Appending entries locks this row, so chain order matches id order.
+    """
+    last_entry_id = models.BigIntegerField(default=0)
+    last_hash = models.CharField(max_length=64, blank=True, default='')
+    sequence = models.BigIntegerField(default=0, help_text='Entries chained so far')
+    
+    def __str__(self):
+        return f"Audit chain at #{self.sequence} (entry {self.last_entry_id})"
+
+
+class AuditCheckpoint(models.Model):
+    """
+    Chain state recorded every AUDIT_CHECKPOINT_INTERVAL entries.
+    
+    Verification resumes from the newest verified checkpoint instead of
+    re-hashing the whole log.
+    """
+    entry_id = models.BigIntegerField(unique=True)
+    entry_hash = models.CharField(max_length=64, blank=True)
+    sequence = models.BigIntegerField()
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    verified_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-entry_id']
+    
+    def __str__(self):
+        return f"Checkpoint #{self.sequence} at entry {self.entry_id}"
+
+
+class PendingAuditEvent(models.Model):
+    """
+    An audit event staged inside the audited transaction.
+    
+    It commits or rolls back with the change it describes, without locking
+    the chain head; once committed it is chained and deleted. Rows outlive
+    their transaction only when the process died before chaining them, and
+    are then chained by ``drain_pending``.
+    """
+    event = models.JSONField()
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    class Meta:
+        ordering = ['id']
+    
+    def __str__(self):
+        return f"Pending {self.event.get('action_type')} {self.event.get('entity_type')}:{self.event.get('entity_id')}"
+
+
 def log_action(action_type, entity_type, entity_id, actor_name, old_values=None, new_values=None, metadata=None, user=None, ip_address=None, user_agent=None):
     """
     Helper function to create audit log entries.
@@ -0,0 +1,35 @@
+"""
+DRF serializers for audit module.
+"""
+from rest_framework import serializers
+from .models import AuditLog
+
+
+class AuditLogSerializer(serializers.ModelSerializer):
+    """Read-only serializer for AuditLog entries."""
+    
+    class Meta:
+        model = AuditLog
+        fields = [
+            'id', 'action_type', 'entity_type', 'entity_id',
+            'user', 'actor_name', 'old_values', 'new_values', 'metadata',
+            'ip_address', 'user_agent', 'created_at', 'entry_hash'
+        ]
+        read_only_fields = fields
+
+
+class ActivityQuerySerializer(serializers.Serializer):
+    """Query parameters for actor activity lookups."""
+    actor = serializers.CharField(required=False)
+    user_id = serializers.IntegerField(required=False)
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+    
+    def validate(self, attrs):
+        """Require an actor and a bounded, ordered time range."""
+        if not attrs.get('actor') and attrs.get('user_id') is None:
+            raise serializers.ValidationError('Provide actor or user_id.')
+        since, until = attrs.get('since'), attrs.get('until')
+        if since and until and since >= until:
+            raise serializers.ValidationError('since must be before until.')
+        return attrs
@@ -0,0 +1,25 @@
+"""
+Celery tasks for the audit module.
+"""
+from sysnyx.celery import app
+from .chain import verify_chain
+from .writer import drain_pending
+
+
+@app.task
+def verify_audit_chain():
+    """Nightly incremental verification of the audit hash chain."""
+    result = verify_chain()
+    return {
+        'ok': result.ok,
+        'entries_checked': result.entries_checked,
+        'checkpoints_verified': result.checkpoints_verified,
+        'broken_entry_id': result.broken_entry_id,
+        'reason': result.reason,
+    }
+
+
+@app.task(ignore_result=True)
+def drain_pending_audit_events():
+    """Chain audit events staged by processes that died before appending them."""
+    return drain_pending()
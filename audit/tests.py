@@ -1,8 +1,27 @@
 """
 Test suite for audit module.
 """
+import os
+import uuid
 import pytest
-from .models import AuditLog, log_action
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from billing.models import Guest, Folio
+from payments.models import Payment
+from services.models import Service
+from sysnyx.testing import assert_constant_queries, locmem_cache  # noqa: F401
+from .archive import ArchiveError, archive_month, closed_months, search_archive
+from .chain import verify_chain
+from .models import AuditChainHead, AuditLog, PendingAuditEvent, log_action
+from .writer import AuditWriter, drain_pending, recover_spool, record_action, set_writer
+
 
 
 @pytest.mark.django_db
@@ -48,3 +67,546 @@ class TestAuditLog:
         
         with pytest.raises(ValueError, match='cannot be deleted'):
             log.delete()
+
+
+@pytest.mark.django_db
+class TestAuditWriter:
+    """Tests for the buffered audit writer."""
+    
+    def _enqueue(self, writer, entity_id):
+        return writer.enqueue(
+            action_type='charge_created',
+            entity_type='Charge',
+            entity_id=entity_id,
+            actor_name='reader-1',
+            new_values={'amount': Decimal('5.80')}
+        )
+    
+    def test_flush_writes_buffered_events(self, tmp_path):
+        """Test events are held until flush and then bulk inserted."""
+        writer = AuditWriter(batch_size=100, flush_interval=0, spool_dir=tmp_path)
+        self._enqueue(writer, 1)
+        self._enqueue(writer, 2)
+        
+        assert AuditLog.objects.count() == 0
+        assert writer.flush() == 2
+        assert AuditLog.objects.count() == 2
+        assert AuditLog.objects.get(entity_id=1).new_values == {'amount': '5.80'}
+        assert list(tmp_path.iterdir()) == []
+    
+    def test_batch_size_triggers_flush(self, tmp_path):
+        """Test a full buffer is written without waiting for the interval."""
+        writer = AuditWriter(batch_size=3, flush_interval=0, spool_dir=tmp_path)
+        for entity_id in range(3):
+            self._enqueue(writer, entity_id)
+        
+        assert AuditLog.objects.count() == 3
+    
+    def test_recover_spool_replays_unflushed_events(self, tmp_path):
+        """Test events spooled by a dead process are recovered exactly once."""
+        writer = AuditWriter(batch_size=100, flush_interval=0, spool_dir=tmp_path)
+        event_id = self._enqueue(writer, 7)
+        writer._spool.close()
+        
+        dead_spool = tmp_path / 'audit-999999999.spool'
+        writer.spool_path.rename(dead_spool)
+        dead_spool.write_text(dead_spool.read_text() * 2 + '{"torn')
+        
+        assert recover_spool(tmp_path) == 1
+        assert AuditLog.objects.get(event_id=event_id).entity_id == 7
+        assert not dead_spool.exists()
+    
+    @pytest.mark.skipif(not os.path.exists('/proc/self/stat'), reason='needs process start times')
+    def test_reused_pid_does_not_hide_a_crashed_spool(self, tmp_path):
+        """Test a writer whose pid matches a crashed process leaves that spool to recovery."""
+        writer = AuditWriter(batch_size=100, flush_interval=0, spool_dir=tmp_path)
+        crashed = [self._enqueue(writer, 1), self._enqueue(writer, 2)]
+        writer._spool.close()
+        # Same pid, earlier start: what a crashed predecessor leaves behind
+        predecessor = tmp_path / f'audit-{os.getpid()}-1-0badf00d.spool'
+        writer.spool_path.rename(predecessor)
+        
+        successor = AuditWriter(batch_size=100, flush_interval=0, spool_dir=tmp_path)
+        self._enqueue(successor, 3)
+        assert successor.flush() == 1
+        assert successor.retry_failed() == 0
+        assert predecessor.exists()
+        
+        assert recover_spool(tmp_path) == 2
+        assert set(AuditLog.objects.filter(entity_id__in=[1, 2]).values_list('event_id', flat=True)) == {
+            uuid.UUID(event_id) for event_id in crashed
+        }
+        assert list(tmp_path.iterdir()) == []
+    
+    def test_recovery_leaves_live_spool_alone(self, tmp_path):
+        """Test a forced recovery never replays the spool a running writer appends to."""
+        writer = AuditWriter(batch_size=100, flush_interval=0, spool_dir=tmp_path)
+        self._enqueue(writer, 1)
+        
+        assert recover_spool(tmp_path, include_live=True) == 0
+        assert writer.spool_path.exists()
+        self._enqueue(writer, 2)
+        assert writer.flush() == 2
+        assert AuditLog.objects.count() == 2
+    
+    def test_failed_flush_is_retried_by_its_writer(self, tmp_path, monkeypatch):
+        """Test a failed batch neither fails the caller nor waits for a restart."""
+        writer = AuditWriter(batch_size=1, flush_interval=0, spool_dir=tmp_path)
+        
+        def unavailable(events, skip_existing=False):
+            raise OSError('disk gone')
+        
+        monkeypatch.setattr('audit.writer._write_events', unavailable)
+        self._enqueue(writer, 1)
+        assert len(list(tmp_path.glob('*.flushing'))) == 1
+        
+        monkeypatch.undo()
+        assert writer.retry_failed() == 1
+        assert AuditLog.objects.get().entity_id == 1
+        assert list(tmp_path.iterdir()) == []
+    
+    def test_record_action_respects_setting(self, settings, django_capture_on_commit_callbacks):
+        """Test record_action writes on commit unless buffering is enabled."""
+        settings.AUDIT_BUFFERED = False
+        with django_capture_on_commit_callbacks(execute=True):
+            record_action(
+                action_type='folio_settled',
+                entity_type='Folio',
+                entity_id=1,
+                actor_name='system'
+            )
+            # Nothing touches the chain head inside the audited transaction
+            assert AuditLog.objects.count() == 0
+            assert not AuditChainHead.objects.filter(sequence__gt=0).exists()
+        assert AuditLog.objects.count() == 1
+    
+    def test_buffered_record_action_skips_rolled_back_changes(self, settings, tmp_path,
+                                                              django_capture_on_commit_callbacks):
+        """Test a buffered event is only enqueued if the audited transaction commits."""
+        settings.AUDIT_BUFFERED = True
+        writer = AuditWriter(batch_size=100, flush_interval=0, spool_dir=tmp_path)
+        previous = set_writer(writer)
+        try:
+            with django_capture_on_commit_callbacks(execute=True):
+                with pytest.raises(IntegrityError):
+                    with transaction.atomic():
+                        record_action(action_type='folio_settled', entity_type='Folio', entity_id=1, actor_name='system')
+                        raise IntegrityError('duplicate tap')
+                record_action(action_type='folio_settled', entity_type='Folio', entity_id=2, actor_name='system')
+                assert writer.flush() == 0
+            assert writer.flush() == 1
+        finally:
+            set_writer(previous)
+        assert AuditLog.objects.get().entity_id == 2
+    
+    def test_failed_append_stays_staged(self, settings, monkeypatch, django_capture_on_commit_callbacks):
+        """Test an event whose append fails after commit is left for drain_pending."""
+        settings.AUDIT_BUFFERED = False
+        
+        def unavailable(events, skip_existing=False):
+            raise DatabaseError('database gone')
+        
+        monkeypatch.setattr('audit.writer._write_events', unavailable)
+        with django_capture_on_commit_callbacks(execute=True):
+            record_action(action_type='folio_settled', entity_type='Folio', entity_id=1, actor_name='system')
+        assert PendingAuditEvent.objects.count() == 1
+        
+        monkeypatch.undo()
+        assert drain_pending(older_than=0) == 1
+        assert AuditLog.objects.get().entity_id == 1
+        assert not PendingAuditEvent.objects.exists()
+    
+    def test_staged_events_survive_a_crash_and_not_a_rollback(self, settings, django_capture_on_commit_callbacks):
+        """Test events commit with their change and are chained even if the process dies first."""
+        settings.AUDIT_BUFFERED = False
+        with pytest.raises(IntegrityError):
+            with transaction.atomic():
+                record_action(action_type='folio_settled', entity_type='Folio', entity_id=1, actor_name='system')
+                raise IntegrityError('duplicate tap')
+        # Committed, but the on-commit append never runs
+        with django_capture_on_commit_callbacks(execute=False):
+            record_action(action_type='folio_settled', entity_type='Folio', entity_id=2, actor_name='system')
+        
+        assert list(PendingAuditEvent.objects.values_list('event__entity_id', flat=True)) == [2]
+        assert drain_pending() == 0
+        assert drain_pending(older_than=0) == 1
+        assert AuditLog.objects.get().entity_id == 2
+        assert verify_chain().ok
+
+
+@pytest.mark.django_db
+class TestAutomaticCapture:
+    """Tests for audit capture on charges, payments and folios."""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        settings.AUDIT_CAPTURE = True
+        settings.AUDIT_BUFFERED = False
+        guest = Guest.objects.create(
+            name='Audit Guest',
+            room_number='301',
+            check_in=timezone.now()
+        )
+        self.folio = Folio.objects.create(guest=guest)
+        self.service = Service.objects.create(
+            name='Valet',
+            service_type='per_unit',
+            base_price=Decimal('5.00')
+        )
+    
+    def test_charge_created_recorded(self, django_capture_on_commit_callbacks):
+        """Test adding a charge records its amounts."""
+        with django_capture_on_commit_callbacks(execute=True):
+            charge = self.folio.add_charge(service=self.service, quantity=2)
+        
+        log = AuditLog.objects.get(action_type='charge_created')
+        assert log.entity_id == charge.id
+        assert log.actor_name == 'system'
+        assert log.new_values['final_amount'] == '10.00'
+        assert log.old_values == {}
+    
+    def test_payment_processed_records_status_diff(self, django_capture_on_commit_callbacks):
+        """Test processing a payment records the old and new status."""
+        with django_capture_on_commit_callbacks(execute=True):
+            payment = Payment.objects.create(
+                folio=self.folio,
+                amount=Decimal('20.00'),
+                payment_method='cash'
+            )
+            payment.process_payment()
+        
+        assert AuditLog.objects.filter(action_type='payment_created', entity_id=payment.id).exists()
+        log = AuditLog.objects.get(action_type='payment_processed')
+        assert log.old_values['status'] == 'pending'
+        assert log.new_values['status'] == 'completed'
+    
+    def test_folio_settled_diff_needs_no_select(self, django_capture_on_commit_callbacks):
+        """Test the before state comes from the loaded instance, not a query."""
+        folio = Folio.objects.get(pk=self.folio.pk)
+        folio.status = 'settled'
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                folio.save()
+        
+        # Only the new version is read back
+        folio_reads = [
+            q['sql'] for q in queries.captured_queries
+            if q['sql'].upper().startswith('SELECT') and '"billing_folio"."status"' in q['sql']
+        ]
+        assert folio_reads == []
+        log = AuditLog.objects.get(action_type='folio_settled')
+        assert log.old_values == {'status': 'open'}
+        assert log.new_values == {'status': 'settled'}
+    
+    def test_totals_recalculation_not_recorded(self, django_capture_on_commit_callbacks):
+        """Test routine total updates do not create audit entries."""
+        with django_capture_on_commit_callbacks(execute=True):
+            self.folio.recalculate_totals()
+        
+        assert not AuditLog.objects.filter(entity_type='Folio').exists()
+    
+    def test_capture_disabled(self, settings, django_capture_on_commit_callbacks):
+        """Test nothing is recorded when capture is switched off."""
+        settings.AUDIT_CAPTURE = False
+        with django_capture_on_commit_callbacks(execute=True):
+            self.folio.add_charge(service=self.service)
+        
+        assert AuditLog.objects.count() == 0
+
+
+@pytest.mark.django_db
+class TestAuditChain:
+    """Tests for the tamper-evident hash chain."""
+    
+    def _log(self, count):
+        return [
+            log_action(
+                action_type='charge_created',
+                entity_type='Charge',
+                entity_id=i,
+                actor_name='reader-1',
+                new_values={'amount': f'{i}.00'}
+            )
+            for i in range(count)
+        ]
+    
+    def test_entries_are_chained(self):
+        """Test each entry links to its predecessor's hash."""
+        first, second = self._log(2)
+        
+        assert len(second.entry_hash) == 64
+        assert second.prev_hash == first.entry_hash
+        assert verify_chain().ok
+    
+    def test_modified_entry_detected(self):
+        """Test a database-level edit breaks verification."""
+        logs = self._log(3)
+        AuditLog.objects.filter(pk=logs[1].pk).update(actor_name='hacker')
+        
+        result = verify_chain()
+        assert not result.ok
+        assert result.broken_entry_id == logs[1].pk
+    
+    def test_deleted_entry_detected(self):
+        """Test removing a row breaks the link of the next one."""
+        logs = self._log(3)
+        AuditLog.objects.filter(pk=logs[1].pk).delete()
+        
+        result = verify_chain()
+        assert result.broken_entry_id == logs[2].pk
+    
+    def test_truncated_tail_detected(self):
+        """Test removing the newest rows is caught against the chain head."""
+        logs = self._log(3)
+        AuditLog.objects.filter(pk=logs[2].pk).delete()
+        
+        assert not verify_chain().ok
+    
+    def test_verification_resumes_from_checkpoint(self, settings):
+        """Test a second run only checks entries after the verified checkpoint."""
+        settings.AUDIT_CHECKPOINT_INTERVAL = 5
+        self._log(12)
+        
+        first = verify_chain()
+        assert first.ok
+        assert first.checkpoints_verified == 2
+        
+        second = verify_chain()
+        assert second.ok
+        assert second.entries_checked == 2
+        assert verify_chain(full=True).entries_checked == 12
+    
+    def test_buffered_entries_are_chained(self, tmp_path):
+        """Test batches from the buffered writer extend the same chain."""
+        self._log(1)
+        writer = AuditWriter(batch_size=100, flush_interval=0, spool_dir=tmp_path)
+        for entity_id in range(3):
+            writer.enqueue(
+                action_type='payment_created',
+                entity_type='Payment',
+                entity_id=entity_id,
+                actor_name='system'
+            )
+        writer.flush()
+        
+        assert AuditLog.objects.count() == 4
+        assert verify_chain().ok
+
+
+@pytest.mark.django_db
+class TestAuditArchive:
+    """Tests for monthly segment export."""
+    
+    def _entry(self, entity_id, created_at, entity_type='Charge'):
+        entry = AuditLog(
+            action_type='charge_created',
+            entity_type=entity_type,
+            entity_id=entity_id,
+            actor_name='reader-1',
+            new_values={'n': entity_id},
+            created_at=created_at
+        )
+        entry.save()
+        return entry
+    
+    def _populate(self, settings):
+        settings.AUDIT_CHECKPOINT_INTERVAL = 4
+        january = datetime(2026, 1, 15, tzinfo=dt_timezone.utc)
+        february = datetime(2026, 2, 10, tzinfo=dt_timezone.utc)
+        for i in range(9):
+            self._entry(i % 3, january + timedelta(minutes=i))
+        self._entry(1, january, entity_type='Payment')
+        for i in range(5):
+            self._entry(i, february + timedelta(minutes=i))
+        assert verify_chain().ok
+    
+    def test_archive_moves_month_to_segment(self, settings, tmp_path):
+        """Test a closed month is exported, removed and still verifiable."""
+        self._populate(settings)
+        
+        manifest = archive_month('2026-01', directory=tmp_path, block_rows=2)
+        
+        assert manifest['rows'] == 10
+        assert AuditLog.objects.count() == 5
+        assert (tmp_path / 'audit-2026-01.jsonl.gz').exists()
+        assert verify_chain().ok
+        assert verify_chain(full=True).ok
+    
+    def test_search_archive_reads_only_entity(self, settings, tmp_path):
+        """Test the per-entity index finds every archived row of an entity."""
+        self._populate(settings)
+        archive_month('2026-01', directory=tmp_path, block_rows=2)
+        
+        history = search_archive('Charge', 1, directory=tmp_path)
+        
+        assert len(history) == 3
+        assert all(row['entity_id'] == 1 for row in history)
+        assert history[0]['id'] > history[-1]['id']
+        assert len(search_archive('Payment', 1, directory=tmp_path)) == 1
+        assert search_archive('Charge', 99, directory=tmp_path) == []
+    
+    def test_unverified_month_refused(self, settings, tmp_path):
+        """Test entries past the last verified checkpoint are not archived."""
+        settings.AUDIT_CHECKPOINT_INTERVAL = 1000
+        self._entry(1, datetime(2026, 1, 15, tzinfo=dt_timezone.utc))
+        
+        with pytest.raises(ArchiveError, match='verify_audit_chain'):
+            archive_month('2026-01', directory=tmp_path)
+    
+    def test_closed_months_keep_recent_live(self, settings):
+        """Test only months older than AUDIT_LIVE_MONTHS and holding entries are proposed."""
+        settings.AUDIT_LIVE_MONTHS = 1
+        self._entry(1, datetime(2026, 1, 15, tzinfo=dt_timezone.utc))
+        self._entry(2, datetime(2026, 3, 15, tzinfo=dt_timezone.utc))
+        
+        months = closed_months(now=datetime(2026, 5, 2, tzinfo=dt_timezone.utc))
+        
+        assert months == ['2026-01', '2026-03']
+    
+    def _populate_march(self):
+        # A checkpoint past February's last entry, so February can be archived
+        self._entry(9, datetime(2026, 3, 5, tzinfo=dt_timezone.utc))
+        assert verify_chain().ok
+    
+    def test_empty_month_is_skipped(self, settings, tmp_path):
+        """Test a month with nothing left to export doesn't stop later months."""
+        self._populate(settings)
+        self._populate_march()
+        
+        call_command(
+            'archive_audit_logs', month=['2026-01', '2025-12', '2026-02'],
+            output_dir=str(tmp_path), stdout=StringIO()
+        )
+        
+        assert list(AuditLog.objects.values_list('entity_id', flat=True)) == [9]
+        assert (tmp_path / 'audit-2026-02.jsonl.gz').exists()
+    
+    def test_kept_rows_are_not_exported_twice(self, settings, tmp_path):
+        """Test with delete=False each segment starts after the previous one."""
+        self._populate(settings)
+        self._populate_march()
+        
+        january = archive_month('2026-01', directory=tmp_path, delete=False)
+        february = archive_month('2026-02', directory=tmp_path, delete=False)
+        
+        assert (january['rows'], february['rows']) == (10, 5)
+        assert february['first_id'] == january['last_id'] + 1
+        assert len(search_archive('Charge', 1, directory=tmp_path)) == 4
+        # Re-running a month exports the same range
+        assert archive_month('2026-02', directory=tmp_path, delete=False)['rows'] == 5
+
+
+@pytest.mark.django_db
+class TestAuditQueryAPI:
+    """Tests for the entity history and actor activity API."""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.staff = User.objects.create_user(username='auditor', password='pass', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.staff)
+    
+    def _log(self, entity_id, actor='reader-1', entity_type='Folio'):
+        return log_action(
+            action_type='folio_settled',
+            entity_type=entity_type,
+            entity_id=entity_id,
+            actor_name=actor
+        )
+    
+    def test_entity_history_keyset_pages(self):
+        """Test an entity's history pages newest first without overlap."""
+        logs = [self._log(7) for _ in range(5)]
+        self._log(8)
+        
+        first = self.client.get('/api/audit/entities/Folio/7/?page_size=3')
+        second = self.client.get(first.data['next'])
+        
+        ids = [row['id'] for row in first.data['results'] + second.data['results']]
+        assert ids == [log.id for log in reversed(logs)]
+        assert second.data['next'] is None
+    
+    def test_actor_activity_time_range(self):
+        """Test activity is filtered by actor and time range."""
+        self._log(1, actor='front-desk')
+        self._log(2, actor='front-desk')
+        self._log(3, actor='night-audit')
+        since = (timezone.now() - timedelta(hours=1)).isoformat()
+        
+        response = self.client.get('/api/audit/activity/', {'actor': 'front-desk', 'since': since})
+        
+        assert response.status_code == 200
+        assert [row['entity_id'] for row in response.data['results']] == [2, 1]
+        
+        later = (timezone.now() + timedelta(hours=1)).isoformat()
+        response = self.client.get('/api/audit/activity/', {'actor': 'front-desk', 'since': later})
+        assert response.data['results'] == []
+    
+    def test_activity_pages_through_ties(self):
+        """Test entries sharing a timestamp page in id order without overlap."""
+        instant = timezone.now() - timedelta(minutes=5)
+        logs = [
+            AuditLog(action_type='folio_settled', entity_type='Folio', entity_id=i,
+                     actor_name='front-desk', created_at=instant)
+            for i in range(5)
+        ]
+        for log in logs:
+            log.save()
+        
+        with CaptureQueriesContext(connection) as queries:
+            first = self.client.get('/api/audit/activity/', {'actor': 'front-desk', 'page_size': 2})
+        # SQLite happens to return ties in id order; other databases need it asked for
+        assert any(
+            'ORDER BY "audit_auditlog"."created_at" DESC, "audit_auditlog"."id" DESC' in q['sql']
+            for q in queries.captured_queries
+        )
+        pages = [first.data]
+        while pages[-1]['next']:
+            pages.append(self.client.get(pages[-1]['next']).data)
+        
+        ids = [row['id'] for page in pages for row in page['results']]
+        assert ids == [log.id for log in reversed(logs)]
+    
+    def test_activity_requires_actor(self):
+        """Test an unbounded activity query is rejected."""
+        response = self.client.get('/api/audit/activity/')
+        assert response.status_code == 422
+    
+    def test_non_staff_forbidden(self):
+        """Test audit history is limited to staff."""
+        guest_user = User.objects.create_user(username='guest', password='pass')
+        self.client.force_authenticate(user=guest_user)
+        
+        response = self.client.get('/api/audit/entities/Folio/7/')
+        assert response.status_code == 403
+
+
+@pytest.mark.django_db
+class TestQueryBudgets:
+    """Performance contracts: audit queries cost the same at any history size."""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.staff = User.objects.create_user(username='auditor', password='pass', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.staff)
+    
+    def grow(self, size):
+        existing = AuditLog.objects.count()
+        AuditLog.objects.bulk_create([
+            AuditLog(action_type='charge_created', entity_type='Folio', entity_id=7,
+                     user=self.staff, actor_name='front-desk')
+            for _ in range(existing, size)
+        ])
+    
+    def test_entity_history(self):
+        """Test an entity's history page costs the same with 1 or 10,000 entries."""
+        assert_constant_queries(self.grow, lambda: self.client.get('/api/audit/entities/Folio/7/'))
+    
+    def test_actor_activity(self):
+        """Test an actor's activity page costs the same with 1 or 10,000 entries."""
+        results = assert_constant_queries(
+            self.grow, lambda: self.client.get('/api/audit/activity/', {'actor': 'front-desk'})
+        )
+        assert len(results[10000].data['results']) == 50
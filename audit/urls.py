@@ -0,0 +1,19 @@
+"""
+URL routing for audit module.
+"""
+from django.urls import path
+from .views import EntityHistoryView, ArchivedEntityHistoryView, ActorActivityView
+
+urlpatterns = [
+    path(
+        'entities/<str:entity_type>/<int:entity_id>/',
+        EntityHistoryView.as_view(),
+        name='audit-entity-history'
+    ),
+    path(
+        'entities/<str:entity_type>/<int:entity_id>/archived/',
+        ArchivedEntityHistoryView.as_view(),
+        name='audit-entity-archived'
+    ),
+    path('activity/', ActorActivityView.as_view(), name='audit-activity'),
+]
@@ -0,0 +1,93 @@
+"""
+API views for audit module.
+"""
+from datetime import timedelta
+from django.utils import timezone
+from rest_framework import generics, status
+from rest_framework.pagination import CursorPagination
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from .archive import search_archive
+from .models import AuditLog
+from .serializers import AuditLogSerializer, ActivityQuerySerializer
+
+
+class EntityHistoryPagination(CursorPagination):
+    """Keyset pagination on id, served by the (entity_type, entity_id, -id) index."""
+    ordering = '-id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class ActivityPagination(CursorPagination):
+    """Keyset pagination on created_at, served by the actor and user indexes."""
+    # id breaks ties between entries written in the same instant
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class EntityHistoryView(generics.ListAPIView):
+    """
+    Full audit history of one entity, newest first.
+    
+    GET /api/audit/entities/{entity_type}/{entity_id}/
+    """
+    serializer_class = AuditLogSerializer
+    pagination_class = EntityHistoryPagination
+    permission_classes = [IsAdminUser]
+    
+    def get_queryset(self):
+        return AuditLog.objects.filter(
+            entity_type=self.kwargs['entity_type'],
+            entity_id=self.kwargs['entity_id']
+        )
+
+
+class ArchivedEntityHistoryView(generics.GenericAPIView):
+    """
+    Audit history of one entity from archived monthly segments.
+    
+    GET /api/audit/entities/{entity_type}/{entity_id}/archived/
+    """
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request, entity_type, entity_id):
+        results = search_archive(entity_type, entity_id)
+        return Response({'count': len(results), 'results': results})
+
+
+class ActorActivityView(generics.ListAPIView):
+    """
+    Actions by one actor over a time range, newest first.
+    
+    GET /api/audit/activity/?actor=staff@hotel.com&since=...&until=...
+    GET /api/audit/activity/?user_id=3&since=...
+    
+    The range defaults to the last seven days.
+    """
+    serializer_class = AuditLogSerializer
+    pagination_class = ActivityPagination
+    permission_classes = [IsAdminUser]
+    default_range = timedelta(days=7)
+    
+    def list(self, request, *args, **kwargs):
+        params = ActivityQuerySerializer(data=request.query_params)
+        if not params.is_valid():
+            return Response(params.errors, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.filters = params.validated_data
+        return super().list(request, *args, **kwargs)
+    
+    def get_queryset(self):
+        filters = self.filters
+        until = filters.get('until') or timezone.now()
+        since = filters.get('since') or until - self.default_range
+        
+        queryset = AuditLog.objects.filter(created_at__gte=since, created_at__lt=until)
+        if filters.get('actor'):
+            queryset = queryset.filter(actor_name=filters['actor'])
+        if filters.get('user_id') is not None:
+            queryset = queryset.filter(user_id=filters['user_id'])
+        return queryset
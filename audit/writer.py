@@ -0,0 +1,436 @@
+"""
+Buffered audit log writer.
+
+Events are appended to a per-process spool file and held in memory, then
+written with a single ``bulk_create`` once the buffer fills or the flush
+interval elapses. The spool is only discarded after its batch is committed:
+a batch whose write failed stays behind as a ``.flushing`` file that the
+background thread retries, and events buffered by a crashed process are
+replayed by ``recover_spool``.
+
+Spool files are named after their owner: the process id, the process start
+time and a random suffix. A writer only ever opens or renames files it
+created, and recovery treats a file as orphaned when no process with that
+id and start time is running, so a restarted worker that reuses a crashed
+worker's pid neither appends to nor hides the crashed worker's spool.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import timedelta
+from pathlib import Path
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .chain import append_entries
+from .models import AuditLog, PendingAuditEvent
+
+
+logger = logging.getLogger(__name__)
+
+SPOOL_SUFFIX = '.spool'
+FLUSHING_SUFFIX = '.flushing'
+
+
+def _serialize(event):
+    return json.dumps(event, default=str, separators=(',', ':'))
+
+
+def _build_event(action_type, entity_type, entity_id, actor_name, old_values=None,
+                 new_values=None, metadata=None, user=None, ip_address=None, user_agent=None):
+    """Describe one audit event as a JSON-safe dict, in the form spooled and staged."""
+    event = {
+        'event_id': str(uuid.uuid4()),
+        'action_type': action_type,
+        'entity_type': entity_type,
+        'entity_id': entity_id,
+        'actor_name': actor_name,
+        'old_values': old_values or {},
+        'new_values': new_values or {},
+        'metadata': metadata or {},
+        'user_id': getattr(user, 'pk', user),
+        'ip_address': ip_address,
+        'user_agent': user_agent or '',
+        'created_at': timezone.now().isoformat(),
+    }
+    return json.loads(_serialize(event))
+
+
+def _to_instance(event):
+    """Build an unsaved AuditLog from a spooled event dict."""
+    return AuditLog(
+        event_id=uuid.UUID(event['event_id']),
+        action_type=event['action_type'],
+        entity_type=event['entity_type'],
+        entity_id=event['entity_id'],
+        actor_name=event['actor_name'],
+        old_values=event['old_values'],
+        new_values=event['new_values'],
+        metadata=event['metadata'],
+        user_id=event['user_id'],
+        ip_address=event['ip_address'],
+        user_agent=event['user_agent'],
+        created_at=parse_datetime(event['created_at'])
+    )
+
+
+def _write_events(events, skip_existing=False):
+    """
+    Chain and insert spooled events in one bulk statement.
+
+    Args:
+        events: List of event dicts
+        skip_existing: Drop events whose event_id is already stored
+
+    Returns:
+        int: Number of rows inserted
+    """
+    if skip_existing and events:
+        events = list({e['event_id']: e for e in events}.values())
+        seen = set(
+            str(event_id) for event_id in AuditLog.objects.filter(
+                event_id__in=[e['event_id'] for e in events]
+            ).values_list('event_id', flat=True)
+        )
+        events = [e for e in events if e['event_id'] not in seen]
+    if not events:
+        return 0
+    append_entries([_to_instance(e) for e in events])
+    return len(events)
+
+
+def _read_spool(path):
+    """Read events from a spool file, ignoring a torn final line."""
+    events = []
+    with open(path, encoding='utf-8') as spool:
+        for line in spool:
+            try:
+                events.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return events
+
+
+class AuditWriter:
+    """
+    Collects audit events in-process and writes them in batches.
+
+    Args:
+        batch_size: Flush as soon as this many events are buffered
+        flush_interval: Seconds between background flushes (0 disables the thread)
+        spool_dir: Directory for the crash-recovery spool
+        fsync: Fsync the spool on every event instead of leaving it to the OS
+    """
+
+    def __init__(self, batch_size=500, flush_interval=1.0, spool_dir=None, fsync=False):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.spool_dir = Path(spool_dir or settings.AUDIT_SPOOL_DIR)
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._check_owner()
+
+    @property
+    def spool_path(self):
+        return self.spool_dir / f'audit-{self._owner}{SPOOL_SUFFIX}'
+
+    def _check_owner(self):
+        # Called with self._lock held. A forked child gets its own spool and
+        # leaves the parent's buffer and files to the parent.
+        pid = os.getpid()
+        if pid == getattr(self, '_pid', None):
+            return
+        self._pid = pid
+        self._owner = f'{pid}-{_process_start(pid) or 0}-{uuid.uuid4().hex[:8]}'
+        self._buffer = []
+        self._spool = None
+        self._generation = 0
+        self._thread = None
+
+    def enqueue(self, action_type, entity_type, entity_id, actor_name, old_values=None,
+                new_values=None, metadata=None, user=None, ip_address=None, user_agent=None):
+        """
+        Buffer one audit event. Accepts the same arguments as ``log_action``.
+
+        Returns:
+            str: The event id assigned to the entry
+        """
+        # Round-tripped through JSON, so the buffer holds exactly what the spool holds
+        event = _build_event(
+            action_type, entity_type, entity_id, actor_name, old_values=old_values,
+            new_values=new_values, metadata=metadata, user=user, ip_address=ip_address,
+            user_agent=user_agent
+        )
+        line = _serialize(event)
+
+        with self._lock:
+            self._check_owner()
+            if self._spool is None:
+                self._spool = open(self.spool_path, 'a', encoding='utf-8')
+            self._spool.write(line + '\n')
+            self._spool.flush()
+            if self.fsync:
+                os.fsync(self._spool.fileno())
+            self._buffer.append(event)
+            full = len(self._buffer) >= self.batch_size
+
+        if full:
+            try:
+                self.flush()
+            except (DatabaseError, OSError):
+                # The batch stays spooled; never fail the audited operation
+                pass
+        else:
+            self._ensure_thread()
+        return event['event_id']
+
+    def flush(self):
+        """
+        Write all buffered events.
+
+        Returns:
+            int: Number of rows inserted
+        """
+        with self._flush_lock:
+            with self._lock:
+                self._check_owner()
+                batch, self._buffer = self._buffer, []
+                if self._spool is None:
+                    return 0
+                self._spool.close()
+                self._spool = None
+                self._generation += 1
+                flushing = self.spool_path.with_name(
+                    f'{self.spool_path.name}.{self._generation}{FLUSHING_SUFFIX}'
+                )
+                os.replace(self.spool_path, flushing)
+
+            # On failure the renamed spool stays behind for retry_failed
+            written = _write_events(batch)
+            # A forced recovery may already have replayed and removed it
+            flushing.unlink(missing_ok=True)
+            return written
+
+    def retry_failed(self):
+        """
+        Replay this process's spools whose flush failed, oldest first.
+
+        Returns:
+            int: Number of rows inserted
+        """
+        def generation(path):
+            return int(path.name.rsplit('.', 2)[1])
+
+        written = 0
+        with self._flush_lock:
+            pattern = f'{self.spool_path.name}.*{FLUSHING_SUFFIX}'
+            for path in sorted(self.spool_dir.glob(pattern), key=generation):
+                written += _write_events(_read_spool(path), skip_existing=True)
+                path.unlink(missing_ok=True)
+        return written
+
+    def _ensure_thread(self):
+        if self.flush_interval <= 0 or self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run,
+                name='audit-writer',
+                daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.retry_failed()
+                self.flush()
+            except Exception:
+                # Keep buffering; the spool still holds the failed batch
+                pass
+            finally:
+                connections.close_all()
+
+    def close(self):
+        """Stop the background thread and flush what is left."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+            self._thread = None
+        self.flush()
+
+
+def _process_start(pid):
+    """Start time of a running process in clock ticks since boot, or None if unknown."""
+    try:
+        with open(f'/proc/{pid}/stat', encoding='ascii') as stat:
+            # Fields after the parenthesised command name; starttime is the 22nd
+            return int(stat.read().rsplit(')', 1)[1].split()[19])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _owner_alive(owner):
+    """
+    Whether the process that created a spool is still running.
+
+    ``owner`` is the file name part after ``audit-``: pid, start time and a
+    random suffix (older files carry the pid alone). A pid that is alive but
+    started at another time belongs to a different process.
+    """
+    parts = owner.split('-')
+    pid = int(parts[0])
+    if not _pid_alive(pid):
+        return False
+    start = int(parts[1]) if len(parts) > 1 else 0
+    if not start:
+        return True
+    current = _process_start(pid)
+    return current is None or current == start
+
+
+def recover_spool(spool_dir=None, include_live=False):
+    """
+    Replay spool files left behind by crashed processes or failed flushes.
+
+    Args:
+        spool_dir: Directory to scan (defaults to AUDIT_SPOOL_DIR)
+        include_live: Also replay failed flushes of running writers; the
+            spool a running writer is still appending to is never touched
+
+    Returns:
+        int: Number of rows inserted
+    """
+    spool_dir = Path(spool_dir or settings.AUDIT_SPOOL_DIR)
+    if not spool_dir.exists():
+        return 0
+
+    written = 0
+    alive = {}
+    for path in sorted(spool_dir.glob(f'audit-*{SPOOL_SUFFIX}*')):
+        owner = path.name[len('audit-'):].split('.', 1)[0]
+        if owner not in alive:
+            alive[owner] = _owner_alive(owner)
+        if alive[owner] and (not include_live or path.name.endswith(SPOOL_SUFFIX)):
+            continue
+        written += _write_events(_read_spool(path), skip_existing=True)
+        path.unlink(missing_ok=True)
+    return written
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """Return the process-wide AuditWriter, creating it on first use."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = AuditWriter(
+                    batch_size=settings.AUDIT_BATCH_SIZE,
+                    flush_interval=settings.AUDIT_FLUSH_INTERVAL,
+                    fsync=settings.AUDIT_SPOOL_FSYNC
+                )
+                atexit.register(_writer.close)
+    return _writer
+
+
+def set_writer(writer):
+    """
+    Replace the process-wide AuditWriter.
+
+    Returns:
+        AuditWriter: The previous writer, or None
+    """
+    global _writer
+    with _writer_lock:
+        previous, _writer = _writer, writer
+    return previous
+
+
+def write_pending(ids=None, older_than=None):
+    """
+    Chain staged audit events and delete them, in one transaction.
+
+    Args:
+        ids: Only these PendingAuditEvent ids (all when omitted)
+        older_than: Only events staged at least this many seconds ago
+
+    Returns:
+        int: Number of rows inserted
+    """
+    with transaction.atomic():
+        pending = PendingAuditEvent.objects.select_for_update().order_by('id')
+        if ids is not None:
+            pending = pending.filter(pk__in=ids)
+        if older_than is not None:
+            pending = pending.filter(created_at__lte=timezone.now() - timedelta(seconds=older_than))
+        rows = list(pending.values_list('id', 'event'))
+        if not rows:
+            return 0
+        # A drain may race the committing process's own append
+        written = _write_events([event for _, event in rows], skip_existing=ids is None)
+        PendingAuditEvent.objects.filter(pk__in=[pk for pk, _ in rows]).delete()
+    return written
+
+
+def drain_pending(older_than=60):
+    """
+    Chain events whose process died between their commit and their append.
+
+    ``older_than`` leaves recent events to the on-commit append that is
+    normally about to chain them.
+    """
+    return write_pending(older_than=older_than)
+
+
+def _write_committed(pending_id):
+    try:
+        write_pending([pending_id])
+    except DatabaseError:
+        # The event stays staged for drain_pending; never fail the committed change
+        logger.exception('Could not chain audit event %s; left for drain_pending', pending_id)
+
+
+def record_action(*args, **kwargs):
+    """
+    Record an audit event for the current transaction.
+
+    With AUDIT_BUFFERED the event is handed to the buffered writer once the
+    transaction commits; an event whose process dies in that instant is
+    lost, the price of not writing per event.
+
+    Otherwise the event is staged as a PendingAuditEvent in the transaction
+    itself, so it commits or rolls back with the change, and chained once
+    the transaction commits. Appending locks the chain head, so doing it
+    after commit holds that lock for the chain write alone instead of for
+    the whole audited transaction. Staged events left by a crash in between
+    are chained by ``drain_pending``.
+    """
+    if settings.AUDIT_BUFFERED:
+        transaction.on_commit(lambda: get_writer().enqueue(*args, **kwargs))
+        return
+    pending = PendingAuditEvent.objects.create(event=_build_event(*args, **kwargs))
+    transaction.on_commit(lambda: _write_committed(pending.pk))
@@ -0,0 +1,219 @@
+"""
+Async views for billing, served by the ASGI application.
+"""
+import json
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from services.models import Service
+from sysnyx.authentication import alookup_token_user
+from sysnyx.renderers import FastJSONRenderer
+from sysnyx.throttling import DeviceTokenBucketThrottle
+from .events import folio_channel, folio_state, get_broker
+from .models import Folio, Charge, Guest, GuestSession
+from .readers import charge_payload
+from .serializers import AddChargeSerializer
+
+
+async def _authorized(request, folio):
+    """
+    Guest devices pass their session token as ``?token=`` (EventSource can't
+    set headers); staff clients use an ``Authorization: Token`` header.
+    """
+    token = request.GET.get('token')
+    if token:
+        return await GuestSession.objects.filter(
+            token=token,
+            guest_id=folio.guest_id,
+            is_active=True,
+            expires_at__gt=timezone.now()
+        ).aexists()
+
+    keyword, _, key = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    if keyword == 'Token' and key:
+        user = await alookup_token_user(key.strip())
+        return user is not None and user.is_active
+    return False
+
+
+def _event(event_type, data, event_id=None):
+    lines = [f'event: {event_type}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'data: {data}')
+    return '\n'.join(lines) + '\n\n'
+
+
+async def _stream(subscription, folio):
+    """
+    Current state first, then every event on the folio's channel.
+    
+    Keep-alive comments double as disconnect detection: writing to a closed
+    connection ends the generator and releases the subscription.
+    """
+    try:
+        yield 'retry: 5000\n\n'
+        state = {'type': 'folio.state', **folio_state(folio)}
+        yield _event('folio.state', json.dumps(state), folio.version)
+        while True:
+            message = await subscription.get(timeout=settings.FOLIO_EVENTS_HEARTBEAT)
+            if message is None:
+                yield ': keep-alive\n\n'
+                continue
+            event = json.loads(message)
+            yield _event(event['type'], message, event.get('version'))
+    finally:
+        subscription.close()
+
+
+async def folio_events(request, folio_id):
+    """
+    Server-Sent Events stream of a folio's charges and payments.
+    
+    GET /api/billing/folios/{id}/events/?token=<guest session token>
+    
+    Events: folio.state on connect, then charge.posted and payment.posted,
+    each carrying the folio's new balance.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {'error': 'Event streams are only served by the ASGI application.'},
+            status=501
+        )
+    
+    folio = await Folio.objects.filter(pk=folio_id).afirst()
+    if folio is None:
+        return JsonResponse({'error': 'Folio not found.'}, status=404)
+    if not await _authorized(request, folio):
+        return JsonResponse({'error': 'Authentication credentials were not provided.'}, status=401)
+    
+    # Subscribe before reading the state so nothing posted in between is missed
+    subscription = get_broker().subscribe(folio_channel(folio.pk))
+    try:
+        await folio.arefresh_from_db()
+    except Folio.DoesNotExist:
+        subscription.close()
+        return JsonResponse({'error': 'Folio not found.'}, status=404)
+    
+    response = StreamingHttpResponse(_stream(subscription, folio), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+TAP_CACHE_KEY = 'billing:tap:{room_number}:{key}'
+
+
+def _json(data, status=200):
+    return HttpResponse(
+        FastJSONRenderer().render(data),
+        content_type='application/json',
+        status=status
+    )
+
+
+async def _authenticate(request):
+    """Resolve ``Authorization: Token <key>`` to an active user, or None."""
+    keyword, _, key = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    if keyword != 'Token' or not key:
+        return None
+    user = await alookup_token_user(key.strip())
+    if user is None or not user.is_active:
+        return None
+    return user
+
+
+async def charge_by_room_async(request, room_number):
+    """
+    Async twin of charge_by_room for the ASGI application.
+    
+    POST /api/billing/charge/{room_number}/  (with TAP_VIEW_ASYNC=True)
+    
+    Lookups use the async ORM and cache, so a tap waiting on the database
+    doesn't hold a worker thread; only the charge write, which needs a
+    transaction, runs in the thread pool. Responses match the sync view.
+    """
+    if request.method != 'POST':
+        response = _json({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+        response['Allow'] = 'POST'
+        return response
+    
+    user = await _authenticate(request)
+    if user is None:
+        response = _json({'detail': 'Authentication credentials were not provided.'}, status=401)
+        response['WWW-Authenticate'] = 'Token'
+        return response
+    # Audit capture reads the actor from the request
+    request.user = user
+    
+    throttle = DeviceTokenBucketThrottle()
+    if not throttle.allow_request(request, None):
+        retry_after = int(throttle.wait()) + 1
+        response = _json(
+            {'detail': f'Request was throttled. Expected available in {retry_after} seconds.'},
+            status=429
+        )
+        response['Retry-After'] = str(retry_after)
+        return response
+    
+    try:
+        body = json.loads(request.body or b'{}')
+    except ValueError:
+        return _json({'detail': 'JSON parse error.'}, status=400)
+    serializer = AddChargeSerializer(data=body)
+    if not serializer.is_valid():
+        return _json(serializer.errors, status=422)
+    data = serializer.validated_data
+    
+    idempotency_key = data.get('idempotency_key', '')
+    cache_key = TAP_CACHE_KEY.format(room_number=room_number, key=idempotency_key)
+    if idempotency_key:
+        replay = await cache.aget(cache_key)
+        if replay is not None:
+            return _json(replay)
+    
+    guest = await Guest.objects.filter(room_number=room_number, is_active=True).afirst()
+    if guest is None:
+        return _json({'error': f'No active guest found in room {room_number}.'}, status=404)
+    folio, _ = await Folio.objects.aget_or_create(guest=guest, defaults={'status': 'open'})
+    
+    if idempotency_key:
+        existing = await Charge.objects.select_related('service').filter(
+            folio=folio,
+            idempotency_key=idempotency_key
+        ).afirst()
+        if existing:
+            payload = charge_payload(existing)
+            await cache.aset(cache_key, payload, settings.TAP_IDEMPOTENCY_TTL)
+            return _json(payload)
+    
+    service = await Service.objects.filter(id=data['service_id'], is_active=True).afirst()
+    if service is None:
+        return _json({'detail': 'Not found.'}, status=404)
+    rules = [
+        rule async for rule in service.pricing_rules.filter(is_active=True).order_by('priority')
+    ]
+    
+    try:
+        charge = await sync_to_async(folio.add_charge)(
+            service=service,
+            quantity=data.get('quantity', 1),
+            extras=data.get('extras'),
+            description=data.get('description', ''),
+            idempotency_key=idempotency_key,
+            rules=rules
+        )
+    except Exception as e:
+        return _json({'error': str(e)}, status=500)
+    
+    payload = charge_payload(charge)
+    if idempotency_key:
+        await cache.aset(cache_key, payload, settings.TAP_IDEMPOTENCY_TTL)
+    return _json(payload, status=201)
+
+
+# Token-authenticated like the DRF views; Django 4.2's csrf_exempt can't wrap async views
+charge_by_room_async.csrf_exempt = True
@@ -0,0 +1,202 @@
+"""
+Live folio updates for the SysPay app.
+
+When a charge or payment posts, a small JSON event is published on the
+folio's channel once the transaction commits. Each server process keeps one
+broker; Server-Sent Event streams subscribe to it with an asyncio queue per
+connection.
+
+InMemoryBroker delivers within the process (tests, single-process servers).
+RedisBroker publishes through Redis pub/sub and runs one pattern subscription
+per process, fanning messages out to the local queues, so a thousand open
+streams cost one Redis connection.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+def folio_channel(folio_id):
+    return f'folio:{folio_id}'
+
+
+def folio_state(folio):
+    """Balance fields sent with every folio event."""
+    return {
+        'folio_id': folio.pk,
+        'status': folio.status,
+        'total_charges': str(folio.total_charges),
+        'total_payments': str(folio.total_payments),
+        'balance': str(folio.balance),
+        'version': folio.version,
+    }
+
+
+class Subscription:
+    """An open subscription; iterate ``get()`` until ``close()``."""
+
+    def __init__(self, broker, channel, maxsize):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    async def get(self, timeout=None):
+        """Next message, or None once ``timeout`` seconds pass without one."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def offer(self, message):
+        # Runs on the subscription's loop; a stalled client loses messages
+        # rather than growing the queue without bound
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            logger.warning('Dropping event for slow subscriber on %s', self.channel)
+
+    def close(self):
+        self.broker._remove(self)
+
+
+class InMemoryBroker:
+    """Delivers published messages to subscribers in this process."""
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        """Open a subscription; must be called from the event loop that reads it."""
+        subscription = Subscription(self, channel, self.queue_size)
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def _remove(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def publish(self, channel, message):
+        """Publish a message; safe to call from any thread."""
+        self._deliver(channel, message)
+
+    def _deliver(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, message)
+            except RuntimeError:
+                # The subscriber's loop has shut down
+                self._remove(subscription)
+
+
+class RedisBroker(InMemoryBroker):
+    """Publishes through Redis pub/sub; one listener per process fans out locally."""
+
+    def __init__(self, url, prefix='sysnyx:', queue_size=100):
+        import redis
+
+        super().__init__(queue_size)
+        self.url = url
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._listener = None
+
+    def publish(self, channel, message):
+        import redis
+
+        try:
+            self._client.publish(self.prefix + channel, message)
+        except redis.RedisError:
+            logger.warning('Could not publish event on %s', channel, exc_info=True)
+
+    def subscribe(self, channel):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+        return super().subscribe(channel)
+
+    async def _listen(self):
+        import redis
+        import redis.asyncio as aioredis
+
+        delay = 1
+        while True:
+            client = aioredis.Redis.from_url(self.url)
+            try:
+                pubsub = client.pubsub()
+                await pubsub.psubscribe(self.prefix + '*')
+                delay = 1
+                async for message in pubsub.listen():
+                    if message['type'] != 'pmessage':
+                        continue
+                    channel = message['channel'].decode('utf-8')[len(self.prefix):]
+                    self._deliver(channel, message['data'].decode('utf-8'))
+            except redis.RedisError:
+                logger.warning('Event listener lost Redis; retrying in %ss', delay, exc_info=True)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+            finally:
+                await client.aclose()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Return the process-wide broker selected by FOLIO_EVENTS_BROKER."""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                if settings.FOLIO_EVENTS_BROKER == 'redis':
+                    _broker = RedisBroker(settings.FOLIO_EVENTS_REDIS_URL)
+                else:
+                    _broker = InMemoryBroker()
+    return _broker
+
+
+def set_broker(broker):
+    """
+    Replace the process-wide broker.
+
+    Returns:
+        The previous broker, or None
+    """
+    global _broker
+    with _broker_lock:
+        previous, _broker = _broker, broker
+    return previous
+
+
+def publish_folio_event(event_type, folio, **details):
+    """
+    Publish a folio event after the current transaction commits.
+
+    The folio's balance is read when the callback runs, after the totals
+    have been recalculated in the same transaction.
+
+    Args:
+        event_type: e.g. 'charge.posted' or 'payment.posted'
+        folio: The affected Folio instance
+        **details: Extra JSON-serializable fields
+    """
+    def send():
+        message = {'type': event_type, **folio_state(folio), **details}
+        get_broker().publish(folio_channel(folio.pk), json.dumps(message))
+
+    transaction.on_commit(send)
@@ -0,0 +1,106 @@
+"""
+Management command to compare ModelSerializer responses with the fast read paths.
+"""
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from billing.models import Guest, Folio, Charge
+from billing.readers import charge_payload, folio_payloads, folio_rows
+from billing.serializers import ChargeSerializer, FolioSerializer
+from services.models import Service, PricingRule
+from services.readers import service_payloads, service_rows
+from services.serializers import ServiceSerializer
+from sysnyx.renderers import FastJSONRenderer
+
+
+class Command(BaseCommand):
+    help = 'Measures serializations per second for ModelSerializer + JSONRenderer vs values readers + FastJSONRenderer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--folios', type=int, default=20, help='Folios per page')
+        parser.add_argument('--charges', type=int, default=10, help='Charges per folio')
+        parser.add_argument('--rounds', type=int, default=200, help='Responses built per case')
+
+    def handle(self, *args, **options):
+        rounds = options['rounds']
+
+        # Fixture rows are rolled back at the end; skip auditing them
+        with transaction.atomic(), override_settings(AUDIT_CAPTURE=False):
+            services = self._seed(options['folios'], options['charges'])
+            folios = Folio.objects.all()
+            charge = Charge.objects.select_related('service').first()
+            service_queryset = Service.objects.filter(id__in=services)
+
+            cases = [
+                (
+                    'folio page',
+                    lambda: JSONRenderer().render(FolioSerializer(folios, many=True).data),
+                    lambda: FastJSONRenderer().render(folio_payloads(folio_rows(folios))),
+                ),
+                (
+                    'charge',
+                    lambda: JSONRenderer().render(ChargeSerializer(charge).data),
+                    lambda: FastJSONRenderer().render(charge_payload(charge)),
+                ),
+                (
+                    'service list',
+                    lambda: JSONRenderer().render(ServiceSerializer(service_queryset, many=True).data),
+                    lambda: FastJSONRenderer().render(service_payloads(service_rows(service_queryset))),
+                ),
+            ]
+            results = []
+            for name, generic, fast in cases:
+                # Warm up query compilation and caches before timing
+                generic()
+                fast()
+                results.append((name, self._time(generic, rounds), self._time(fast, rounds)))
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'{rounds} responses per case')
+        for name, generic, fast in results:
+            self.stdout.write(
+                f'{name:>12}: serializer {rounds / generic:9.1f}/s, '
+                f'fast {rounds / fast:9.1f}/s ({generic / fast:.1f}x)'
+            )
+        self.stdout.write(self.style.SUCCESS('Benchmark complete.'))
+
+    def _seed(self, folio_count, charges_per_folio):
+        services = []
+        for i, service_type in enumerate(['fixed', 'per_unit', 'variable']):
+            service = Service.objects.create(
+                name=f'Benchmark Service {i}',
+                service_type=service_type,
+                base_price=Decimal('12.50')
+            )
+            PricingRule.objects.create(
+                service=service, name='VAT', rule_type='tax', value=Decimal('16.00')
+            )
+            PricingRule.objects.create(
+                service=service, name='Service Charge', rule_type='surcharge',
+                value=Decimal('10.00'), priority=1
+            )
+            services.append(service.id)
+
+        service = Service.objects.get(id=services[1])
+        for i in range(folio_count):
+            folio = Folio.objects.create(
+                guest=Guest.objects.create(
+                    name=f'Benchmark Guest {i}',
+                    room_number=f'BENCH-SER-{i}',
+                    check_in=timezone.now()
+                )
+            )
+            for j in range(charges_per_folio):
+                folio.add_charge(service=service, quantity=1 + j % 3)
+        return services
+
+    def _time(self, build, rounds):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            build()
+        return time.perf_counter() - start
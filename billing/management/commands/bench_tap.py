@@ -0,0 +1,159 @@
+"""
+Management command to compare the sync and async tap views under concurrency.
+"""
+import asyncio
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.test import AsyncRequestFactory, RequestFactory, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from billing.async_views import charge_by_room_async
+from billing.events import InMemoryBroker, set_broker
+from billing.models import Guest, Folio
+from billing.views import charge_by_room
+from services.models import Service, PricingRule
+from sysnyx.testing import LOCMEM_CACHES
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of latencies."""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = (
+        'Fires concurrent taps at charge_by_room (thread pool, as under WSGI) and '
+        'charge_by_room_async (one event loop, as under ASGI) and reports throughput and latency'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--taps', type=int, default=500, help='Taps per mode')
+        parser.add_argument('--concurrency', type=int, default=20, help='Taps in flight at once')
+        parser.add_argument('--rooms', type=int, default=50, help='Occupied rooms to spread taps over')
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency']
+        previous_broker = set_broker(InMemoryBroker())
+        # Benchmark rows are deleted afterwards, which the audit chain forbids
+        with override_settings(AUDIT_CAPTURE=False, CACHES=LOCMEM_CACHES):
+            fixtures = self._seed(options['rooms'], concurrency)
+            try:
+                results = [
+                    ('sync', self._run_sync(fixtures, options['taps'], concurrency)),
+                    ('async', self._run_async(fixtures, options['taps'], concurrency)),
+                ]
+            finally:
+                self._cleanup(fixtures)
+                set_broker(previous_broker)
+
+        self.stdout.write(f"{options['taps']} taps per mode, {concurrency} in flight")
+        for name, (elapsed, latencies, errors) in results:
+            self.stdout.write(
+                f'{name:>6}: {len(latencies) / elapsed:8.1f} taps/s, '
+                f'p50 {percentile(latencies, 50) * 1000:7.2f} ms, '
+                f'p99 {percentile(latencies, 99) * 1000:7.2f} ms, '
+                f'{errors} errors'
+            )
+        self.stdout.write(self.style.SUCCESS('Benchmark complete.'))
+
+    def _seed(self, room_count, token_count):
+        run = uuid.uuid4().hex[:8]
+        service = Service.objects.create(
+            name=f'Benchmark Tap {run}',
+            service_type='per_unit',
+            base_price=Decimal('4.00')
+        )
+        PricingRule.objects.create(service=service, name='VAT', rule_type='tax', value=Decimal('16.00'))
+        rooms = []
+        for i in range(room_count):
+            guest = Guest.objects.create(
+                name=f'Benchmark Guest {i}',
+                room_number=f'BT{run}-{i}',
+                check_in=timezone.now()
+            )
+            Folio.objects.create(guest=guest)
+            rooms.append(guest.room_number)
+        # One reader account per worker keeps each under the per-user throttle
+        tokens = []
+        for i in range(token_count):
+            user = User.objects.create_user(username=f'bench-tap-{run}-{i}')
+            tokens.append(Token.objects.create(user=user).key)
+        return {'service': service, 'rooms': rooms, 'tokens': tokens, 'run': run}
+
+    def _cleanup(self, fixtures):
+        Guest.objects.filter(room_number__startswith=f"BT{fixtures['run']}-").delete()
+        User.objects.filter(username__startswith=f"bench-tap-{fixtures['run']}-").delete()
+        fixtures['service'].delete()
+
+    def _body(self, fixtures, i):
+        return json.dumps({
+            'service_id': fixtures['service'].id,
+            'quantity': 1 + i % 3,
+            'idempotency_key': str(uuid.uuid4()),
+        })
+
+    def _run_sync(self, fixtures, taps, concurrency):
+        factory = RequestFactory()
+        rooms, tokens = fixtures['rooms'], fixtures['tokens']
+
+        def tap(i):
+            room = rooms[i % len(rooms)]
+            request = factory.post(
+                f'/api/billing/charge/{room}/',
+                self._body(fixtures, i),
+                content_type='application/json',
+                HTTP_AUTHORIZATION=f'Token {tokens[i % len(tokens)]}'
+            )
+            start = time.perf_counter()
+            try:
+                response = charge_by_room(request, room_number=room)
+            finally:
+                close_old_connections()
+            return time.perf_counter() - start, response.status_code
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(tap, range(taps)))
+        return self._summarize(time.perf_counter() - start, outcomes)
+
+    def _run_async(self, fixtures, taps, concurrency):
+        factory = AsyncRequestFactory()
+        rooms, tokens = fixtures['rooms'], fixtures['tokens']
+
+        async def main():
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def tap(i):
+                room = rooms[i % len(rooms)]
+                request = factory.post(
+                    f'/api/billing/charge/{room}/',
+                    self._body(fixtures, i),
+                    content_type='application/json',
+                    headers={'Authorization': f'Token {tokens[i % len(tokens)]}'}
+                )
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await charge_by_room_async(request, room_number=room)
+                    return time.perf_counter() - start, response.status_code
+
+            start = time.perf_counter()
+            outcomes = await asyncio.gather(*(tap(i) for i in range(taps)))
+            return time.perf_counter() - start, outcomes
+
+        elapsed, outcomes = asyncio.run(main())
+        return self._summarize(elapsed, outcomes)
+
+    def _summarize(self, elapsed, outcomes):
+        latencies = [latency for latency, status_code in outcomes if status_code == 201]
+        errors = len(outcomes) - len(latencies)
+        return elapsed, latencies, errors
@@ -0,0 +1,283 @@
+"""
+Management command to load-test the API end to end with a simulated tap storm.
+"""
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import http.client
+import multiprocessing
+from collections import defaultdict
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+from django.db import connection, connections
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from billing.events import InMemoryBroker, set_broker
+from billing.models import Guest, Folio
+from services.models import Service, PricingRule
+from .bench_tap import percentile
+
+
+# A LocMemCache that also counts hits and misses for the report
+INSTRUMENTED_CACHES = {
+    'default': {'BACKEND': 'sysnyx.metrics.InstrumentedLocMemCache'}
+}
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LoadTestServer(ThreadedWSGIServer):
+    # Hundreds of clients connect at once; the default backlog of 10 would
+    # show up as connect latency rather than server time
+    request_queue_size = 1024
+
+
+def _serve(server):
+    connections.close_all()
+    server.serve_forever()
+
+
+class Command(BaseCommand):
+    help = (
+        'Starts the app on a throwaway database and drives it with simulated NFC readers '
+        'tapping charge_by_room plus front-desk folio reads and payments, then reports '
+        'throughput, p50/p95/p99 latency and error rates per operation'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=200, help='Simulated NFC readers tapping concurrently')
+        parser.add_argument('--shared-reader', action='store_true', help='Readers share one account and token, told apart only by X-Device-ID')
+        parser.add_argument('--front-desk', type=int, default=10, help='Clients reading folios and taking payments')
+        parser.add_argument('--rooms', type=int, default=2000, help='Occupied rooms to spread taps over')
+        parser.add_argument('--duration', type=float, default=20.0, help='Seconds to run the storm')
+        parser.add_argument('--think-ms', type=float, default=0.0, help='Pause between a client\'s requests')
+        parser.add_argument('--payment-ratio', type=float, default=0.2, help='Share of front-desk requests that are payments')
+        parser.add_argument('--server-processes', type=int, default=2, help='Forked server processes sharing the socket (0 serves from a thread in this process)')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed for the request mix')
+
+    def handle(self, *args, **options):
+        if options['server_processes'] > 0 and not hasattr(os, 'fork'):
+            raise CommandError('--server-processes needs os.fork; use --server-processes 0.')
+
+        tmpdir = tempfile.mkdtemp(prefix='sysnyx-loadtest-')
+        old_name, old_settings = self._create_database(tmpdir)
+        previous_broker = set_broker(InMemoryBroker())
+        try:
+            # Offline: caches and the event broker stay in process
+            with override_settings(CACHES=INSTRUMENTED_CACHES, SLOW_QUERY_ENABLED=False):
+                fixtures = self._seed(options)
+                self.stdout.write(
+                    f"Seeded {options['rooms']} rooms; {options['readers']} "
+                    f"{'readers on one account' if options['shared_reader'] else 'readers'} and "
+                    f"{options['front_desk']} front-desk clients for {options['duration']:.0f}s"
+                )
+                results, elapsed = self._storm(fixtures, options)
+        finally:
+            set_broker(previous_broker)
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            connection.settings_dict.update(old_settings)
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+        self._report(results, elapsed)
+        if connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING(
+                'SQLite allows one writer at a time, so concurrent taps fail with "database is locked"; '
+                'set DATABASE_URL to a local PostgreSQL for representative numbers.'
+            ))
+        self.stdout.write(self.style.SUCCESS('Load test complete.'))
+
+    def _create_database(self, tmpdir):
+        """
+        Create and migrate a throwaway database next to the configured one.
+        
+        It gets a name of its own rather than the test database's, so a
+        load test never drops a database it didn't create.
+        """
+        old_settings = {
+            'TEST': dict(connection.settings_dict.get('TEST', {})),
+            'OPTIONS': dict(connection.settings_dict.get('OPTIONS', {})),
+        }
+        if connection.vendor == 'sqlite':
+            # A file, not shared-cache memory, so forked servers see one database
+            name = os.path.join(tmpdir, 'loadtest.sqlite3')
+            connection.settings_dict['OPTIONS'] = {**old_settings['OPTIONS'], 'timeout': 30}
+        else:
+            # Within PostgreSQL's 63-character identifier limit
+            name = f"loadtest_{connection.settings_dict['NAME']}"[:50] + f'_{uuid.uuid4().hex[:12]}'
+        connection.settings_dict['TEST'] = {**old_settings['TEST'], 'NAME': name}
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, serialize=False)
+        return old_name, old_settings
+
+    def _seed(self, options):
+        now = timezone.now()
+        services = []
+        for name, price in (('Pool Bar', '6.50'), ('Spa Treatment', '45.00'), ('Minibar', '4.00')):
+            service = Service.objects.create(name=name, service_type='per_unit', base_price=Decimal(price))
+            PricingRule.objects.create(service=service, name='VAT', rule_type='tax', value=Decimal('16.00'))
+            services.append(service.id)
+
+        guests = Guest.objects.bulk_create([
+            Guest(name=f'Load Guest {i}', room_number=f'L{i:05d}', check_in=now)
+            for i in range(options['rooms'])
+        ])
+        folios = Folio.objects.bulk_create([Folio(guest=guest) for guest in guests])
+
+        def tokens(prefix, count, **fields):
+            users = User.objects.bulk_create([
+                User(username=f'{prefix}-{i}', **fields) for i in range(count)
+            ])
+            return [
+                token.key for token in
+                Token.objects.bulk_create([Token(user=user, key=Token.generate_key()) for user in users])
+            ]
+
+        return {
+            'services': services,
+            'rooms': [guest.room_number for guest in guests],
+            'folios': [folio.id for folio in folios],
+            'reader_tokens': (
+                tokens('load-reader', 1) * options['readers'] if options['shared_reader']
+                else tokens('load-reader', options['readers'])
+            ),
+            'desk_tokens': tokens('load-desk', options['front_desk'], is_staff=True),
+        }
+
+    def _start_server(self, processes):
+        server = LoadTestServer(('127.0.0.1', 0), QuietRequestHandler)
+        server.set_app(get_internal_wsgi_application())
+        connections.close_all()
+        if processes == 0:
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            return server, []
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=_serve, args=(server,), daemon=True) for _ in range(processes)]
+        for worker in workers:
+            worker.start()
+        return server, workers
+
+    def _storm(self, fixtures, options):
+        server, workers = self._start_server(options['server_processes'])
+        port = server.server_address[1]
+        deadline = time.monotonic() + options['duration']
+        think = options['think_ms'] / 1000
+        results = defaultdict(list)
+        lock = threading.Lock()
+
+        def request(method, path, token, body=None, headers=None):
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            headers = {'Authorization': f'Token {token}', **(headers or {})}
+            if body is not None:
+                body = json.dumps(body)
+                headers['Content-Type'] = 'application/json'
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                status = 0
+            finally:
+                conn.close()
+            return time.perf_counter() - start, status
+
+        def reader(i):
+            rng = random.Random(options['seed'] * 100003 + i)
+            token = fixtures['reader_tokens'][i]
+            samples = []
+            while time.monotonic() < deadline:
+                room = rng.choice(fixtures['rooms'])
+                samples.append(request('POST', f'/api/billing/charge/{room}/', token, {
+                    'service_id': rng.choice(fixtures['services']),
+                    'quantity': rng.randint(1, 3),
+                    'idempotency_key': str(uuid.uuid4()),
+                }, {'X-Device-ID': f'load-reader-{i}'}))
+                if think:
+                    time.sleep(think)
+            with lock:
+                results['tap'].extend(samples)
+
+        def front_desk(i):
+            rng = random.Random(options['seed'] * 200003 + i)
+            token = fixtures['desk_tokens'][i]
+            samples = defaultdict(list)
+            while time.monotonic() < deadline:
+                folio_id = rng.choice(fixtures['folios'])
+                if rng.random() < options['payment_ratio']:
+                    samples['payment'].append(request('POST', '/api/payments/create/', token, {
+                        'folio_id': folio_id,
+                        'amount': '5.00',
+                        'payment_method': 'cash',
+                    }, {'Idempotency-Key': str(uuid.uuid4())}))
+                else:
+                    samples['folio read'].append(request('GET', f'/api/billing/folios/{folio_id}/', token))
+                if think:
+                    time.sleep(think)
+            with lock:
+                for kind, values in samples.items():
+                    results[kind].extend(values)
+
+        threads = [threading.Thread(target=reader, args=(i,)) for i in range(options['readers'])]
+        threads += [threading.Thread(target=front_desk, args=(i,)) for i in range(options['front_desk'])]
+        start = time.perf_counter()
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+        finally:
+            for worker in workers:
+                worker.terminate()
+                worker.join()
+            if not workers:
+                server.shutdown()
+            server.server_close()
+        return results, elapsed
+
+    def _report(self, results, elapsed):
+        self.stdout.write(
+            f"{'operation':<12} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+            f"{'p99 ms':>8} {'errors':>7} {'429s':>6}"
+        )
+        everything = []
+        for kind in ('tap', 'folio read', 'payment'):
+            samples = results.get(kind, [])
+            everything.extend(samples)
+            self._row(kind, samples, elapsed)
+        self._row('total', everything, elapsed)
+
+        statuses = defaultdict(int)
+        for _, status in everything:
+            statuses[status] += 1
+        breakdown = ', '.join(
+            f"{'connection error' if status == 0 else status}: {count}"
+            for status, count in sorted(statuses.items())
+        )
+        self.stdout.write(f'Status codes: {breakdown}')
+
+    def _row(self, kind, samples, elapsed):
+        ok = [latency for latency, status in samples if 200 <= status < 300]
+        throttled = sum(1 for _, status in samples if status == 429)
+        errors = len(samples) - len(ok) - throttled
+        rate = f'{errors / len(samples):6.1%}' if samples else '     -'
+        self.stdout.write(
+            f'{kind:<12} {len(samples):>9} {len(samples) / elapsed:>8.1f} '
+            f'{percentile(ok, 50) * 1000:>8.2f} {percentile(ok, 95) * 1000:>8.2f} '
+            f'{percentile(ok, 99) * 1000:>8.2f} {rate:>7} {throttled:>6}'
+        )
@@ -0,0 +1,120 @@
+"""
+Management command to recompute folio totals from charges and payments in bulk.
+"""
+import multiprocessing
+import os
+import time
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.db.models import Max, Min
+from billing.models import Folio
+from billing.recalc import drifted, recompute_folios
+
+
+# Handed to forked workers by inheritance rather than pickling
+_job = {}
+
+
+def _folios(options):
+    queryset = Folio.objects.order_by()
+    if options['status']:
+        queryset = queryset.filter(status__in=options['status'])
+    if options['min_id'] is not None:
+        queryset = queryset.filter(id__gte=options['min_id'])
+    if options['max_id'] is not None:
+        queryset = queryset.filter(id__lte=options['max_id'])
+    if options['updated_since'] is not None:
+        queryset = queryset.filter(updated_at__date__gte=options['updated_since'])
+    return queryset
+
+
+def _process(bounds):
+    """Recompute (or with --dry-run, compare) one id range: (count, sample differences)."""
+    start, stop = bounds
+    queryset = _folios(_job['options']).filter(id__gte=start, id__lt=stop)
+    if _job['options']['dry_run']:
+        rows = drifted(queryset).order_by('id').values_list(
+            'id', 'total_charges', 'computed_charges', 'total_payments', 'computed_payments', 'balance'
+        )
+        rows = list(rows)
+        return len(rows), rows[:_job['options']['show']]
+    with transaction.atomic():
+        return recompute_folios(queryset), []
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes total_charges, total_payments and balance of all (or filtered) folios '
+        'with set-based UPDATEs by id range; --dry-run reports the differences instead'
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--status', action='append', choices=[choice for choice, _ in Folio.STATUS_CHOICES],
+                            help='Only folios with this status (repeatable)')
+        parser.add_argument('--min-id', type=int, default=None, help='Lowest folio id')
+        parser.add_argument('--max-id', type=int, default=None, help='Highest folio id')
+        parser.add_argument('--updated-since', type=date.fromisoformat, default=None,
+                            help='Only folios updated on or after this date, YYYY-MM-DD')
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Folio ids per UPDATE and transaction')
+        parser.add_argument('--workers', type=int, default=1, help='Parallel processes, each taking id ranges')
+        parser.add_argument('--dry-run', action='store_true', help='Report folios whose totals differ; change nothing')
+        parser.add_argument('--show', type=int, default=20, help='Differences listed with --dry-run')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1 or options['workers'] < 1:
+            raise CommandError('--chunk-size and --workers must be positive.')
+        if options['workers'] > 1 and connection.vendor == 'sqlite':
+            raise CommandError('SQLite allows one writer at a time; use --workers 1.')
+        if options['workers'] > 1 and not hasattr(os, 'fork'):
+            raise CommandError('Parallel workers need os.fork; use --workers 1.')
+
+        started = time.perf_counter()
+        bounds = _folios(options).aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            self.stdout.write(self.style.SUCCESS('No folios match.'))
+            return
+        ranges = [
+            (start, min(start + options['chunk_size'], bounds['high'] + 1))
+            for start in range(bounds['low'], bounds['high'] + 1, options['chunk_size'])
+        ]
+
+        _job['options'] = options
+        try:
+            if options['workers'] == 1:
+                results = map(_process, ranges)
+                total, samples = self._collect(results, len(ranges), options['show'])
+            else:
+                # Children must open their own connections
+                connections.close_all()
+                context = multiprocessing.get_context('fork')
+                with context.Pool(options['workers']) as pool:
+                    total, samples = self._collect(
+                        pool.imap_unordered(_process, ranges), len(ranges), options['show']
+                    )
+        finally:
+            _job.clear()
+
+        elapsed = time.perf_counter() - started
+        if options['dry_run']:
+            for folio_id, charges, computed_charges, payments, computed_payments, balance in sorted(samples):
+                self.stdout.write(
+                    f'  folio {folio_id}: charges {charges:.2f} -> {computed_charges:.2f}, '
+                    f'payments {payments:.2f} -> {computed_payments:.2f}, '
+                    f'balance {balance:.2f} -> {computed_charges - computed_payments:.2f}'
+                )
+            if total > len(samples):
+                self.stdout.write(f'  ... and {total - len(samples)} more')
+            self.stdout.write(self.style.SUCCESS(f'{total} folios have drifted totals ({elapsed:.1f}s, nothing changed).'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Recomputed totals of {total} folios ({elapsed:.1f}s).'))
+
+    def _collect(self, results, chunks, show):
+        total, samples = 0, []
+        for done, (count, rows) in enumerate(results, 1):
+            total += count
+            samples.extend(rows[:show - len(samples)])
+            if done == chunks or done % max(1, chunks // 20) == 0:
+                self.stdout.write(f'  {done}/{chunks} ranges, {total} folios')
+        return total, samples
@@ -0,0 +1,151 @@
+"""
+Management command to generate a mega-resort's worth of history for benchmarking.
+"""
+import multiprocessing
+import os
+import time
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+from billing.models import Guest, Folio, Charge
+from billing.synthetic import (
+    AuditChainWriter, ChunkBuilder, create_catalogue, history_end, plan, reset_sequences,
+    write_chunk,
+)
+from payments.models import Payment
+
+
+# Handed to forked workers by inheritance rather than pickling
+_job = {}
+
+
+def _write_tables(index):
+    built = _job['builder'].build(_job['chunks'][index], audit=False)
+    return write_chunk(built)
+
+
+def _write_audit():
+    writer = AuditChainWriter()
+    for spec in _job['chunks']:
+        writer.write(_job['builder'].build(spec)['audit'])
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Fills an empty database with a large resort\'s history (rooms, guests, folios, '
+        'charges, payments and the audit chain) with realistic distributions, '
+        'deterministic for a given seed'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=5000, help='Rooms in the resort')
+        parser.add_argument('--guests', type=int, default=1000000, help='Guests (stays) over the whole history')
+        parser.add_argument('--charges', type=int, default=50000000, help='Approximate total charges')
+        parser.add_argument('--days', type=int, default=730, help='Days of history')
+        parser.add_argument('--end', type=date.fromisoformat, default=None,
+                            help='Last day of the history, YYYY-MM-DD (defaults to today; fix it to reproduce a run exactly)')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Parallel writer processes (defaults to the CPU count on PostgreSQL, 1 elsewhere)')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Guests generated and written per transaction')
+        parser.add_argument('--no-audit', action='store_true', help='Skip the audit log, which is hashed serially')
+
+    def handle(self, *args, **options):
+        if min(options['rooms'], options['guests'], options['days'], options['chunk_size']) < 1:
+            raise CommandError('--rooms, --guests, --days and --chunk-size must be positive.')
+        workers = options['workers']
+        if workers is None:
+            workers = (os.cpu_count() or 1) if connection.vendor == 'postgresql' else 1
+        if workers > 1 and connection.vendor == 'sqlite':
+            raise CommandError('SQLite allows one writer at a time; use --workers 1.')
+        if workers > 1 and not hasattr(os, 'fork'):
+            raise CommandError('Parallel workers need os.fork; use --workers 1.')
+        for model in (Guest, Folio, Charge, Payment):
+            if model.objects.exists():
+                raise CommandError(
+                    f'{model._meta.verbose_name_plural} already exist; seed_resort fills an empty database '
+                    '(run "manage.py flush" first).'
+                )
+
+        started = time.perf_counter()
+        end = history_end(options['end'] or timezone.now().date())
+        with override_settings(SLOW_QUERY_ENABLED=False):
+            with transaction.atomic():
+                catalogue = create_catalogue()
+            chunks = plan(
+                options['rooms'], options['guests'], options['charges'], options['days'],
+                options['seed'], options['chunk_size']
+            )
+            self.stdout.write(
+                f"Planned {options['guests']} stays in {options['rooms']} rooms over {options['days']} days "
+                f"to {end.date() - timedelta(days=1)}: {len(chunks)} chunks, {workers} worker(s)"
+            )
+            builder = ChunkBuilder(catalogue, end, options['days'], options['seed'])
+            audit = not options['no_audit']
+            if workers == 1:
+                totals = self._run_serial(builder, chunks, audit, started)
+            else:
+                totals = self._run_parallel(builder, chunks, audit, workers, started)
+            reset_sequences()
+
+        elapsed = time.perf_counter() - started
+        rows = sum(totals.values())
+        summary = ', '.join(f'{count} {name}' for name, count in totals.items())
+        self.stdout.write(f'Wrote {summary} in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)')
+        self.stdout.write(self.style.SUCCESS('Resort seeded.'))
+
+    def _progress(self, done, total, rows, started):
+        if done == total or done % max(1, total // 20) == 0:
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'  {done}/{total} chunks, {rows:,} rows, {elapsed:.0f}s')
+
+    def _tally(self, totals, counts):
+        for model, count in counts.items():
+            name = model._meta.verbose_name_plural
+            totals[name] = totals.get(name, 0) + count
+
+    def _run_serial(self, builder, chunks, audit, started):
+        totals = {}
+        writer = AuditChainWriter() if audit else None
+        for done, spec in enumerate(chunks, 1):
+            built = builder.build(spec, audit=audit)
+            self._tally(totals, write_chunk(built))
+            if writer is not None:
+                writer.write(built['audit'])
+            self._progress(done, len(chunks), sum(totals.values()), started)
+        if writer is not None:
+            totals['audit log entries'] = writer.written
+        return totals
+
+    def _run_parallel(self, builder, chunks, audit, workers, started):
+        _job.update(builder=builder, chunks=chunks)
+        # Children must open their own connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        auditor = context.Process(target=_write_audit) if audit else None
+        totals = {}
+        try:
+            if auditor is not None:
+                auditor.start()
+            with context.Pool(workers) as pool:
+                for done, counts in enumerate(pool.imap_unordered(_write_tables, range(len(chunks))), 1):
+                    self._tally(totals, counts)
+                    self._progress(done, len(chunks), sum(totals.values()), started)
+            if auditor is not None:
+                self.stdout.write('  waiting for the audit chain...')
+                auditor.join()
+                if auditor.exitcode != 0:
+                    raise CommandError(f'Audit writer failed (exit code {auditor.exitcode}).')
+                auditor = None
+        finally:
+            if auditor is not None and auditor.is_alive():
+                auditor.terminate()
+                auditor.join()
+            _job.clear()
+        if audit:
+            from audit.models import AuditLog
+            totals['audit log entries'] = AuditLog.objects.count()
+        return totals
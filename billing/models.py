@@ -2,11 +2,21 @@
 Billing models for guests, folios, and charges.
 """
 from decimal import Decimal
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import F
+from django.db.models.sql import UpdateQuery
 from django.core.validators import MinValueValidator
+from audit.capture import AuditTrackedMixin, capture
 from services.models import Service
 
 
+def _update_returns_rows(connection):
+    """Whether the backend supports UPDATE ... RETURNING."""
+    if connection.vendor == 'postgresql':
+        return True
+    return connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 35)
+
+
 class Guest(models.Model):
     """
     Hotel guest information.
@@ -30,12 +40,21 @@ class Guest(models.Model):
     
     def __str__(self):
         return f"{self.name} - Room {self.room_number}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The stored room, so sync.signals can tell a room move without a SELECT
+        instance._loaded_room_number = instance.__dict__.get('room_number')
+        return instance
 
 
-class Folio(models.Model):
+class Folio(AuditTrackedMixin, models.Model):
     """
     Guest billing folio aggregating all charges and payments.
     """
+    audit_fields = ('status', 'total_charges', 'total_payments', 'balance', 'settled_at')
+    
     STATUS_CHOICES = [
         ('open', 'Open'),
         ('settled', 'Settled'),
@@ -66,6 +85,11 @@ class Folio(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     settled_at = models.DateTimeField(null=True, blank=True)
+    version = models.PositiveIntegerField(
+        default=1,
+        editable=False,
+        help_text='Bumped on every save; clients revalidate against it'
+    )
     
     class Meta:
         ordering = ['-created_at']
@@ -73,6 +97,63 @@ class Folio(models.Model):
     def __str__(self):
         return f"Folio for {self.guest.name} - {self.status}"
     
+    def save(self, *args, **kwargs):
+        """
+        Save the folio, bumping its version when it already exists.
+        
+        The bump happens in the UPDATE itself, so two saves of copies loaded
+        from the same row still get different versions (and ETags).
+        """
+        if self._state.adding:
+            super().save(*args, **kwargs)
+            return
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = [*update_fields, 'version']
+        loaded_version = self.version
+        self.version = F('version') + 1
+        try:
+            super().save(*args, **kwargs)
+        except BaseException:
+            self.version = loaded_version
+            raise
+    
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        """
+        Run the UPDATE and read back the version it wrote.
+        
+        PostgreSQL and SQLite 3.35+ return it from the UPDATE itself. Other
+        backends read it in the same transaction, while the row is still
+        locked.
+        """
+        if not any(field.name == 'version' for field, _, _ in values):
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+        filtered = base_qs.filter(pk=pk_val)
+        connection = connections[using]
+        if not _update_returns_rows(connection):
+            with transaction.atomic(using=using):
+                if not super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update):
+                    return False
+                self.version = filtered.values_list('version', flat=True).get()
+            return True
+        query = filtered.query.chain(UpdateQuery)
+        query.add_update_fields(values)
+        query.annotations = {}
+        statement, params = query.get_compiler(using).as_sql()
+        column = connection.ops.quote_name(self._meta.get_field('version').column)
+        with connection.cursor() as cursor:
+            cursor.execute(f'{statement} RETURNING {column}', params)
+            row = cursor.fetchone()
+        if row is None:
+            return False
+        self.version = row[0]
+        return True
+    
+    def audit_saved(self, created, old_values, new_values):
+        """Record settlement and cancellation."""
+        if not created and new_values.get('status') in ('settled', 'cancelled'):
+            capture(f"folio_{new_values['status']}", self, old_values, new_values)
+    
     def recalculate_totals(self):
         """
         Recalculate folio totals from charges and payments.
@@ -94,7 +175,22 @@ class Folio(models.Model):
         self.balance = charges_sum - payments_sum
         self.save()
     
-    def add_charge(self, service, quantity=1, extras=None, description=''):
+    def totals_changed(self):
+        """
+        Bring totals up to date after a charge or payment.
+        
+        Recalculates now, or coalesced with other writes when
+        FOLIO_RECALC_MODE is 'deferred' (see billing.recalc).
+        """
+        from .recalc import defer_recalculation, deferred
+        
+        if deferred():
+            defer_recalculation(self)
+        else:
+            self.recalculate_totals()
+    
+    def add_charge(self, service, quantity=1, extras=None, description='', idempotency_key='',
+                   context=None, rules=None):
         """
         Add a charge to this folio.
         
@@ -103,12 +199,15 @@ class Folio(models.Model):
             quantity: Quantity for per_unit services
             extras: Menu items for variable services
             description: Optional charge description
+            idempotency_key: Optional key identifying the originating tap
+            context: Optional pricing context (e.g., {'time': tap time})
+            rules: Service's active pricing rules, if already fetched
         
         Returns:
             Charge: Created charge instance
         """
         base_amount = service.calculate_amount(quantity=quantity, extras=extras)
-        final_amount, breakdown = service.apply_rules(base_amount)
+        final_amount, breakdown = service.apply_rules(base_amount, context, rules)
         
         charge = Charge.objects.create(
             folio=self,
@@ -117,17 +216,31 @@ class Folio(models.Model):
             quantity=quantity,
             base_amount=base_amount,
             final_amount=final_amount,
-            breakdown=breakdown
+            breakdown=breakdown,
+            idempotency_key=idempotency_key
         )
         
-        self.recalculate_totals()
+        self.totals_changed()
+        
+        from .events import publish_folio_event
+        publish_folio_event('charge.posted', self, charge={
+            'id': charge.id,
+            'description': charge.description,
+            'final_amount': str(charge.final_amount),
+            'created_at': charge.created_at.isoformat(),
+        })
         return charge
 
 
-class Charge(models.Model):
+class Charge(AuditTrackedMixin, models.Model):
     """
     Individual charge on a folio.
     """
+    audit_fields = (
+        'folio_id', 'service_id', 'description', 'quantity',
+        'base_amount', 'final_amount'
+    )
+    
     folio = models.ForeignKey(
         Folio,
         on_delete=models.CASCADE,
@@ -164,6 +277,13 @@ class Charge(models.Model):
     
     def __str__(self):
         return f"{self.description} - ${self.final_amount}"
+    
+    def audit_saved(self, created, old_values, new_values):
+        """Record creation and any later modification."""
+        if created:
+            capture('charge_created', self, new_values=new_values)
+        elif new_values:
+            capture('charge_modified', self, old_values, new_values)
 
 
 class GuestSession(models.Model):
@@ -0,0 +1,166 @@
+"""
+Hand-tuned read paths for folio and charge responses.
+
+These build the same payloads as FolioSerializer and ChargeSerializer from
+``.values()`` rows: one query for a page of folios with their guests and one
+for all of their charges, whatever the page size.
+"""
+from decimal import Decimal
+from django.db.models import Count, Max, Sum
+from services.catalog import catalog_version
+from sysnyx.conditional import make_etag
+from sysnyx.renderers import format_datetime, format_decimal, row_mapper
+from .models import Folio, Charge
+
+
+CENTS = Decimal('0.01')
+
+
+GUEST_FIELDS = (
+    ('id', 'guest__id', None),
+    ('name', 'guest__name', None),
+    ('email', 'guest__email', None),
+    ('phone', 'guest__phone', None),
+    ('room_number', 'guest__room_number', None),
+    ('check_in', 'guest__check_in', format_datetime),
+    ('check_out', 'guest__check_out', format_datetime),
+    ('is_active', 'guest__is_active', None),
+    ('created_at', 'guest__created_at', format_datetime),
+    ('updated_at', 'guest__updated_at', format_datetime),
+)
+
+CHARGE_FIELDS = (
+    ('id', 'id', None),
+    ('service', 'service_id', None),
+    ('service_name', 'service__name', None),
+    ('description', 'description', None),
+    ('quantity', 'quantity', None),
+    ('base_amount', 'base_amount', format_decimal),
+    ('final_amount', 'final_amount', format_decimal),
+    ('breakdown', 'breakdown', None),
+    ('created_at', 'created_at', format_datetime),
+    ('created_by', 'created_by', None),
+)
+
+FOLIO_FIELDS = (
+    ('id', 'id', None),
+    ('status', 'status', None),
+    ('total_charges', 'total_charges', format_decimal),
+    ('total_payments', 'total_payments', format_decimal),
+    ('balance', 'balance', format_decimal),
+    ('created_at', 'created_at', format_datetime),
+    ('updated_at', 'updated_at', format_datetime),
+    ('settled_at', 'settled_at', format_datetime),
+)
+
+_guest = row_mapper(GUEST_FIELDS)
+_charge = row_mapper(CHARGE_FIELDS)
+_folio = row_mapper(FOLIO_FIELDS)
+
+_charge_columns = ['folio_id'] + [key for _, key, _ in CHARGE_FIELDS]
+_folio_columns = [key for _, key, _ in FOLIO_FIELDS + GUEST_FIELDS]
+
+
+def charge_payload(charge):
+    """ChargeSerializer output for a Charge instance whose service is loaded."""
+    return _charge({
+        'id': charge.id,
+        'service_id': charge.service_id,
+        'service__name': charge.service.name,
+        'description': charge.description,
+        'quantity': charge.quantity,
+        # Freshly computed amounts are not yet at model precision
+        'base_amount': Decimal(charge.base_amount).quantize(CENTS),
+        'final_amount': Decimal(charge.final_amount).quantize(CENTS),
+        'breakdown': charge.breakdown,
+        'created_at': charge.created_at,
+        'created_by': charge.created_by,
+    })
+
+
+def folio_rows(queryset):
+    """The ``.values()`` rows folio_payloads() expects; safe to paginate."""
+    return queryset.values(*_folio_columns)
+
+
+def folio_payloads(rows):
+    """
+    FolioSerializer output for a page of folio rows, in their order.
+
+    Args:
+        rows: Rows from folio_rows()
+
+    Returns:
+        list: Folio dicts with nested guest and charges
+    """
+    rows = list(rows)
+    if not rows:
+        return []
+
+    charges = {row['id']: [] for row in rows}
+    # Meta ordering (-created_at) matches folio.charges.all() in the serializer
+    for row in Charge.objects.filter(folio_id__in=charges).values(*_charge_columns):
+        charges[row['folio_id']].append(_charge(row))
+
+    payloads = []
+    for row in rows:
+        data = _folio(row)
+        payloads.append({
+            'id': data['id'],
+            'guest': _guest(row),
+            'status': data['status'],
+            'total_charges': data['total_charges'],
+            'total_payments': data['total_payments'],
+            'balance': data['balance'],
+            'charges': charges[row['id']],
+            'created_at': data['created_at'],
+            'updated_at': data['updated_at'],
+            'settled_at': data['settled_at'],
+        })
+    return payloads
+
+
+def folio_payload(folio_id):
+    """FolioSerializer output for one folio, or None if it does not exist."""
+    payloads = folio_payloads(folio_rows(Folio.objects.filter(id=folio_id)))
+    return payloads[0] if payloads else None
+
+
+def folio_validators(queryset):
+    """
+    ETag and Last-Modified for a single folio, from one indexed lookup.
+
+    Charges and payments bump the folio version through totals_changed();
+    guest edits and catalog changes (service names) are folded in as well.
+
+    Returns:
+        tuple or None: (etag, last_modified), or None if the folio does not exist
+    """
+    row = queryset.values_list('id', 'version', 'updated_at', 'guest__updated_at').first()
+    if row is None:
+        return None
+    folio_id, version, updated_at, guest_updated_at = row
+    etag = make_etag('folio', folio_id, version, guest_updated_at.timestamp(), catalog_version())
+    return etag, max(updated_at, guest_updated_at)
+
+
+def folio_list_validators(queryset, path):
+    """
+    ETag and Last-Modified for a folio listing, from one aggregate query.
+
+    Versions only grow, so their sum changes on any folio write; the count
+    and highest id catch additions and removals.
+    """
+    stats = queryset.order_by().aggregate(
+        count=Count('id'),
+        last_id=Max('id'),
+        versions=Sum('version'),
+        updated_at=Max('updated_at'),
+        guest_updated_at=Max('guest__updated_at')
+    )
+    modified = [value for value in (stats['updated_at'], stats['guest_updated_at']) if value]
+    etag = make_etag(
+        'folios', path, stats['count'], stats['last_id'], stats['versions'],
+        *[value.timestamp() for value in modified], catalog_version()
+    )
+    return etag, max(modified) if modified else None
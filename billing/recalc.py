@@ -0,0 +1,165 @@
+"""
+Coalesced folio recalculation.
+
+With FOLIO_RECALC_MODE = 'immediate' (the default) every charge and
+payment recalculates its folio's totals in its own transaction.
+
+With 'deferred', a burst of charges and payments against one folio costs
+one recalculation. Each write, once committed, marks the folio dirty in
+the cache; the write that finds it clean schedules
+``billing.tasks.recalculate_dirty_folio`` FOLIO_RECALC_WINDOW seconds
+later, and the rest are counted as coalesced. The task clears the mark
+before it aggregates, so a write that lands while it runs schedules the
+next window rather than being lost.
+
+Totals, the balance and the balance in live events lag by up to the
+window; the task publishes a ``folio.recalculated`` event when they are
+current. The folio version is still bumped on every write, so conditional
+GETs never answer 304 for a folio whose charges changed.
+
+``drifted`` and ``recompute_folios`` fix totals in bulk: one UPDATE with
+correlated SUM subqueries per id range, touching only folios whose stored
+totals differ (see the recompute_folio_totals command).
+"""
+import logging
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Round
+from django.utils import timezone
+from sysnyx.metrics import get_registry
+
+
+logger = logging.getLogger(__name__)
+
+DIRTY_KEY = 'billing:recalc:dirty:{folio_id}'
+# A mark outliving its task this long (lost message, stopped worker) lets
+# the next write schedule again
+MARK_GRACE = 60
+
+
+def deferred():
+    return settings.FOLIO_RECALC_MODE == 'deferred'
+
+
+def defer_recalculation(folio):
+    """
+    Note that ``folio``'s charges or payments changed.
+
+    Bumps the folio version now and schedules the recalculation once the
+    current transaction commits.
+    """
+    Folio = type(folio)
+    Folio.objects.filter(pk=folio.pk).update(version=F('version') + 1, updated_at=timezone.now())
+    folio.version += 1
+    folio_id = folio.pk
+    transaction.on_commit(lambda: mark_dirty(folio_id))
+
+
+def mark_dirty(folio_id):
+    """
+    Mark a folio dirty, scheduling its recalculation if it was clean.
+
+    Returns:
+        bool: True if this call scheduled the recalculation
+    """
+    window = settings.FOLIO_RECALC_WINDOW
+    if not cache.add(DIRTY_KEY.format(folio_id=folio_id), 1, timeout=int(window) + MARK_GRACE):
+        get_registry().inc('sysnyx_folio_recalcs_coalesced_total', ())
+        return False
+
+    from .tasks import recalculate_dirty_folio
+    try:
+        # retry=False: without a broker, fall back now rather than after publish retries
+        recalculate_dirty_folio.apply_async((folio_id,), countdown=window, retry=False)
+    except Exception:
+        # No broker: don't leave the folio stale until the mark expires
+        logger.exception('Could not schedule recalculation of folio %s; running it now', folio_id)
+        recalculate_folio(folio_id)
+        return False
+    get_registry().inc('sysnyx_folio_recalcs_scheduled_total', ())
+    return True
+
+
+def recalculate_folio(folio_id):
+    """
+    Clear a folio's dirty mark and recalculate its totals.
+
+    Returns:
+        bool: False if the folio no longer exists
+    """
+    from .events import publish_folio_event
+    from .models import Folio
+
+    cache.delete(DIRTY_KEY.format(folio_id=folio_id))
+    with transaction.atomic():
+        # Locked so a concurrent settle or cancel isn't overwritten by the save
+        folio = Folio.objects.select_for_update().filter(pk=folio_id).first()
+        if folio is None:
+            return False
+        folio.recalculate_totals()
+        publish_folio_event('folio.recalculated', folio)
+    return True
+
+
+def computed_totals():
+    """
+    Expressions for a folio's charge total and completed-payment total.
+
+    Returns:
+        tuple: (charges, payments) to use in a Folio queryset
+    """
+    from payments.models import Payment
+    from .models import Charge
+
+    charges = Charge.objects.filter(folio=OuterRef('pk')).order_by().values('folio').annotate(
+        total=Sum('final_amount')
+    ).values('total')
+    payments = Payment.objects.filter(folio=OuterRef('pk'), status='completed').order_by().values('folio').annotate(
+        total=Sum('amount')
+    ).values('total')
+    money = DecimalField(max_digits=10, decimal_places=2)
+    zero = Value(Decimal('0.00'), output_field=money)
+    # Rounded so SQLite's float sums compare equal to the stored decimals
+    return (
+        Round(Coalesce(Subquery(charges, output_field=money), zero), 2, output_field=money),
+        Round(Coalesce(Subquery(payments, output_field=money), zero), 2, output_field=money),
+    )
+
+
+def _differs(charges, payments):
+    return ~Q(total_charges=charges) | ~Q(total_payments=payments) | ~Q(balance=charges - payments)
+
+
+def drifted(queryset):
+    """
+    Folios in ``queryset`` whose stored totals differ from their charges and payments.
+
+    Annotated with computed_charges and computed_payments.
+    """
+    charges, payments = computed_totals()
+    return queryset.annotate(computed_charges=charges, computed_payments=payments).filter(
+        _differs(F('computed_charges'), F('computed_payments'))
+    )
+
+
+def recompute_folios(queryset):
+    """
+    Recalculate the totals of every drifted folio in ``queryset`` in one UPDATE.
+
+    Fixed folios get a new version, as a save would give them, so clients
+    revalidate.
+
+    Returns:
+        int: Folios updated
+    """
+    charges, payments = computed_totals()
+    return queryset.filter(_differs(charges, payments)).update(
+        total_charges=charges,
+        total_payments=payments,
+        balance=charges - payments,
+        version=F('version') + 1,
+        updated_at=timezone.now(),
+    )
@@ -0,0 +1,582 @@
+"""
+Synthetic resort history for benchmarking.
+
+Generates years of activity for a large resort: guests staying in rooms,
+their folios, the charges they ran up, the payments that settled them and
+the audit trail those writes would have left. Shapes follow a real
+property closely enough for query plans and index sizes to be
+representative: most stays last one to four nights with a long tail,
+spending varies widely between guests, a few outlets take most of the
+charges, and taps cluster around opening hours with an evening peak.
+
+Output depends only on the seed and the options. Guests are laid out by a
+single planning pass, then split into chunks that each draw from their own
+random stream and own a precomputed id range, so chunks can be written by
+any number of parallel workers, in any order, and still produce identical
+rows with identical ids.
+
+Rows are inserted with PostgreSQL COPY where available and multi-row
+INSERTs elsewhere. ``bulk_create`` is not used because it would stamp
+every ``auto_now_add`` column with the current time and lose the history.
+"""
+import json
+import random
+import uuid
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+from audit.chain import compute_hash
+from audit.models import AuditLog, AuditChainHead, AuditCheckpoint
+from payments.models import Payment
+from services.models import Service, PricingRule
+from .models import Guest, Folio, Charge
+
+
+# Share of rooms occupied on an average night
+OCCUPANCY = 0.78
+ROOMS_PER_FLOOR = 50
+
+# name, service_type, base price, hours profile; most popular first
+CATALOGUE = (
+    ('Pool Bar', 'per_unit', '6.50', 'bar'),
+    ('Minibar', 'per_unit', '4.00', 'any'),
+    ('Restaurant Dining', 'variable', '0.00', 'meal'),
+    ('Room Service', 'variable', '0.00', 'any'),
+    ('Lobby Bar', 'per_unit', '8.00', 'bar'),
+    ('Breakfast Buffet', 'fixed', '18.00', 'morning'),
+    ('Beach Grill', 'variable', '0.00', 'meal'),
+    ('Laundry Service', 'per_unit', '8.00', 'day'),
+    ('Valet Parking', 'per_unit', '5.00', 'any'),
+    ('Spa Treatment', 'fixed', '95.00', 'day'),
+    ('Gift Shop', 'variable', '0.00', 'day'),
+    ('Massage', 'fixed', '70.00', 'day'),
+    ('Kids Club', 'fixed', '25.00', 'day'),
+    ('Golf Green Fee', 'fixed', '60.00', 'day'),
+    ('Airport Transfer', 'fixed', '45.00', 'any'),
+    ('Late Checkout', 'fixed', '30.00', 'morning'),
+    ('Boat Excursion', 'fixed', '120.00', 'day'),
+)
+# Restaurant-style outlets add a service charge before VAT
+SERVICE_CHARGED = {'Restaurant Dining', 'Room Service', 'Beach Grill'}
+# Item prices (cents) a variable charge is built from
+MENU_PRICES = (450, 650, 800, 1200, 1450, 1650, 2200, 2800, 3500, 4800)
+
+HOUR_WEIGHTS = {
+    'bar': [0] * 11 + [2, 3, 4, 4, 4, 5, 6, 8, 10, 10, 9, 7, 4],
+    'meal': [0] * 7 + [3, 4, 2, 1, 1, 6, 7, 4, 1, 1, 1, 2, 7, 9, 6, 2, 0],
+    'morning': [0] * 7 + [6, 8, 6, 4, 3] + [0] * 12,
+    'day': [0] * 9 + [4, 6, 7, 6, 6, 7, 7, 6, 5, 3] + [0] * 5,
+    'any': [1, 1] + [0] * 5 + [2, 3, 3, 3, 3, 3, 3, 3, 3, 3, 4, 5, 6, 6, 6, 4, 3],
+}
+
+FIRST_NAMES = (
+    'Amina', 'Brian', 'Chen', 'Daniela', 'Emeka', 'Fatuma', 'George', 'Hana',
+    'Ivan', 'Joy', 'Kamau', 'Lena', 'Mohammed', 'Nia', 'Oscar', 'Priya',
+    'Quentin', 'Rosa', 'Sanjay', 'Tariq', 'Uma', 'Victor', 'Wanjiru', 'Yuki',
+)
+LAST_NAMES = (
+    'Achieng', 'Becker', 'Costa', 'Dubois', 'Evans', 'Fischer', 'Garcia',
+    'Hassan', 'Ito', 'Johnson', 'Kariuki', 'Larsen', 'Mwangi', 'Novak',
+    'Otieno', 'Patel', 'Rossi', 'Smith', 'Tanaka', 'Wambui', 'Zhang',
+)
+PAYMENT_METHODS = (('card', 45), ('stripe', 25), ('mpesa', 20), ('cash', 10))
+DECLINES = ('Card declined', 'Insufficient funds', 'Authentication required')
+
+GUEST_FIELDS = (
+    'id', 'name', 'email', 'phone', 'room_number', 'check_in', 'check_out',
+    'is_active', 'created_at', 'updated_at',
+)
+FOLIO_FIELDS = (
+    'id', 'guest_id', 'status', 'total_charges', 'total_payments', 'balance',
+    'created_at', 'updated_at', 'settled_at', 'version',
+)
+CHARGE_FIELDS = (
+    'id', 'folio_id', 'service_id', 'description', 'quantity', 'base_amount',
+    'final_amount', 'breakdown', 'idempotency_key', 'created_at', 'created_by',
+)
+PAYMENT_FIELDS = (
+    'id', 'folio_id', 'amount', 'payment_method', 'status',
+    'stripe_payment_intent_id', 'stripe_token', 'mpesa_transaction_id',
+    'idempotency_key', 'metadata', 'error_message', 'created_at', 'updated_at',
+    'completed_at',
+)
+AUDIT_FIELDS = (
+    'id', 'action_type', 'entity_type', 'entity_id', 'user_id', 'actor_name',
+    'old_values', 'new_values', 'metadata', 'ip_address', 'user_agent',
+    'created_at', 'event_id', 'prev_hash', 'entry_hash',
+)
+TABLES = (
+    (Guest, GUEST_FIELDS),
+    (Folio, FOLIO_FIELDS),
+    (Charge, CHARGE_FIELDS),
+    (Payment, PAYMENT_FIELDS),
+)
+
+
+def money(cents):
+    return f'{cents // 100}.{cents % 100:02d}'
+
+
+def create_catalogue():
+    """
+    Create the resort's services and their pricing rules.
+
+    Returns:
+        list: (Service, active rules in priority order, hours profile, popularity weight)
+    """
+    services = Service.objects.bulk_create([
+        Service(name=name, service_type=service_type, base_price=Decimal(price))
+        for name, service_type, price, _ in CATALOGUE
+    ])
+    rules = []
+    for service in services:
+        if service.name in SERVICE_CHARGED:
+            rules.append(PricingRule(
+                service=service, name='Service Charge', rule_type='surcharge',
+                value=Decimal('10.00'), priority=1
+            ))
+        rules.append(PricingRule(
+            service=service, name='VAT 16%', rule_type='tax', value=Decimal('16.00'), priority=2
+        ))
+    PricingRule.objects.bulk_create(rules)
+
+    by_service = {}
+    for rule in rules:
+        by_service.setdefault(rule.service_id, []).append(rule)
+    return [
+        # Zipf-like popularity: the first outlets take most of the taps
+        (service, by_service[service.id], profile, 1 / (rank + 1) ** 1.1)
+        for rank, (service, (_, _, _, profile)) in enumerate(zip(services, CATALOGUE))
+    ]
+
+
+class ChunkSpec:
+    """A contiguous run of guests and the id ranges its rows will take."""
+    __slots__ = ('index', 'stays', 'first_guest_id', 'first_charge_id', 'first_payment_id')
+
+    def __init__(self, index, stays, first_guest_id, first_charge_id, first_payment_id):
+        self.index = index
+        self.stays = stays
+        self.first_guest_id = first_guest_id
+        self.first_charge_id = first_charge_id
+        self.first_payment_id = first_payment_id
+
+
+def _duration(rng, mean):
+    """Whole nights, at least one, geometric around ``mean``."""
+    if mean <= 1:
+        return 1
+    # floor() of an exponential with mean m averages about m - 0.5
+    return 1 + int(rng.expovariate(1 / (mean - 0.5)))
+
+
+def plan(rooms, guests, charges, days, seed, chunk_size, first_ids=(1, 1, 1)):
+    """
+    Lay out every stay and split the guests into chunks.
+
+    Each room gets an even share of the guests, placed one after another
+    across the history with gaps between stays; with probability OCCUPANCY
+    its latest guest is still in house. Guests are then numbered in
+    check-in order and each is given a charge count proportional to the
+    nights stayed times a log-normal spending propensity, scaled so the
+    total comes to about ``charges``.
+
+    Args:
+        first_ids: First guest, charge and payment id to assign
+
+    Returns:
+        list: ChunkSpec instances in id order
+    """
+    rng = random.Random(f'{seed}:plan')
+    stays = []
+    share, extra = divmod(guests, rooms)
+    mean_nights = max(1.0, days * OCCUPANCY * rooms / max(guests, 1))
+    mean_gap = mean_nights * (1 - OCCUPANCY) / OCCUPANCY
+
+    for room in range(rooms):
+        count = share + (room < extra)
+        if not count:
+            continue
+        in_house = rng.random() < OCCUPANCY
+        nights = [_duration(rng, mean_nights) for _ in range(count)]
+        available = days
+        if in_house:
+            # The latest guest checked in some nights ago and hasn't left
+            elapsed = min(rng.randrange(nights[-1]), days - 1)
+            available = days - elapsed - 1
+        past = count - in_house
+        gaps = [rng.expovariate(1 / mean_gap) if mean_gap else 0 for _ in range(past)]
+        total = sum(nights[:past]) + sum(gaps) or 1
+        scale = available / total
+        cursor = 0.0
+        for i in range(past):
+            cursor += gaps[i]
+            start = int(cursor * scale)
+            length = max(1, round(nights[i] * min(scale, 1)))
+            stays.append([start, min(start + length, days), room, False])
+            cursor += nights[i]
+        if in_house:
+            stays.append([available, None, room, True])
+
+    stays.sort(key=lambda stay: (stay[0], stay[2]))
+    weights = []
+    for start, end, _, _ in stays:
+        stayed = (end if end is not None else days) - start
+        weights.append(max(stayed, 1) * rng.lognormvariate(0, 0.75))
+    scale = charges / (sum(weights) or 1)
+
+    chunks = []
+    guest_id, charge_id, payment_id = first_ids
+    for offset in range(0, len(stays), chunk_size):
+        chunk = []
+        chunk_charges = chunk_payments = 0
+        for (start, end, room, in_house), weight in zip(
+                stays[offset:offset + chunk_size], weights[offset:offset + chunk_size]):
+            n_charges = int(weight * scale + rng.random())
+            if not n_charges:
+                n_payments = 0
+            elif in_house:
+                # A deposit taken at check-in, for some
+                n_payments = int(rng.random() < 0.3)
+            else:
+                n_payments = rng.choices((1, 2, 3), (85, 12, 3))[0] + (rng.random() < 0.04)
+            chunk.append((start, end, room, n_charges, n_payments))
+            chunk_charges += n_charges
+            chunk_payments += n_payments
+        chunks.append(ChunkSpec(len(chunks), chunk, guest_id, charge_id, payment_id))
+        guest_id += len(chunk)
+        charge_id += chunk_charges
+        payment_id += chunk_payments
+    return chunks
+
+
+class ChunkBuilder:
+    """
+    Turns a ChunkSpec into rows.
+
+    Args:
+        catalogue: Output of create_catalogue()
+        end: Aware datetime the history runs up to
+        days: Length of the history in days
+        seed: Random seed shared with plan()
+    """
+
+    def __init__(self, catalogue, end, days, seed):
+        self.services = [(service, rules) for service, rules, _, _ in catalogue]
+        self.cum_weights = []
+        total = 0
+        for _, _, _, weight in catalogue:
+            total += weight
+            self.cum_weights.append(total)
+        self.hours = []
+        for _, _, profile, _ in catalogue:
+            hours = HOUR_WEIGHTS[profile]
+            self.hours.append([sum(hours[:h + 1]) for h in range(24)])
+        self.origin = end - timedelta(days=days)
+        self.end = end
+        self.seed = seed
+        self._prices = {}
+
+    def price(self, service, rules, base_cents):
+        """Base and final amounts and breakdown, as the pricing engine computes them."""
+        key = (service.id, base_cents)
+        found = self._prices.get(key)
+        if found is None:
+            base = Decimal(base_cents).scaleb(-2)
+            final, breakdown = service.apply_rules(base, None, rules=rules)
+            found = self._prices[key] = (str(base), str(final), int(final * 100), breakdown)
+        return found
+
+    def _day(self, day, hour, rng):
+        return self.origin + timedelta(days=day, hours=hour, seconds=rng.randrange(3600),
+                                       microseconds=rng.randrange(1000000))
+
+    def _uuid(self, rng):
+        return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+    def build(self, spec, audit=True):
+        """
+        Returns:
+            dict: Model -> list of row tuples in that model's field order,
+            plus 'audit' -> list of audit row dicts in event order
+        """
+        rng = random.Random(f'{self.seed}:chunk:{spec.index}')
+        guests, folios, charges, payments, events = [], [], [], [], []
+        charge_id = spec.first_charge_id
+        payment_id = spec.first_payment_id
+
+        for number, (start, end, room, n_charges, n_payments) in enumerate(spec.stays):
+            guest_id = spec.first_guest_id + number
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            check_in = self._day(start, rng.randint(13, 20), rng)
+            check_out = self._day(end, rng.randint(7, 11), rng) if end is not None else None
+            if check_out is not None and check_out <= check_in:
+                check_out = check_in + timedelta(hours=rng.randint(2, 20))
+            until = min(check_out or self.end, self.end)
+
+            # Charges, in the order they were tapped
+            tapped = []
+            for _ in range(n_charges):
+                choice = rng.choices(range(len(self.services)), cum_weights=self.cum_weights)[0]
+                service, rules = self.services[choice]
+                if service.service_type == 'variable':
+                    quantity = 1
+                    base_cents = sum(rng.choice(MENU_PRICES) for _ in range(rng.randint(1, 4)))
+                else:
+                    quantity = rng.choices((1, 2, 3, 4), (70, 20, 7, 3))[0]
+                    base_cents = int(service.base_price * 100) * (
+                        quantity if service.service_type == 'per_unit' else 1
+                    )
+                hour = rng.choices(range(24), cum_weights=self.hours[choice])[0]
+                span = max((until - check_in).days, 0)
+                at = check_in.replace(hour=hour) + timedelta(
+                    days=rng.randint(0, span), seconds=rng.randrange(3600)
+                )
+                at = min(max(at, check_in + timedelta(minutes=5)), until)
+                tapped.append((at, service, rules, quantity, base_cents))
+            tapped.sort(key=lambda tap: tap[0])
+
+            total_cents = 0
+            for at, service, rules, quantity, base_cents in tapped:
+                base, final, final_cents, breakdown = self.price(service, rules, base_cents)
+                total_cents += final_cents
+                charges.append((
+                    charge_id, guest_id, service.id, service.name, quantity, base, final,
+                    breakdown, self._uuid(rng), at, '',
+                ))
+                if audit:
+                    events.append((at, 'charge_created', 'Charge', charge_id, 'reader', {
+                        'folio_id': guest_id, 'service_id': service.id,
+                        'description': service.name, 'quantity': quantity,
+                        'base_amount': base, 'final_amount': final,
+                    }, {}))
+                charge_id += 1
+
+            # Payments: a deposit for some guests in house, otherwise the
+            # bill split one to three ways at checkout, after the odd decline
+            paid_cents = 0
+            if n_payments and check_out is None:
+                amounts = [min(rng.choice((10000, 20000, 50000)), total_cents)]
+                declined = 0
+                paid_at = check_in + timedelta(minutes=rng.randint(2, 30))
+            elif n_payments:
+                declined = int(n_payments > 1 and rng.random() < 0.3)
+                splits = n_payments - declined
+                amounts = [total_cents // splits] * splits
+                amounts[0] += total_cents - sum(amounts)
+                paid_at = check_out - timedelta(minutes=rng.randint(5, 90))
+            else:
+                amounts, declined = [], 0
+            last_activity = until
+            for attempt in range(declined + len(amounts)):
+                failed = attempt < declined
+                cents = total_cents if failed else amounts[attempt - declined]
+                method = rng.choices(*zip(*PAYMENT_METHODS))[0]
+                created = paid_at + timedelta(seconds=attempt * rng.randint(30, 240))
+                completed = None if failed else created + timedelta(seconds=rng.randint(1, 20))
+                error = rng.choice(DECLINES) if failed else ''
+                payments.append((
+                    payment_id, guest_id, money(cents), method, 'failed' if failed else 'completed',
+                    f'pi_{rng.getrandbits(96):024x}' if method == 'stripe' else '',
+                    '',
+                    f'Q{rng.getrandbits(40):010X}' if method == 'mpesa' else '',
+                    self._uuid(rng), {}, error, created, completed or created, completed,
+                ))
+                last_activity = max(last_activity, completed or created)
+                if not failed:
+                    paid_cents += cents
+                if audit:
+                    events.append((created, 'payment_created', 'Payment', payment_id, 'frontdesk', {
+                        'folio_id': guest_id, 'amount': money(cents), 'payment_method': method,
+                        'status': 'pending', 'completed_at': None, 'error_message': '',
+                    }, {}))
+                    if failed:
+                        events.append((created, 'payment_failed', 'Payment', payment_id, 'frontdesk',
+                                       {'status': 'failed', 'error_message': error},
+                                       {'status': 'pending', 'error_message': ''}))
+                    else:
+                        events.append((completed, 'payment_processed', 'Payment', payment_id, 'frontdesk',
+                                       {'status': 'completed', 'completed_at': completed.isoformat()},
+                                       {'status': 'pending', 'completed_at': None}))
+                payment_id += 1
+
+            settled = check_out is not None
+            guests.append((
+                guest_id, f'{first} {last}',
+                f'{first}.{last}{guest_id}@example.com'.lower(),
+                f'+2547{rng.randrange(10 ** 8):08d}',
+                f'{room // ROOMS_PER_FLOOR + 1}{room % ROOMS_PER_FLOOR + 1:02d}',
+                check_in, check_out, not settled, check_in, check_out or last_activity,
+            ))
+            folios.append((
+                guest_id, guest_id, 'settled' if settled else 'open',
+                money(total_cents), money(paid_cents), money(total_cents - paid_cents),
+                check_in, last_activity, check_out,
+                # Every recalculation and the settlement saved the folio
+                1 + len(tapped) + len(amounts) + settled,
+            ))
+            if audit and settled:
+                events.append((check_out, 'folio_settled', 'Folio', guest_id, 'frontdesk', {
+                    'status': 'settled', 'settled_at': check_out.isoformat(),
+                }, {'status': 'open', 'settled_at': None}))
+
+        built = {Guest: guests, Folio: folios, Charge: charges, Payment: payments}
+        if audit:
+            events.sort(key=lambda event: (event[0], event[3]))
+            built['audit'] = [
+                {
+                    'action_type': action_type, 'entity_type': entity_type, 'entity_id': entity_id,
+                    'user_id': None, 'actor_name': actor, 'old_values': old_values,
+                    'new_values': new_values, 'metadata': {}, 'ip_address': None,
+                    'user_agent': '', 'created_at': at, 'event_id': None,
+                }
+                for at, action_type, entity_type, entity_id, actor, new_values, old_values in events
+            ]
+        return built
+
+
+def _json(value):
+    # Most metadata and old_values are empty; skip the encoder for those
+    return json.dumps(value) if value else ('{}' if isinstance(value, dict) else '[]')
+
+
+_COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if value is True:
+        return 't'
+    if value is False:
+        return 'f'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return _json(value).translate(_COPY_ESCAPES)
+    return str(value).translate(_COPY_ESCAPES)
+
+
+def uses_copy(conn=None):
+    return (conn or connection).vendor == 'postgresql'
+
+
+def insert_rows(model, fields, rows, conn=None, batch_size=2000):
+    """
+    Insert row tuples exactly as given, ids included.
+
+    Uses COPY on PostgreSQL (psycopg 2 or 3), batched multi-row INSERTs
+    elsewhere.
+    """
+    conn = conn or connection
+    if not rows:
+        return
+    opts = model._meta
+    columns = ', '.join(conn.ops.quote_name(opts.get_field(name).column) for name in fields)
+    table = conn.ops.quote_name(opts.db_table)
+
+    with conn.cursor() as cursor:
+        if uses_copy(conn):
+            buffer = StringIO()
+            for row in rows:
+                buffer.write('\t'.join(map(_copy_value, row)))
+                buffer.write('\n')
+            buffer.seek(0)
+            sql = f'COPY {table} ({columns}) FROM STDIN'
+            raw = cursor.cursor
+            if hasattr(raw, 'copy_expert'):
+                raw.copy_expert(sql, buffer)
+            else:
+                with raw.copy(sql) as copy:
+                    copy.write(buffer.getvalue())
+            return
+
+        convert = []
+        for name in fields:
+            internal = opts.get_field(name).get_internal_type()
+            if internal == 'DateTimeField':
+                convert.append(conn.ops.adapt_datetimefield_value)
+            elif internal == 'JSONField':
+                convert.append(_json)
+            else:
+                convert.append(None)
+        placeholders = ', '.join(['%s'] * len(fields))
+        sql = f'INSERT INTO {table} ({columns}) VALUES ({placeholders})'
+        for offset in range(0, len(rows), batch_size):
+            cursor.executemany(sql, [
+                [value if fn is None or value is None else fn(value) for fn, value in zip(convert, row)]
+                for row in rows[offset:offset + batch_size]
+            ])
+
+
+def write_chunk(built, conn=None):
+    """Insert one chunk's guests, folios, charges and payments in one transaction."""
+    conn = conn or connection
+    with transaction.atomic(using=conn.alias):
+        for model, fields in TABLES:
+            insert_rows(model, fields, built[model], conn)
+    return {model: len(built[model]) for model, _ in TABLES}
+
+
+class AuditChainWriter:
+    """
+    Appends generated audit rows to the hash chain.
+
+    Hashing is inherently sequential, so one writer handles every chunk, in
+    chunk order; it takes the same chain-head lock as audit.chain does.
+    """
+
+    def __init__(self):
+        self.next_id = (AuditLog.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        self.interval = settings.AUDIT_CHECKPOINT_INTERVAL
+        self.written = 0
+
+    def write(self, rows):
+        if not rows:
+            return
+        with transaction.atomic():
+            head, _ = AuditChainHead.objects.select_for_update().get_or_create(pk=1)
+            prev_hash = head.last_hash
+            sequence = head.sequence
+            records, checkpoints = [], []
+            for row in rows:
+                entry_hash = compute_hash(prev_hash, row)
+                records.append((
+                    self.next_id, row['action_type'], row['entity_type'], row['entity_id'],
+                    None, row['actor_name'], row['old_values'], row['new_values'],
+                    row['metadata'], None, '', row['created_at'], None, prev_hash, entry_hash,
+                ))
+                sequence += 1
+                if self.interval and sequence % self.interval == 0:
+                    checkpoints.append(AuditCheckpoint(
+                        entry_id=self.next_id, entry_hash=entry_hash, sequence=sequence
+                    ))
+                prev_hash = entry_hash
+                self.next_id += 1
+            insert_rows(AuditLog, AUDIT_FIELDS, records)
+            AuditCheckpoint.objects.bulk_create(checkpoints)
+            head.last_entry_id = records[-1][0]
+            head.last_hash = prev_hash
+            head.sequence = sequence
+            head.save(update_fields=['last_entry_id', 'last_hash', 'sequence'])
+        self.written += len(records)
+
+
+def reset_sequences(conn=None):
+    """Move id sequences past the explicitly numbered rows (PostgreSQL)."""
+    conn = conn or connection
+    from django.core.management.color import no_style
+    statements = conn.ops.sequence_reset_sql(no_style(), [Guest, Folio, Charge, Payment, AuditLog])
+    if statements:
+        with conn.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def history_end(day):
+    """Midnight UTC at the end of ``day``, the fixed point the history runs up to."""
+    return datetime.combine(day, time.min, tzinfo=dt_timezone.utc) + timedelta(days=1)
+
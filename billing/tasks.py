@@ -0,0 +1,11 @@
+"""
+Celery tasks for the billing module.
+"""
+from sysnyx.celery import app
+from .recalc import recalculate_folio
+
+
+@app.task(ignore_result=True)
+def recalculate_dirty_folio(folio_id):
+    """Recalculate a folio once for every write since it was marked dirty."""
+    return recalculate_folio(folio_id)
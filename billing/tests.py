@@ -1,12 +1,39 @@
 """
 Test suite for billing module.
 """
+import asyncio
+import json
+import threading
+import time
 import pytest
+from asgiref.sync import async_to_sync, sync_to_async
 from decimal import Decimal
+from io import StringIO
 from django.utils import timezone
-from datetime import timedelta
-from .models import Guest, Folio, Charge
+from datetime import date, timedelta
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import AsyncClient, AsyncRequestFactory
+from rest_framework.test import APIClient
+from rest_framework.authtoken.models import Token
+from .async_views import charge_by_room_async
+from .events import InMemoryBroker, folio_channel, set_broker
+from .models import Guest, Folio, Charge, GuestSession
+from .readers import charge_payload, folio_payloads, folio_rows
+from .recalc import DIRTY_KEY
+from .tasks import recalculate_dirty_folio
+from .serializers import ChargeSerializer, FolioSerializer
+from .synthetic import ChunkBuilder, create_catalogue, history_end, plan
+from audit.chain import verify_chain
+from audit.models import AuditLog
 from services.models import Service, PricingRule
+from payments.models import Payment
+from sysnyx.celery import app as celery_app
+from sysnyx.metrics import get_registry
+from sysnyx.testing import assert_constant_queries, count_queries, locmem_cache  # noqa: F401
+
 
 
 @pytest.mark.django_db
@@ -41,6 +68,32 @@ class TestFolioModel:
         assert folio.status == 'open'
         assert folio.balance == Decimal('0.00')
     
+    @pytest.mark.parametrize('returning', [True, False])
+    def test_concurrent_saves_get_distinct_versions(self, returning, monkeypatch):
+        """Test two copies loaded from one row don't save the same version."""
+        monkeypatch.setattr('billing.models._update_returns_rows', lambda connection: returning)
+        guest = Guest.objects.create(name='Race Guest', room_number='104', check_in=timezone.now())
+        folio = Folio.objects.create(guest=guest)
+        first = Folio.objects.get(pk=folio.pk)
+        second = Folio.objects.get(pk=folio.pk)
+        
+        first.total_charges = Decimal('10.00')
+        first.save()
+        second.status = 'settled'
+        second.save(update_fields=['status'])
+        
+        assert (first.version, second.version) == (folio.version + 1, folio.version + 2)
+        assert Folio.objects.get(pk=folio.pk).version == folio.version + 2
+    
+    def test_save_reads_version_from_the_update(self, django_assert_num_queries):
+        """Test a save is one UPDATE, with no SELECT to read the new version back."""
+        guest = Guest.objects.create(name='Returning Guest', room_number='105', check_in=timezone.now())
+        folio = Folio.objects.create(guest=guest)
+        
+        with django_assert_num_queries(1):
+            folio.save(update_fields=['status'])
+        assert folio.version == Folio.objects.get(pk=folio.pk).version == 2
+    
     def test_add_charge_to_folio(self):
         """Test adding a charge to folio."""
         guest = Guest.objects.create(
@@ -153,3 +206,560 @@ class TestChargeModel:
         
         assert existing is not None
         assert existing.id == charge1.id
+
+
+@pytest.mark.django_db
+class TestFastReaders:
+    """Tests for the values-based folio and charge readers."""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.service = Service.objects.create(
+            name='Minibar',
+            service_type='variable',
+            base_price=Decimal('0.00')
+        )
+        PricingRule.objects.create(
+            service=self.service,
+            name='VAT',
+            rule_type='tax',
+            value=Decimal('16.00')
+        )
+        self.folios = []
+        for room in ('301', '302'):
+            folio = Folio.objects.create(
+                guest=Guest.objects.create(
+                    name=f'Guest {room}',
+                    email=f'{room}@example.com',
+                    room_number=room,
+                    check_in=timezone.now()
+                )
+            )
+            folio.add_charge(service=self.service, extras=[{'name': 'Water', 'price': 2.5}])
+            folio.add_charge(service=self.service, extras=[{'name': 'Wine', 'price': 31}])
+            self.folios.append(folio)
+        Folio.objects.create(
+            guest=Guest.objects.create(name='No Charges', room_number='303', check_in=timezone.now())
+        )
+        user = User.objects.create_user(username='frontdesk', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(user=user)
+    
+    def test_folio_payloads_match_serializer(self):
+        """Test fast folio payloads equal FolioSerializer output."""
+        queryset = Folio.objects.all()
+        assert folio_payloads(folio_rows(queryset)) == FolioSerializer(queryset, many=True).data
+    
+    def test_charge_payload_matches_serializer(self):
+        """Test a freshly created charge renders like ChargeSerializer."""
+        charge = self.folios[0].add_charge(service=self.service, extras=[{'name': 'Nuts', 'price': 4.1}])
+        assert charge_payload(charge) == ChargeSerializer(charge).data
+    
+    def test_folio_page_uses_two_queries(self, django_assert_num_queries):
+        """Test a folio page costs one folio query and one charges query."""
+        with django_assert_num_queries(2):
+            folio_payloads(folio_rows(Folio.objects.all()))
+    
+    def test_retrieve_endpoint(self, settings):
+        """Test the folio endpoint returns the same body on both paths."""
+        url = f'/api/billing/folios/{self.folios[0].id}/'
+        fast = self.client.get(url)
+        settings.FAST_READ_ENDPOINTS = set()
+        generic = self.client.get(url)
+        
+        assert fast.status_code == 200
+        assert fast.json() == generic.json()
+        assert self.client.get('/api/billing/folios/999999/').status_code == 404
+    
+    def test_tap_endpoint(self):
+        """Test the tap endpoint returns the charge and replays by key."""
+        url = '/api/billing/charge/301/'
+        body = {
+            'service_id': self.service.id,
+            'extras': [{'name': 'Soda', 'price': 3}],
+            'idempotency_key': 'tap-301'
+        }
+        created = self.client.post(url, body, format='json')
+        replayed = self.client.post(url, body, format='json')
+        
+        assert created.status_code == 201
+        assert replayed.status_code == 200
+        assert created.json() == replayed.json()
+        assert created.json()['final_amount'] == '3.48'
+
+
+@pytest.mark.django_db
+class TestConditionalGet:
+    """Tests for ETag revalidation of folio endpoints."""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.service = Service.objects.create(
+            name='Valet',
+            service_type='fixed',
+            base_price=Decimal('5.00')
+        )
+        self.guest = Guest.objects.create(name='Etag Guest', room_number='401', check_in=timezone.now())
+        self.folio = Folio.objects.create(guest=self.guest)
+        self.folio.add_charge(service=self.service)
+        user = User.objects.create_user(username='poller', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(user=user)
+    
+    def test_version_bumps_on_save(self):
+        """Test every folio save advances the version."""
+        version = Folio.objects.get(pk=self.folio.pk).version
+        self.folio.add_charge(service=self.service)
+        assert Folio.objects.get(pk=self.folio.pk).version == version + 1
+    
+    @pytest.mark.parametrize('url', ['/api/billing/folios/{folio}/', '/api/billing/guests/{guest}/folio/'])
+    def test_not_modified_skips_charges(self, url, django_assert_num_queries):
+        """Test a current ETag gets 304 with one folio lookup."""
+        url = url.format(folio=self.folio.pk, guest=self.guest.pk)
+        first = self.client.get(url)
+        assert first.status_code == 200
+        assert first['ETag'] and first['Last-Modified']
+        
+        # Guest lookup for the guest route, then the folio version lookup
+        with django_assert_num_queries(2 if 'guests' in url else 1):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        assert cached.status_code == 304
+        assert cached['ETag'] == first['ETag']
+        
+        self.folio.add_charge(service=self.service)
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        assert changed.status_code == 200
+        assert changed['ETag'] != first['ETag']
+        assert len(changed.json()['charges']) == 2
+    
+    def test_list_etag_changes_with_folios(self):
+        """Test the folio listing revalidates until a folio changes."""
+        first = self.client.get('/api/billing/folios/')
+        assert self.client.get('/api/billing/folios/', HTTP_IF_NONE_MATCH=first['ETag']).status_code == 304
+        
+        self.folio.add_charge(service=self.service)
+        assert self.client.get('/api/billing/folios/', HTTP_IF_NONE_MATCH=first['ETag']).status_code == 200
+
+
+@pytest.mark.django_db
+class TestFolioEvents:
+    """Tests for live folio events over Server-Sent Events."""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        settings.FOLIO_EVENTS_HEARTBEAT = 5
+        self.broker = InMemoryBroker()
+        previous = set_broker(self.broker)
+        self.service = Service.objects.create(name='Valet', service_type='fixed', base_price=Decimal('5.00'))
+        self.guest = Guest.objects.create(name='Live Guest', room_number='601', check_in=timezone.now())
+        self.folio = Folio.objects.create(guest=self.guest)
+        GuestSession.objects.create(
+            guest=self.guest,
+            token='live-token',
+            expires_at=timezone.now() + timedelta(hours=1)
+        )
+        yield
+        set_broker(previous)
+    
+    def test_broker_delivers_across_threads(self):
+        """Test a publish from a worker thread reaches an async subscriber."""
+        async def scenario():
+            subscription = self.broker.subscribe('folio:1')
+            threading.Thread(target=self.broker.publish, args=('folio:1', 'hello')).start()
+            message = await subscription.get(timeout=5)
+            subscription.close()
+            return message
+        
+        assert async_to_sync(scenario)() == 'hello'
+        assert not self.broker._subscribers
+    
+    def test_stream_pushes_posted_charge(self, django_capture_on_commit_callbacks):
+        """Test a charge posted after connecting arrives with the new balance."""
+        def post_charge():
+            with django_capture_on_commit_callbacks(execute=True):
+                self.folio.add_charge(service=self.service)
+        
+        async def scenario():
+            response = await AsyncClient().get(
+                f'/api/billing/folios/{self.folio.id}/events/?token=live-token'
+            )
+            stream = response.streaming_content
+            chunks = [await stream.__anext__(), await stream.__anext__()]
+            await sync_to_async(post_charge)()
+            chunks.append(await asyncio.wait_for(stream.__anext__(), 5))
+            await stream.aclose()
+            return response, [chunk.decode('utf-8') for chunk in chunks]
+        
+        response, (retry, state, posted) = async_to_sync(scenario)()
+        assert response['Content-Type'] == 'text/event-stream'
+        assert 'event: folio.state' in state
+        assert 'event: charge.posted' in posted
+        data = json.loads(posted.split('data: ', 1)[1])
+        assert data['balance'] == '5.00'
+        assert data['charge']['final_amount'] == '5.00'
+        assert not self.broker._subscribers.get(folio_channel(self.folio.id))
+    
+    def test_stream_requires_guest_token(self):
+        """Test another guest's token is refused."""
+        async def scenario():
+            return await AsyncClient().get(f'/api/billing/folios/{self.folio.id}/events/?token=wrong')
+        
+        assert async_to_sync(scenario)().status_code == 401
+
+
+@pytest.mark.django_db
+class TestAsyncTap:
+    """Tests for the async tap view."""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.service = Service.objects.create(name='Valet', service_type='per_unit', base_price=Decimal('5.00'))
+        PricingRule.objects.create(service=self.service, name='VAT', rule_type='tax', value=Decimal('16.00'))
+        Guest.objects.create(name='Async Guest', room_number='701', check_in=timezone.now())
+        user = User.objects.create_user(username='reader-701', password='pass')
+        self.token = Token.objects.create(user=user).key
+    
+    def _tap(self, body, token=None, room='701'):
+        # The URLconf routes taps here only with TAP_VIEW_ASYNC, so call the view directly
+        request = AsyncRequestFactory().post(
+            f'/api/billing/charge/{room}/',
+            body,
+            content_type='application/json',
+            headers={'Authorization': f'Token {token or self.token}'}
+        )
+        response = async_to_sync(charge_by_room_async)(request, room_number=room)
+        return response.status_code, json.loads(response.content)
+    
+    def test_tap_matches_sync_view_and_replays(self, django_assert_max_num_queries):
+        """Test the async view charges once and replays from the cache."""
+        body = {'service_id': self.service.id, 'quantity': 2, 'idempotency_key': 'async-1'}
+        status_code, created = self._tap(body)
+        assert status_code == 201
+        charge = Charge.objects.select_related('service').get()
+        assert created == ChargeSerializer(charge).data
+        assert charge.final_amount == Decimal('11.60')
+        
+        # Token and replay both come from the caches
+        with django_assert_max_num_queries(0):
+            status_code, replayed = self._tap(body)
+        assert status_code == 200
+        assert replayed == created
+        assert Charge.objects.count() == 1
+    
+    def test_rejects_bad_token_and_unknown_room(self):
+        """Test auth and lookup errors mirror the sync view."""
+        body = {'service_id': self.service.id}
+        assert self._tap(body, token='nope')[0] == 401
+        assert self._tap(body, room='999') == (404, {'error': 'No active guest found in room 999.'})
+
+
+@pytest.mark.django_db
+class TestQueryBudgets:
+    """Performance contracts: billing endpoints cost the same queries at any data size."""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        settings.AUDIT_CAPTURE = False
+        self.services = [
+            Service.objects.create(name=f'Service {i}', service_type='fixed', base_price=Decimal('5.00'))
+            for i in range(3)
+        ]
+        PricingRule.objects.create(service=self.services[0], name='VAT', rule_type='tax', value=Decimal('16.00'))
+        self.guest = Guest.objects.create(name='Budget Guest', room_number='900', check_in=timezone.now())
+        self.folio = Folio.objects.create(guest=self.guest)
+        user = User.objects.create_user(username='budget', password='pass', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(user=user)
+    
+    def reset(self):
+        cache.clear()
+    
+    def grow_charges(self, size):
+        existing = Charge.objects.filter(folio=self.folio).count()
+        Charge.objects.bulk_create([
+            Charge(
+                folio=self.folio,
+                service=self.services[i % len(self.services)],
+                description=f'Charge {i}',
+                base_amount=Decimal('5.00'),
+                final_amount=Decimal('5.80'),
+            )
+            for i in range(existing, size)
+        ])
+    
+    def grow_folios(self, size):
+        existing = Guest.objects.count()
+        guests = Guest.objects.bulk_create([
+            Guest(name=f'Guest {i}', room_number=f'R{i}', check_in=timezone.now())
+            for i in range(existing, size)
+        ])
+        folios = Folio.objects.bulk_create([Folio(guest=guest) for guest in guests])
+        Charge.objects.bulk_create([
+            Charge(folio=folio, service=self.services[0], description='Valet',
+                   base_amount=Decimal('5.00'), final_amount=Decimal('5.80'))
+            for folio in folios
+        ])
+    
+    @pytest.mark.parametrize('fast', [True, False])
+    @pytest.mark.parametrize('url', ['/api/billing/folios/{folio}/', '/api/billing/guests/{guest}/folio/'])
+    def test_folio_detail(self, settings, fast, url):
+        """Test a folio costs the same with 1 or 10,000 charges."""
+        if not fast:
+            settings.FAST_READ_ENDPOINTS = set()
+        url = url.format(folio=self.folio.pk, guest=self.guest.pk)
+        results = assert_constant_queries(self.grow_charges, lambda: self.client.get(url), reset=self.reset)
+        assert len(results[10000].json()['charges']) == 10000
+    
+    @pytest.mark.parametrize('fast', [True, False])
+    def test_folio_list(self, settings, fast):
+        """Test a page of folios costs the same however many folios exist."""
+        if not fast:
+            settings.FAST_READ_ENDPOINTS = set()
+        results = assert_constant_queries(
+            self.grow_folios, lambda: self.client.get('/api/billing/folios/'), reset=self.reset
+        )
+        assert results[10000].json()['count'] == 10000
+    
+    def test_guest_list(self):
+        """Test a page of guests costs the same however many guests exist."""
+        assert_constant_queries(self.grow_folios, lambda: self.client.get('/api/billing/guests/'), reset=self.reset)
+    
+    def test_folio_add_charge(self):
+        """Test adding a charge to a folio never loads the folio's existing charges."""
+        taps = iter(range(10))
+        url = f'/api/billing/folios/{self.folio.pk}/add_charge/'
+        runs = []
+        
+        def tap():
+            response, queries = count_queries(lambda: self.client.post(
+                url, {'service_id': self.services[0].id, 'idempotency_key': f'budget-{next(taps)}'}, format='json'
+            ))
+            runs.append(queries)
+            return response
+        
+        results = assert_constant_queries(self.grow_charges, tap, reset=self.reset)
+        assert all(response.status_code == 201 for response in results.values())
+        # Only the idempotency lookup reads charge rows, and it matches none
+        charge_reads = [
+            sql for sql in runs[-1]
+            if sql.startswith('SELECT "billing_charge"."id"') and '"billing_charge"."idempotency_key" = ' not in sql
+        ]
+        assert charge_reads == []
+    
+    def test_tap(self):
+        """Test a tap costs the same however many charges the folio has."""
+        taps = iter(range(10))
+        results = assert_constant_queries(
+            self.grow_charges,
+            lambda: self.client.post(
+                f'/api/billing/charge/{self.guest.room_number}/',
+                {'service_id': self.services[0].id, 'idempotency_key': f'budget-{next(taps)}'},
+                format='json'
+            ),
+            reset=self.reset
+        )
+        assert all(response.status_code == 201 for response in results.values())
+
+
+@pytest.mark.django_db
+class TestSyntheticResort:
+    """Tests for the seed_resort data generator."""
+    
+    OPTIONS = {'rooms': 6, 'guests': 80, 'charges': 1200, 'days': 60, 'end': date(2026, 3, 31), 'chunk_size': 25}
+    
+    def seed(self, **options):
+        call_command('seed_resort', stdout=StringIO(), **{**self.OPTIONS, **options})
+    
+    def test_consistent_history(self):
+        """Test folios add up, rooms hold one guest at a time and the audit chain verifies."""
+        self.seed()
+        assert Guest.objects.count() == 80
+        assert 900 <= Charge.objects.count() <= 1500
+        
+        for folio in Folio.objects.prefetch_related('charges', 'payments'):
+            charged = sum((charge.final_amount for charge in folio.charges.all()), Decimal('0.00'))
+            paid = sum((p.amount for p in folio.payments.all() if p.status == 'completed'), Decimal('0.00'))
+            assert (folio.total_charges, folio.total_payments) == (charged, paid)
+            assert folio.balance == charged - paid
+            if folio.status == 'settled':
+                assert folio.balance == 0
+                assert all(folio.guest.check_in <= c.created_at <= folio.guest.check_out for c in folio.charges.all())
+        
+        in_house = list(Guest.objects.filter(is_active=True).values_list('room_number', flat=True))
+        assert len(in_house) == len(set(in_house)) <= 6
+        assert not Folio.objects.filter(status='open', guest__is_active=False).exists()
+        
+        assert AuditLog.objects.filter(action_type='charge_created').count() == Charge.objects.count()
+        assert verify_chain(full=True).ok
+    
+    def test_deterministic_in_any_order(self):
+        """Test chunks build identically whichever order workers take them in."""
+        catalogue = create_catalogue()
+        chunks = plan(6, 80, 1200, 60, seed=7, chunk_size=25)
+        end = history_end(date(2026, 3, 31))
+        forward = [ChunkBuilder(catalogue, end, 60, 7).build(spec) for spec in chunks]
+        backward = [ChunkBuilder(catalogue, end, 60, 7).build(spec) for spec in reversed(chunks)]
+        assert forward == backward[::-1]
+        assert plan(6, 80, 1200, 60, seed=8, chunk_size=25)[0].stays != chunks[0].stays
+    
+    def test_refuses_populated_database(self):
+        """Test seeding on top of existing guests is refused."""
+        Guest.objects.create(name='Existing', room_number='101', check_in=timezone.now())
+        with pytest.raises(CommandError, match='already exist'):
+            self.seed()
+
+
+@pytest.mark.django_db
+class TestDeferredRecalculation:
+    """Tests for coalesced folio recalculation."""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self, settings, monkeypatch):
+        settings.FOLIO_RECALC_MODE = 'deferred'
+        settings.FOLIO_RECALC_WINDOW = 2
+        cache.clear()
+        get_registry().clear()
+        self.broker = InMemoryBroker()
+        previous = set_broker(self.broker)
+        self.scheduled = []
+        self.apply_async = recalculate_dirty_folio.apply_async
+        monkeypatch.setattr(
+            recalculate_dirty_folio, 'apply_async',
+            lambda args, countdown, **kw: self.scheduled.append((args, countdown))
+        )
+        self.service = Service.objects.create(name='Cabana', service_type='fixed', base_price=Decimal('30.00'))
+        self.guest = Guest.objects.create(name='Burst Guest', room_number='702', check_in=timezone.now())
+        self.folio = Folio.objects.create(guest=self.guest)
+        yield
+        set_broker(previous)
+    
+    def test_burst_is_recalculated_once(self, django_capture_on_commit_callbacks):
+        """Test a burst of charges and a payment schedule one recalculation."""
+        version = self.folio.version
+        with django_capture_on_commit_callbacks(execute=True):
+            for _ in range(3):
+                self.folio.add_charge(service=self.service)
+            Payment.objects.create(
+                folio=self.folio, amount=Decimal('40.00'), payment_method='cash'
+            ).process_payment()
+        
+        assert self.scheduled == [((self.folio.id,), 2)]
+        counters, _ = get_registry().collect()
+        assert counters[('sysnyx_folio_recalcs_scheduled_total', ())] == 1
+        assert counters[('sysnyx_folio_recalcs_coalesced_total', ())] == 3
+        self.folio.refresh_from_db()
+        assert self.folio.balance == Decimal('0.00')
+        # Conditional GETs still see every write
+        assert self.folio.version == version + 4
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            assert recalculate_dirty_folio(self.folio.id) is True
+        self.folio.refresh_from_db()
+        assert self.folio.total_charges == Decimal('90.00')
+        assert self.folio.balance == Decimal('50.00')
+        assert cache.get(DIRTY_KEY.format(folio_id=self.folio.id)) is None
+    
+    def test_write_after_recalculation_schedules_again(self, django_capture_on_commit_callbacks):
+        """Test the next write after a run starts a new window."""
+        with django_capture_on_commit_callbacks(execute=True):
+            self.folio.add_charge(service=self.service)
+        recalculate_dirty_folio(self.folio.id)
+        with django_capture_on_commit_callbacks(execute=True):
+            self.folio.add_charge(service=self.service)
+        assert len(self.scheduled) == 2
+    
+    def test_runs_inline_without_broker(self, monkeypatch, django_capture_on_commit_callbacks):
+        """Test a failed schedule recalculates immediately rather than leaving totals stale."""
+        def unavailable(args, countdown, retry):
+            raise ConnectionError('broker down')
+        
+        monkeypatch.setattr(recalculate_dirty_folio, 'apply_async', unavailable)
+        with django_capture_on_commit_callbacks(execute=True):
+            self.folio.add_charge(service=self.service)
+        self.folio.refresh_from_db()
+        assert self.folio.balance == Decimal('30.00')
+    
+    def test_runs_inline_when_broker_refuses(self, monkeypatch, django_capture_on_commit_callbacks):
+        """Test a refused broker connection falls back at once instead of retrying the publish."""
+        monkeypatch.setattr(recalculate_dirty_folio, 'apply_async', self.apply_async)
+        # Nothing listens on port 1
+        monkeypatch.setitem(celery_app.conf, 'broker_write_url', 'redis://127.0.0.1:1/0')
+        monkeypatch.setitem(celery_app.conf, 'broker_connection_timeout', 1)
+        # Publish retries that would hold the request for 10s
+        monkeypatch.setitem(celery_app.conf, 'task_publish_retry_policy', {'max_retries': 1, 'interval_start': 10})
+        # Connection pools are built from the broker URL on first use
+        monkeypatch.setattr(celery_app, '_pool', None)
+        monkeypatch.setattr(celery_app.amqp, '_producer_pool', None)
+        
+        started = time.monotonic()
+        with django_capture_on_commit_callbacks(execute=True):
+            self.folio.add_charge(service=self.service)
+        assert time.monotonic() - started < 5
+        self.folio.refresh_from_db()
+        assert self.folio.balance == Decimal('30.00')
+        assert self.scheduled == []
+    
+    def test_immediate_mode_is_default(self, settings):
+        """Test immediate mode recalculates in the write itself."""
+        settings.FOLIO_RECALC_MODE = 'immediate'
+        self.folio.add_charge(service=self.service)
+        self.folio.refresh_from_db()
+        assert self.folio.balance == Decimal('30.00')
+        assert self.scheduled == []
+
+
+@pytest.mark.django_db
+class TestRecomputeFolioTotals:
+    """Tests for the bulk recompute_folio_totals command."""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        service = Service.objects.create(name='Spa', service_type='fixed', base_price=Decimal('10.10'))
+        self.folios = []
+        for i in range(5):
+            guest = Guest.objects.create(name=f'Drift {i}', room_number=f'80{i}', check_in=timezone.now())
+            folio = Folio.objects.create(guest=guest)
+            for _ in range(i + 1):
+                folio.add_charge(service=service)
+            Payment.objects.create(folio=folio, amount=Decimal('0.20'), payment_method='cash').process_payment()
+            Payment.objects.create(folio=folio, amount=Decimal('99.00'), payment_method='mpesa')
+            self.folios.append(folio)
+        # Drift two folios
+        Folio.objects.filter(pk=self.folios[1].pk).update(total_charges=Decimal('0.00'))
+        Folio.objects.filter(pk=self.folios[3].pk).update(balance=Decimal('1.00'), status='settled')
+    
+    def run(self, *args):
+        out = StringIO()
+        call_command('recompute_folio_totals', *args, stdout=out)
+        return out.getvalue()
+    
+    def test_dry_run_reports_differences(self):
+        """Test a dry run lists drifted folios and changes nothing."""
+        output = self.run('--dry-run', '--chunk-size', '2')
+        assert '2 folios have drifted totals' in output
+        assert f'folio {self.folios[1].pk}: charges 0.00 -> 20.20, payments 0.20 -> 0.20, balance 20.00 -> 20.00' in output
+        assert Folio.objects.get(pk=self.folios[1].pk).total_charges == Decimal('0.00')
+    
+    def test_fixes_only_drifted_folios(self):
+        """Test drifted folios are fixed and given a new version; the rest are untouched."""
+        versions = dict(Folio.objects.values_list('pk', 'version'))
+        assert 'Recomputed totals of 2 folios' in self.run('--chunk-size', '2')
+        for index, folio in enumerate(self.folios):
+            stored = Folio.objects.get(pk=folio.pk)
+            charges = Decimal('10.10') * (index + 1)
+            assert (stored.total_charges, stored.total_payments, stored.balance) == (
+                charges, Decimal('0.20'), charges - Decimal('0.20')
+            )
+            assert stored.version == versions[folio.pk] + (index in (1, 3))
+        assert 'Recomputed totals of 0 folios' in self.run()
+    
+    def test_filters(self):
+        """Test status and id filters narrow the folios recomputed."""
+        assert 'Recomputed totals of 1 folios' in self.run('--status', 'settled')
+        assert Folio.objects.get(pk=self.folios[1].pk).total_charges == Decimal('0.00')
+        assert 'No folios match' in self.run('--min-id', str(self.folios[-1].pk + 1))
+    
+    def test_rejects_parallel_sqlite(self):
+        """Test parallel workers are refused on SQLite."""
+        with pytest.raises(CommandError):
+            self.run('--workers', '2')
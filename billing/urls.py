@@ -1,8 +1,10 @@
 """
 URL routing for billing module.
 """
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from .async_views import charge_by_room_async, folio_events
 from .views import GuestViewSet, FolioViewSet, charge_by_room
 
 router = DefaultRouter()
@@ -10,6 +12,11 @@ router.register(r'guests', GuestViewSet, basename='guest')
 router.register(r'folios', FolioViewSet, basename='folio')
 
 urlpatterns = [
-    path('charge/<str:room_number>/', charge_by_room, name='charge-by-room'),
+    path(
+        'charge/<str:room_number>/',
+        charge_by_room_async if settings.TAP_VIEW_ASYNC else charge_by_room,
+        name='charge-by-room'
+    ),
+    path('folios/<int:folio_id>/events/', folio_events, name='folio-events'),
     path('', include(router.urls)),
 ]
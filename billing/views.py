@@ -2,12 +2,31 @@
 API views for billing module.
 """
 from rest_framework import viewsets, status
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.decorators import (
+    action,
+    api_view,
+    permission_classes,
+    renderer_classes,
+    throttle_classes
+)
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.core.exceptions import ValidationError
+from django.db.models import Prefetch
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from services.models import Service
+from sysnyx.conditional import not_modified, set_validators
+from sysnyx.renderers import endpoint_renderers, fast_reads
+from sysnyx.throttling import DeviceTokenBucketThrottle
 from .models import Guest, Folio, Charge, GuestSession
+from .readers import (
+    charge_payload,
+    folio_list_validators,
+    folio_payloads,
+    folio_rows,
+    folio_validators
+)
 from .serializers import (
     GuestSerializer,
     FolioSerializer,
@@ -17,6 +36,20 @@ from .serializers import (
 )
 
 
+def _with_charges(queryset):
+    """Load what FolioSerializer reads: the guest, charges and their services."""
+    return queryset.select_related('guest').prefetch_related(
+        Prefetch('charges', queryset=Charge.objects.select_related('service'))
+    )
+
+
+def _charge_data(charge):
+    """Response body for a tap or add_charge result."""
+    if fast_reads('tap'):
+        return charge_payload(charge)
+    return ChargeSerializer(charge).data
+
+
 class GuestViewSet(viewsets.ModelViewSet):
     """ViewSet for Guest CRUD operations."""
     queryset = Guest.objects.all()
@@ -30,19 +63,26 @@ class GuestViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(is_active=True)
         return queryset
     
-    @action(detail=True, methods=['get'])
+    @action(detail=True, methods=['get'], renderer_classes=endpoint_renderers('guest-folio'))
     def folio(self, request, pk=None):
-        """Get guest's folio."""
+        """Get guest's folio, answering conditional requests with 304."""
         guest = self.get_object()
-        try:
-            folio = guest.folio
-            serializer = FolioSerializer(folio)
-            return Response(serializer.data)
-        except Folio.DoesNotExist:
+        folios = Folio.objects.filter(guest=guest)
+        validators = folio_validators(folios)
+        if validators is None:
             return Response(
                 {'error': 'Folio not found for this guest.'},
                 status=status.HTTP_404_NOT_FOUND
             )
+        response = not_modified(request, *validators)
+        if response is not None:
+            return response
+        
+        if fast_reads('guest-folio'):
+            response = Response(folio_payloads(folio_rows(folios))[0])
+        else:
+            response = Response(FolioSerializer(_with_charges(folios).get()).data)
+        return set_validators(response, *validators)
 
 
 class FolioViewSet(viewsets.ModelViewSet):
@@ -50,8 +90,64 @@ class FolioViewSet(viewsets.ModelViewSet):
     queryset = Folio.objects.all()
     serializer_class = FolioSerializer
     permission_classes = [IsAuthenticated]
+    renderer_classes = endpoint_renderers('folios')
     
-    @action(detail=True, methods=['post'])
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # Actions like add_charge (a tap) only need the folio row
+        if self.action in ('list', 'retrieve'):
+            queryset = _with_charges(queryset)
+        return queryset
+    
+    def list(self, request, *args, **kwargs):
+        """List folios, from values rows when fast reads are enabled."""
+        queryset = self.filter_queryset(self.get_queryset())
+        validators = folio_list_validators(queryset, request.get_full_path())
+        response = not_modified(request, *validators)
+        if response is not None:
+            return response
+        
+        if not fast_reads('folios'):
+            response = super().list(request, *args, **kwargs)
+        else:
+            rows = folio_rows(queryset)
+            page = self.paginate_queryset(rows)
+            if page is not None:
+                response = self.get_paginated_response(folio_payloads(page))
+            else:
+                response = Response(folio_payloads(rows))
+        return set_validators(response, *validators)
+    
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Retrieve a folio, answering conditional requests with 304.
+        
+        The ETag comes from the folio version alone, so a client that is
+        up to date costs one lookup and no charge queries.
+        """
+        try:
+            queryset = self.get_queryset().filter(pk=kwargs['pk'])
+            validators = folio_validators(queryset)
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+        if validators is None:
+            raise Http404
+        response = not_modified(request, *validators)
+        if response is not None:
+            return response
+        
+        if fast_reads('folios'):
+            response = Response(folio_payloads(folio_rows(queryset))[0])
+        else:
+            response = super().retrieve(request, *args, **kwargs)
+        return set_validators(response, *validators)
+    
+    @action(
+        detail=True,
+        methods=['post'],
+        renderer_classes=endpoint_renderers('tap'),
+        throttle_classes=[DeviceTokenBucketThrottle]
+    )
     def add_charge(self, request, pk=None):
         """
         Add a charge to the folio.
@@ -82,7 +178,7 @@ class FolioViewSet(viewsets.ModelViewSet):
             ).first()
             if existing:
                 return Response(
-                    ChargeSerializer(existing).data,
+                    _charge_data(existing),
                     status=status.HTTP_200_OK
                 )
         
@@ -93,15 +189,12 @@ class FolioViewSet(viewsets.ModelViewSet):
                 service=service,
                 quantity=data.get('quantity', 1),
                 extras=data.get('extras'),
-                description=data.get('description', '')
+                description=data.get('description', ''),
+                idempotency_key=idempotency_key
             )
             
-            if idempotency_key:
-                charge.idempotency_key = idempotency_key
-                charge.save()
-            
             return Response(
-                ChargeSerializer(charge).data,
+                _charge_data(charge),
                 status=status.HTTP_201_CREATED
             )
         
@@ -121,12 +214,14 @@ class FolioViewSet(viewsets.ModelViewSet):
         """Recalculate folio totals."""
         folio = self.get_object()
         folio.recalculate_totals()
-        serializer = self.get_serializer(folio)
+        serializer = self.get_serializer(_with_charges(Folio.objects.filter(pk=folio.pk)).get())
         return Response(serializer.data)
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@renderer_classes(endpoint_renderers('tap'))
+@throttle_classes([DeviceTokenBucketThrottle])
 def charge_by_room(request, room_number):
     """
     Add charge by room number (NFC tap endpoint).
@@ -160,7 +255,7 @@ def charge_by_room(request, room_number):
             ).first()
             if existing:
                 return Response(
-                    ChargeSerializer(existing).data,
+                    _charge_data(existing),
                     status=status.HTTP_200_OK
                 )
         
@@ -170,15 +265,12 @@ def charge_by_room(request, room_number):
             service=service,
             quantity=data.get('quantity', 1),
             extras=data.get('extras'),
-            description=data.get('description', '')
+            description=data.get('description', ''),
+            idempotency_key=idempotency_key
         )
         
-        if idempotency_key:
-            charge.idempotency_key = idempotency_key
-            charge.save()
-        
         return Response(
-            ChargeSerializer(charge).data,
+            _charge_data(charge),
             status=status.HTTP_201_CREATED
         )
     
@@ -0,0 +1,24 @@
+"""
+Payment provider SDKs, loaded on first use.
+
+The Stripe SDK takes the better part of a second to import, more than the
+rest of Django startup combined. Nothing at module level may import it:
+workers, one-off commands and web processes that never take a card
+payment should not pay for it. Call ``stripe_sdk()`` where the API is
+actually used.
+"""
+from functools import lru_cache
+from django.conf import settings
+
+
+@lru_cache(maxsize=None)
+def stripe_sdk():
+    """
+    The ``stripe`` module, imported and configured on the first call.
+
+    Returns:
+        module: stripe, with api_key set from STRIPE_SECRET_KEY
+    """
+    import stripe
+    stripe.api_key = settings.STRIPE_SECRET_KEY
+    return stripe
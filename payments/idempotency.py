@@ -0,0 +1,83 @@
+"""
+Idempotency-Key handling for payment endpoints.
+
+A retried request carrying the same ``Idempotency-Key`` header returns the
+payment created by the first attempt instead of charging again. Recent keys
+are answered from the cache; older ones fall back to the unique index on
+``Payment.idempotency_key``.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from .models import Payment
+from .serializers import PaymentSerializer
+
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+REPLAY_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 100
+
+
+def get_idempotency_key(request):
+    """
+    Read the Idempotency-Key header from a request.
+
+    Returns:
+        str: The key, or '' when the header is absent
+
+    Raises:
+        ValueError: If the key is longer than the stored column allows
+    """
+    key = request.META.get(IDEMPOTENCY_HEADER, '').strip()
+    if len(key) > MAX_KEY_LENGTH:
+        raise ValueError(f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters.')
+    return key
+
+
+def _cache_key(key):
+    return f'payments:idempotency:{key}'
+
+
+def remember(payment, data):
+    """Cache the response data for a payment created under an idempotency key."""
+    if not payment.idempotency_key:
+        return
+    cache.set(
+        _cache_key(payment.idempotency_key),
+        {
+            'folio_id': payment.folio_id,
+            'amount': str(payment.amount),
+            'data': dict(data),
+        },
+        getattr(settings, 'PAYMENT_IDEMPOTENCY_TTL', 300)
+    )
+
+
+def find_replay(key):
+    """
+    Look up the original response for an idempotency key.
+
+    Returns:
+        dict: ``folio_id``, ``amount`` and serialized ``data``, or None
+    """
+    cached = cache.get(_cache_key(key))
+    if cached is not None:
+        return cached
+
+    payment = Payment.objects.filter(idempotency_key=key).first()
+    if payment is None:
+        return None
+
+    data = PaymentSerializer(payment).data
+    if payment.status not in ('pending', 'processing'):
+        # An in-flight original will cache its own final state.
+        remember(payment, data)
+    return {
+        'folio_id': payment.folio_id,
+        'amount': str(payment.amount),
+        'data': data,
+    }
+
+
+def matches(replay, folio_id, amount):
+    """Check that a retried request carries the same parameters as the original."""
+    return replay['folio_id'] == folio_id and replay['amount'] == str(amount)
@@ -0,0 +1,76 @@
+"""
+Management command to reconcile a payout settlement file against payments.
+"""
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from payments.reconciliation import reconcile_settlement
+
+
+class Command(BaseCommand):
+    help = 'Streams a settlement CSV and reports matched, missing and mismatched payments'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('settlement_file', help='Path to the settlement CSV')
+        parser.add_argument(
+            '--output-dir',
+            default='.',
+            help='Directory for matched.csv, missing.csv and mismatched.csv'
+        )
+        parser.add_argument(
+            '--id-column',
+            default='payment_intent_id',
+            help='Column holding the Stripe PaymentIntent id'
+        )
+        parser.add_argument(
+            '--amount-column',
+            default='amount',
+            help='Column holding the settled amount'
+        )
+        parser.add_argument(
+            '--amount-in-cents',
+            action='store_true',
+            help='Settled amounts are in minor units (e.g. 1050 for 10.50)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Lines matched per database query'
+        )
+
+    def handle(self, *args, **options):
+        source_path = Path(options['settlement_file'])
+        if not source_path.exists():
+            raise CommandError(f'Settlement file not found: {source_path}')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive.')
+
+        output_dir = Path(options['output_dir'])
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        self.stdout.write(f'Reconciling {source_path}...')
+
+        with open(source_path, newline='', encoding='utf-8-sig') as source, \
+                open(output_dir / 'matched.csv', 'w', newline='') as matched, \
+                open(output_dir / 'missing.csv', 'w', newline='') as missing, \
+                open(output_dir / 'mismatched.csv', 'w', newline='') as mismatched:
+            try:
+                summary = reconcile_settlement(
+                    source,
+                    matched,
+                    missing,
+                    mismatched,
+                    id_column=options['id_column'],
+                    amount_column=options['amount_column'],
+                    amount_in_cents=options['amount_in_cents'],
+                    chunk_size=options['chunk_size']
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        self.stdout.write(f'Lines: {summary.lines}')
+        self.stdout.write(self.style.SUCCESS(f'Matched: {summary.matched}'))
+        self.stdout.write(self.style.WARNING(f'Missing: {summary.missing}'))
+        self.stdout.write(self.style.WARNING(f'Mismatched: {summary.mismatched}'))
+        self.stdout.write(f'Reports written to {output_dir}')
@@ -3,13 +3,19 @@ Payment processing models.
 """
 from decimal import Decimal
 from django.db import models
+from audit.capture import AuditTrackedMixin, capture
 from billing.models import Folio
 
 
-class Payment(models.Model):
+class Payment(AuditTrackedMixin, models.Model):
     """
     Payment transaction record.
     """
+    audit_fields = (
+        'folio_id', 'amount', 'payment_method', 'status',
+        'completed_at', 'error_message'
+    )
+    
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('processing', 'Processing'),
@@ -38,6 +44,11 @@ class Payment(models.Model):
     stripe_payment_intent_id = models.CharField(max_length=200, blank=True)
     stripe_token = models.CharField(max_length=200, blank=True)
     mpesa_transaction_id = models.CharField(max_length=200, blank=True)
+    idempotency_key = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text='Client-supplied key preventing duplicate payments on retry'
+    )
     
     # Metadata
     metadata = models.JSONField(default=dict, blank=True)
@@ -55,10 +66,25 @@ class Payment(models.Model):
             models.Index(fields=['status']),
             models.Index(fields=['stripe_payment_intent_id']),
         ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['idempotency_key'],
+                condition=~models.Q(idempotency_key=''),
+                name='payments_unique_idempotency_key'
+            ),
+        ]
     
     def __str__(self):
         return f"Payment {self.id} - {self.payment_method} - ${self.amount} ({self.status})"
     
+    def audit_saved(self, created, old_values, new_values):
+        """Record creation and status transitions."""
+        if created:
+            capture('payment_created', self, new_values=new_values)
+        elif 'status' in new_values:
+            action_type = 'payment_failed' if self.status == 'failed' else 'payment_processed'
+            capture(action_type, self, old_values, new_values)
+    
     def process_payment(self):
         """
         Process payment based on payment method.
@@ -67,14 +93,15 @@ class Payment(models.Model):
         from django.utils import timezone
         
         if self.payment_method == 'stripe':
-            # Stripe integration would go here
-            # stripe.PaymentIntent.create(...)
+            # Stripe integration would go here, through the lazily imported SDK:
+            # gateways.stripe_sdk().PaymentIntent.create(...)
             self.status = 'completed'
             self.completed_at = timezone.now()
             self.save()
             
             # Update folio
-            self.folio.recalculate_totals()
+            self.folio.totals_changed()
+            self._publish_posted()
             
         elif self.payment_method == 'mpesa':
             # M-Pesa integration would go here
@@ -88,6 +115,16 @@ class Payment(models.Model):
             self.save()
             
             # Update folio
-            self.folio.recalculate_totals()
+            self.folio.totals_changed()
+            self._publish_posted()
         
         return self.status
+    
+    def _publish_posted(self):
+        """Push the new folio balance to the guest's devices."""
+        from billing.events import publish_folio_event
+        publish_folio_event('payment.posted', self.folio, payment={
+            'id': self.id,
+            'amount': str(self.amount),
+            'payment_method': self.payment_method,
+        })
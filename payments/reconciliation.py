@@ -0,0 +1,160 @@
+"""
+Settlement-file reconciliation against recorded payments.
+
+Payout files from Stripe (and card terminals settled through Stripe) are
+streamed line by line and matched in fixed-size chunks, so memory use stays
+flat no matter how many lines the file has.
+"""
+import csv
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from .models import Payment
+
+
+RECONCILED_METHODS = ['stripe', 'card']
+
+REPORT_FIELDS = [
+    'line', 'stripe_payment_intent_id', 'settled_amount',
+    'payment_id', 'payment_amount', 'payment_status', 'reason'
+]
+
+
+@dataclass
+class ReconciliationSummary:
+    """Line counts produced by a reconciliation run."""
+    lines: int = 0
+    matched: int = 0
+    missing: int = 0
+    mismatched: int = 0
+
+
+def _chunks(iterable, size):
+    """Yield successive lists of at most ``size`` items."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _parse_amount(value, in_cents=False):
+    """Parse a settlement amount, returning None when it is not a finite number."""
+    try:
+        amount = Decimal(str(value).strip().replace(',', ''))
+        if not amount.is_finite():
+            return None
+        if in_cents:
+            amount = amount / Decimal('100')
+        # Raises for amounts too large to hold to the cent (e.g. 1e99)
+        return amount.quantize(Decimal('0.01'))
+    except (InvalidOperation, AttributeError):
+        return None
+
+
+def _lookup_payments(intent_ids):
+    """
+    Fetch the payments for one chunk of intent ids in a single query.
+
+    When an intent id appears on more than one payment, the completed one
+    wins, then the most recent.
+    """
+    payments = {}
+    rows = Payment.objects.filter(
+        stripe_payment_intent_id__in=intent_ids,
+        payment_method__in=RECONCILED_METHODS
+    ).order_by('id').values_list(
+        'stripe_payment_intent_id', 'id', 'amount', 'status'
+    )
+    for intent_id, payment_id, amount, payment_status in rows:
+        current = payments.get(intent_id)
+        if current is None or payment_status == 'completed' or current[2] != 'completed':
+            payments[intent_id] = (payment_id, amount, payment_status)
+    return payments
+
+
+def reconcile_settlement(source, matched, missing, mismatched,
+                         id_column='payment_intent_id', amount_column='amount',
+                         amount_in_cents=False, chunk_size=2000):
+    """
+    Reconcile a settlement CSV against Payment records.
+
+    Args:
+        source: Text file object positioned at the CSV header
+        matched: File object receiving lines that match a completed payment
+        missing: File object receiving lines with no recorded payment
+        mismatched: File object receiving lines whose amount or status differs
+        id_column: Header of the column holding the Stripe PaymentIntent id
+        amount_column: Header of the column holding the settled amount
+        amount_in_cents: Whether the file reports amounts in minor units
+        chunk_size: Number of lines matched per database query
+
+    Returns:
+        ReconciliationSummary: Counts for the run
+    """
+    reader = csv.DictReader(source)
+    if reader.fieldnames is None:
+        raise ValueError('Settlement file is empty.')
+    for column in (id_column, amount_column):
+        if column not in reader.fieldnames:
+            raise ValueError(f'Settlement file has no "{column}" column.')
+
+    writers = {}
+    for name, stream in (('matched', matched), ('missing', missing), ('mismatched', mismatched)):
+        writers[name] = csv.DictWriter(stream, fieldnames=REPORT_FIELDS)
+        writers[name].writeheader()
+
+    summary = ReconciliationSummary()
+    numbered = enumerate(reader, start=2)
+
+    for chunk in _chunks(numbered, chunk_size):
+        intent_ids = {
+            (row.get(id_column) or '').strip() for _, row in chunk
+        }
+        intent_ids.discard('')
+        payments = _lookup_payments(intent_ids) if intent_ids else {}
+
+        for line, row in chunk:
+            summary.lines += 1
+            intent_id = (row.get(id_column) or '').strip()
+            settled = _parse_amount(row.get(amount_column), amount_in_cents)
+            record = {
+                'line': line,
+                'stripe_payment_intent_id': intent_id,
+                'settled_amount': row.get(amount_column, ''),
+                'payment_id': '',
+                'payment_amount': '',
+                'payment_status': '',
+                'reason': '',
+            }
+
+            payment = payments.get(intent_id)
+            if payment is None:
+                record['reason'] = 'no_intent_id' if not intent_id else 'not_found'
+                writers['missing'].writerow(record)
+                summary.missing += 1
+                continue
+
+            payment_id, amount, payment_status = payment
+            record.update({
+                'payment_id': payment_id,
+                'payment_amount': str(amount),
+                'payment_status': payment_status,
+            })
+
+            if settled is None:
+                record['reason'] = 'invalid_amount'
+            elif settled != amount:
+                record['reason'] = 'amount_mismatch'
+            elif payment_status != 'completed':
+                record['reason'] = 'status_mismatch'
+
+            if record['reason']:
+                writers['mismatched'].writerow(record)
+                summary.mismatched += 1
+            else:
+                writers['matched'].writerow(record)
+                summary.matched += 1
+
+    return summary
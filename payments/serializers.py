@@ -13,12 +13,12 @@ class PaymentSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'folio', 'amount', 'payment_method', 'status',
             'stripe_payment_intent_id', 'mpesa_transaction_id',
-            'metadata', 'error_message',
+            'idempotency_key', 'metadata', 'error_message',
             'created_at', 'updated_at', 'completed_at'
         ]
         read_only_fields = [
             'id', 'status', 'stripe_payment_intent_id',
-            'error_message', 'created_at', 'updated_at', 'completed_at'
+            'idempotency_key', 'error_message', 'created_at', 'updated_at', 'completed_at'
         ]
 
 
@@ -1,11 +1,20 @@
 """
 Test suite for payments module.
 """
+import csv
+import io
 import pytest
 from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.utils import timezone
+from rest_framework.test import APIClient
 from .models import Payment
-from billing.models import Guest, Folio
+from .reconciliation import reconcile_settlement
+from billing.models import Guest, Folio, Charge
+from services.models import Service
+from sysnyx.testing import assert_constant_queries, locmem_cache  # noqa: F401
+
 
 
 @pytest.mark.django_db
@@ -49,3 +58,246 @@ class TestPaymentModel:
         
         assert status == 'completed'
         assert payment.completed_at is not None
+
+
+@pytest.mark.django_db
+class TestSettlementReconciliation:
+    """Tests for settlement-file reconciliation."""
+    
+    def _reconcile(self, csv_text, **kwargs):
+        reports = {name: io.StringIO() for name in ('matched', 'missing', 'mismatched')}
+        summary = reconcile_settlement(
+            io.StringIO(csv_text),
+            reports['matched'],
+            reports['missing'],
+            reports['mismatched'],
+            **kwargs
+        )
+        rows = {
+            name: list(csv.DictReader(io.StringIO(stream.getvalue())))
+            for name, stream in reports.items()
+        }
+        return summary, rows
+    
+    def test_reconcile_matched_missing_mismatched(self):
+        """Test each settlement line lands in the right report."""
+        guest = Guest.objects.create(
+            name='Settle Test',
+            room_number='203',
+            check_in=timezone.now()
+        )
+        folio = Folio.objects.create(guest=guest)
+        Payment.objects.create(
+            folio=folio,
+            amount=Decimal('100.00'),
+            payment_method='stripe',
+            status='completed',
+            stripe_payment_intent_id='pi_ok'
+        )
+        Payment.objects.create(
+            folio=folio,
+            amount=Decimal('40.00'),
+            payment_method='stripe',
+            status='completed',
+            stripe_payment_intent_id='pi_short'
+        )
+        Payment.objects.create(
+            folio=folio,
+            amount=Decimal('25.00'),
+            payment_method='card',
+            status='refunded',
+            stripe_payment_intent_id='pi_refunded'
+        )
+        
+        summary, rows = self._reconcile(
+            'payment_intent_id,amount\n'
+            'pi_ok,100.00\n'
+            'pi_short,39.00\n'
+            'pi_refunded,25.00\n'
+            'pi_unknown,10.00\n',
+            chunk_size=2
+        )
+        
+        assert summary.lines == 4
+        assert summary.matched == 1
+        assert summary.missing == 1
+        assert summary.mismatched == 2
+        assert rows['matched'][0]['stripe_payment_intent_id'] == 'pi_ok'
+        assert rows['missing'][0]['reason'] == 'not_found'
+        reasons = {row['stripe_payment_intent_id']: row['reason'] for row in rows['mismatched']}
+        assert reasons == {
+            'pi_short': 'amount_mismatch',
+            'pi_refunded': 'status_mismatch',
+        }
+    
+    def test_reconcile_amount_in_cents(self):
+        """Test minor-unit amounts are converted before comparison."""
+        guest = Guest.objects.create(
+            name='Cents Test',
+            room_number='204',
+            check_in=timezone.now()
+        )
+        folio = Folio.objects.create(guest=guest)
+        Payment.objects.create(
+            folio=folio,
+            amount=Decimal('10.50'),
+            payment_method='stripe',
+            status='completed',
+            stripe_payment_intent_id='pi_cents'
+        )
+        
+        summary, _ = self._reconcile(
+            'intent,gross\npi_cents,1050\n',
+            id_column='intent',
+            amount_column='gross',
+            amount_in_cents=True
+        )
+        
+        assert summary.matched == 1
+    
+    def test_reconcile_reports_unparseable_amounts(self):
+        """Test non-finite or oversized amounts are reported per line, not fatal."""
+        guest = Guest.objects.create(name='Bad Amounts', room_number='205', check_in=timezone.now())
+        folio = Folio.objects.create(guest=guest)
+        for intent_id in ('pi_inf', 'pi_nan', 'pi_huge', 'pi_text', 'pi_good'):
+            Payment.objects.create(
+                folio=folio,
+                amount=Decimal('10.00'),
+                payment_method='stripe',
+                status='completed',
+                stripe_payment_intent_id=intent_id
+            )
+        
+        summary, rows = self._reconcile(
+            'payment_intent_id,amount\n'
+            'pi_inf,inf\n'
+            'pi_nan,NaN\n'
+            'pi_huge,1e99\n'
+            'pi_text,ten\n'
+            'pi_good,10.00\n'
+        )
+        
+        assert summary.matched == 1
+        assert summary.mismatched == 4
+        assert {row['reason'] for row in rows['mismatched']} == {'invalid_amount'}
+    
+    def test_reconcile_requires_columns(self):
+        """Test a file without the id column is rejected."""
+        with pytest.raises(ValueError, match='payment_intent_id'):
+            self._reconcile('id,amount\npi_1,1.00\n')
+
+
+@pytest.mark.django_db
+class TestPaymentIdempotency:
+    """Tests for Idempotency-Key handling on payment endpoints."""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        cache.clear()
+        user = User.objects.create_user(username='cashier', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(user=user)
+        guest = Guest.objects.create(
+            name='Idem Test',
+            room_number='205',
+            check_in=timezone.now()
+        )
+        self.folio = Folio.objects.create(guest=guest)
+    
+    def _pay(self, key, amount='50.00'):
+        return self.client.post(
+            '/api/payments/create/',
+            {'folio_id': self.folio.id, 'amount': amount, 'payment_method': 'cash'},
+            format='json',
+            HTTP_IDEMPOTENCY_KEY=key
+        )
+    
+    def test_double_submit_creates_one_payment(self):
+        """Test a retried request returns the original payment."""
+        first = self._pay('tap-123')
+        second = self._pay('tap-123')
+        
+        assert first.status_code == 201
+        assert second.status_code == 200
+        assert second['Idempotent-Replayed'] == 'true'
+        assert second.data['id'] == first.data['id']
+        assert Payment.objects.filter(folio=self.folio).count() == 1
+        self.folio.refresh_from_db()
+        assert self.folio.total_payments == Decimal('50.00')
+    
+    def test_replay_after_cache_expiry_uses_database(self):
+        """Test the unique key is found again once the cache entry is gone."""
+        first = self._pay('tap-456')
+        cache.clear()
+        second = self._pay('tap-456')
+        
+        assert second.status_code == 200
+        assert second.data['id'] == first.data['id']
+    
+    def test_key_reuse_with_different_amount_rejected(self):
+        """Test a key cannot be reused for a different payment."""
+        self._pay('tap-789')
+        response = self._pay('tap-789', amount='75.00')
+        
+        assert response.status_code == 422
+        assert Payment.objects.filter(folio=self.folio).count() == 1
+    
+    def test_without_key_each_request_creates_payment(self):
+        """Test requests without the header are not deduplicated."""
+        self._pay('')
+        self._pay('')
+        
+        assert Payment.objects.filter(folio=self.folio).count() == 2
+
+
+@pytest.mark.django_db
+class TestQueryBudgets:
+    """Performance contracts: payment endpoints cost the same queries at any data size."""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        settings.AUDIT_CAPTURE = False
+        self.folio = Folio.objects.create(
+            guest=Guest.objects.create(name='Budget Guest', room_number='900', check_in=timezone.now())
+        )
+        self.service = Service.objects.create(name='Valet', service_type='fixed', base_price=Decimal('5.00'))
+        user = User.objects.create_user(username='budget', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(user=user)
+    
+    def reset(self):
+        cache.clear()
+    
+    def grow(self, size):
+        existing = Payment.objects.filter(folio=self.folio).count()
+        Payment.objects.bulk_create([
+            Payment(folio=self.folio, amount=Decimal('1.00'), payment_method='cash', status='completed')
+            for _ in range(existing, size)
+        ])
+        Charge.objects.bulk_create([
+            Charge(folio=self.folio, service=self.service, description='Valet',
+                   base_amount=Decimal('5.00'), final_amount=Decimal('5.00'))
+            for _ in range(existing, size)
+        ])
+    
+    def test_payment_list(self):
+        """Test a page of payments costs the same however many exist."""
+        results = assert_constant_queries(
+            self.grow, lambda: self.client.get(f'/api/payments/?folio_id={self.folio.id}'), reset=self.reset
+        )
+        assert results[10000].json()['count'] == 10000
+    
+    def test_create_payment(self):
+        """Test taking a payment costs the same however many the folio already has."""
+        keys = iter(range(10))
+        results = assert_constant_queries(
+            self.grow,
+            lambda: self.client.post(
+                '/api/payments/create/',
+                {'folio_id': self.folio.id, 'amount': '1.00', 'payment_method': 'cash'},
+                format='json',
+                HTTP_IDEMPOTENCY_KEY=f'budget-{next(keys)}'
+            ),
+            reset=self.reset
+        )
+        assert all(response.status_code == 201 for response in results.values())
@@ -5,10 +5,50 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.db import IntegrityError, transaction
 from django.shortcuts import get_object_or_404
 from billing.models import Folio
 from .models import Payment
 from .serializers import PaymentSerializer, CreatePaymentSerializer
+from . import idempotency
+
+
+def _replay_response(replay, folio_id, amount):
+    """Return the original payment for a retried request, or 422 on key reuse."""
+    if not idempotency.matches(replay, folio_id, amount):
+        return Response(
+            {'error': 'Idempotency-Key was already used for a different payment.'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    response = Response(replay['data'], status=status.HTTP_200_OK)
+    response[idempotency.REPLAY_HEADER] = 'true'
+    return response
+
+
+def _create_once(idempotency_key, folio_id, amount, **fields):
+    """
+    Create a payment, or return a replay response if the key is already taken.
+    
+    The unique index on idempotency_key settles races between concurrent
+    double-submits that both missed the replay lookup.
+    
+    Returns:
+        tuple: (payment, None) when created, (None, response) on replay
+    """
+    try:
+        with transaction.atomic():
+            payment = Payment.objects.create(
+                folio_id=folio_id,
+                amount=amount,
+                idempotency_key=idempotency_key,
+                **fields
+            )
+    except IntegrityError:
+        replay = idempotency.find_replay(idempotency_key) if idempotency_key else None
+        if replay is None:
+            raise
+        return None, _replay_response(replay, folio_id, amount)
+    return payment, None
 
 
 class PaymentViewSet(viewsets.ModelViewSet):
@@ -25,6 +65,33 @@ class PaymentViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(folio_id=folio_id)
         return queryset
     
+    def create(self, request, *args, **kwargs):
+        """Create a payment, honouring the Idempotency-Key header."""
+        try:
+            idempotency_key = idempotency.get_idempotency_key(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        folio_id = data['folio'].id
+        
+        if idempotency_key:
+            replay = idempotency.find_replay(idempotency_key)
+            if replay is not None:
+                return _replay_response(replay, folio_id, data['amount'])
+        
+        fields = {k: v for k, v in data.items() if k not in ('folio', 'amount')}
+        payment, replayed = _create_once(idempotency_key, folio_id, data['amount'], **fields)
+        if replayed is not None:
+            return replayed
+        
+        response_data = self.get_serializer(payment).data
+        idempotency.remember(payment, response_data)
+        headers = self.get_success_headers(response_data)
+        return Response(response_data, status=status.HTTP_201_CREATED, headers=headers)
+    
     @action(detail=True, methods=['post'])
     def process(self, request, pk=None):
         """Process a pending payment."""
@@ -57,6 +124,7 @@ def create_payment(request):
     Create and process a payment.
     
     POST /api/payments/create/
+    Headers: Idempotency-Key: <unique-key>  (optional)
     Body: {
         "folio_id": 1,
         "amount": 100.00,
@@ -72,24 +140,38 @@ def create_payment(request):
     
     data = serializer.validated_data
     
+    try:
+        idempotency_key = idempotency.get_idempotency_key(request)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    
+    # Retries answer from the original payment without touching the folio
+    if idempotency_key:
+        replay = idempotency.find_replay(idempotency_key)
+        if replay is not None:
+            return _replay_response(replay, data['folio_id'], data['amount'])
+    
     try:
         folio = get_object_or_404(Folio, id=data['folio_id'])
         
-        payment = Payment.objects.create(
-            folio=folio,
-            amount=data['amount'],
+        payment, replayed = _create_once(
+            idempotency_key,
+            folio.id,
+            data['amount'],
             payment_method=data['payment_method'],
             stripe_token=data.get('stripe_token', ''),
             metadata=data.get('metadata', {})
         )
+        if replayed is not None:
+            return replayed
+        payment.folio = folio
         
         # Process payment immediately
         payment.process_payment()
         
-        return Response(
-            PaymentSerializer(payment).data,
-            status=status.HTTP_201_CREATED
-        )
+        response_data = PaymentSerializer(payment).data
+        idempotency.remember(payment, response_data)
+        return Response(response_data, status=status.HTTP_201_CREATED)
     
     except Exception as e:
         return Response(
@@ -0,0 +1,125 @@
+"""
+Microbenchmarks for the pricing engine.
+
+Each case times one call of Service.calculate_amount, Service.apply_rules
+or PricingRule.apply_to_amount on unsaved instances, so no query is
+involved. Costs are reported per item (per rule in a chain, per line in an
+extras cart) and also relative to a calibration loop of plain Decimal
+arithmetic, which keeps a baseline recorded on one machine comparable
+on another.
+
+Baselines live in ``benchmark_baseline.json`` beside this module and are
+read and compared with sysnyx.benchmarking; run
+``manage.py bench_pricing --save-baseline`` after an intended change.
+"""
+import json
+import timeit
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+from .models import Service, PricingRule
+
+
+BASELINE_PATH = Path(__file__).resolve().parent / 'benchmark_baseline.json'
+CENTS = Decimal('0.01')
+
+PEAK = {'time': datetime(2024, 6, 1, 19, 30, tzinfo=dt_timezone.utc)}
+OFF_PEAK = {'time': datetime(2024, 6, 1, 9, 30, tzinfo=dt_timezone.utc)}
+
+
+def _service(service_type, price='12.50'):
+    return Service(name=f'Bench {service_type}', service_type=service_type, base_price=Decimal(price))
+
+
+def _rule(rule_type='tax', value='16.00', conditions=None, priority=0):
+    return PricingRule(
+        name=f'Bench {rule_type}',
+        rule_type=rule_type,
+        value=Decimal(value),
+        conditions=conditions or {},
+        priority=priority
+    )
+
+
+def _chain(length):
+    kinds = ('tax', 'discount', 'surcharge')
+    return [_rule(kinds[i % 3], f'{1 + i % 9}.50', priority=i) for i in range(length)]
+
+
+def _cart(lines):
+    return [{'name': f'Item {i}', 'price': f'{3 + i % 17}.{i % 100:02d}'} for i in range(lines)]
+
+
+def build_cases():
+    """
+    The benchmark cases.
+
+    Returns:
+        list: (name, items, zero-argument callable) tuples
+    """
+    fixed, per_unit, variable = _service('fixed'), _service('per_unit'), _service('variable')
+    tax = _rule()
+    peak_rule = _rule('surcharge', '20.00', {'peak_hours': '18:00-22:00'})
+    base = Decimal('125.00')
+    cases = [
+        ('calculate fixed', 1, lambda: fixed.calculate_amount()),
+        ('calculate per_unit', 1, lambda: per_unit.calculate_amount(quantity=3)),
+        ('rule tax', 1, lambda: tax.apply_to_amount(base)),
+        ('rule peak hours, in window', 1, lambda: peak_rule.apply_to_amount(base, PEAK)),
+        ('rule peak hours, outside', 1, lambda: peak_rule.apply_to_amount(base, OFF_PEAK)),
+    ]
+
+    for length in (1, 4, 16):
+        rules = _chain(length)
+        cases.append((f'apply_rules chain of {length}', length,
+                      lambda rules=rules: per_unit.apply_rules(base, None, rules=rules)))
+    peak_chain = _chain(3) + [peak_rule]
+    cases.append(('apply_rules chain with peak rule', len(peak_chain),
+                  lambda: per_unit.apply_rules(base, PEAK, rules=peak_chain)))
+
+    for lines in (10, 100, 1000):
+        cart = _cart(lines)
+        cases.append((f'calculate variable, {lines} extras', lines,
+                      lambda cart=cart: variable.calculate_amount(extras=cart)))
+    encoded = json.dumps(_cart(100))
+    cases.append(('calculate variable, 100 extras as JSON', 100,
+                  lambda: variable.calculate_amount(extras=encoded)))
+    return cases
+
+
+def _calibration():
+    value = Decimal('123.45')
+    factor = Decimal('1.16')
+    return (value * factor).quantize(CENTS)
+
+
+def time_call(func, number, repeat):
+    """Best-of-``repeat`` seconds per call."""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def run_suite(number=2000, repeat=5, only=None):
+    """
+    Time every case.
+
+    Args:
+        number: Calls per timing for single-item cases; scaled down by item count
+        repeat: Timings per case, the fastest of which is kept
+        only: Optional substring selecting cases by name
+
+    Returns:
+        dict: calibration_ns and per-case ns_per_call, ns_per_item and relative cost
+    """
+    calibration = time_call(_calibration, number * 5, repeat)
+    cases = {}
+    for name, items, func in build_cases():
+        if only and only not in name:
+            continue
+        per_call = time_call(func, max(10, number // items), repeat)
+        cases[name] = {
+            'items': items,
+            'ns_per_call': round(per_call * 1e9, 1),
+            'ns_per_item': round(per_call / items * 1e9, 1),
+            'relative': round(per_call / items / calibration, 3),
+        }
+    return {'calibration_ns': round(calibration * 1e9, 1), 'cases': cases}
@@ -0,0 +1,172 @@
+"""
+Service catalog versioning and snapshots.
+
+Any write to a Service or PricingRule bumps the catalog version, which
+conditional GETs on the service endpoints compare against.
+
+The catalog itself is read through a snapshot keyed by that version: a
+process-local copy in front of a shared copy in the Django cache, built
+from the database only when both miss. A new version simply stops matching
+the old keys, so no explicit invalidation is needed.
+"""
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.core.cache import cache
+
+
+VERSION_KEY = 'services:catalog:version'
+# (version, ms timestamp) of the last bump; shares the version's local-cache prefix
+MODIFIED_KEY = 'services:catalog:version:modified'
+SNAPSHOT_KEY = 'services:catalog:snapshot:{version}'
+
+_local = {}
+_local_lock = threading.Lock()
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def catalog_version():
+    """
+    Current catalog version: a counter started from the time in milliseconds.
+
+    A version lost from the cache restarts at the current time, so it never
+    repeats a value clients may hold.
+    """
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, _now_ms(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """
+    Advance the catalog version after a Service or PricingRule write.
+
+    The increment is atomic in Redis, so concurrent writers on any host get
+    distinct, increasing versions whatever their clocks say.
+    """
+    cache.add(VERSION_KEY, _now_ms(), timeout=None)
+    try:
+        version = cache.incr(VERSION_KEY)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.add(VERSION_KEY, _now_ms(), timeout=None)
+        version = cache.incr(VERSION_KEY)
+    cache.set(MODIFIED_KEY, (version, _now_ms()), timeout=None)
+    return version
+
+
+def catalog_modified(version):
+    """
+    Datetime a catalog version was created, for Last-Modified.
+
+    If the time of ``version`` isn't known (evicted, or a concurrent bump
+    recorded another version's), the current time is used, which can only
+    make If-Modified-Since miss, never answer 304 for a changed catalog.
+    """
+    stamp = cache.get(MODIFIED_KEY)
+    if stamp is not None and stamp[0] == version:
+        millis = stamp[1]
+    else:
+        millis = _now_ms()
+    return datetime.fromtimestamp(millis / 1000, tz=dt_timezone.utc)
+
+
+class CatalogSnapshot:
+    """
+    Immutable catalog as of one version.
+
+    Holds ServiceSerializer payloads for every service in name order, the
+    active pricing rules per service, and rendered response bodies built
+    from them in this process.
+    """
+
+    def __init__(self, version, services):
+        self.version = version
+        self._services = services
+        self._by_id = {service['id']: service for service in services}
+        self.active_rules = {
+            service['id']: [rule for rule in service['pricing_rules'] if rule['is_active']]
+            for service in services
+        }
+        self._rendered = {}
+
+    def services(self, include_inactive=False):
+        """Service payloads in catalog order."""
+        if include_inactive:
+            return self._services
+        return [service for service in self._services if service['is_active']]
+
+    def get(self, service_id, include_inactive=False):
+        """One service payload, or None if it is missing or inactive."""
+        service = self._by_id.get(service_id)
+        if service is None or not (include_inactive or service['is_active']):
+            return None
+        return service
+
+    def rendered(self, key, render):
+        """
+        Rendered body for ``key``, calling ``render()`` on first use.
+
+        The number of distinct bodies kept is bounded by
+        CATALOG_RENDERED_PAGES; past it the oldest half is dropped.
+        """
+        content = self._rendered.get(key)
+        if content is None:
+            content = render()
+            if len(self._rendered) >= settings.CATALOG_RENDERED_PAGES:
+                for old in list(self._rendered)[:len(self._rendered) // 2 or 1]:
+                    self._rendered.pop(old, None)
+            self._rendered[key] = content
+        return content
+
+
+def build_snapshot(version):
+    """Read the catalog from the database; two queries."""
+    from .models import Service
+    from .readers import service_payloads, service_rows
+
+    return CatalogSnapshot(version, service_payloads(service_rows(Service.objects.all())))
+
+
+def get_snapshot(version=None):
+    """
+    Catalog snapshot for a version, from the nearest cache level.
+
+    Args:
+        version: Catalog version (read from the cache when omitted)
+
+    Returns:
+        CatalogSnapshot
+    """
+    if version is None:
+        version = catalog_version()
+    snapshot = _local.get(version)
+    if snapshot is not None:
+        return snapshot
+
+    key = SNAPSHOT_KEY.format(version=version)
+    services = cache.get(key)
+    if services is None:
+        snapshot = build_snapshot(version)
+        cache.set(key, snapshot.services(include_inactive=True), settings.CATALOG_SNAPSHOT_TTL)
+    else:
+        snapshot = CatalogSnapshot(version, services)
+
+    with _local_lock:
+        # Only the newest version is worth keeping in process memory
+        for old in [old for old in _local if old < version]:
+            del _local[old]
+        _local[version] = snapshot
+    return snapshot
+
+
+def clear_local_snapshots():
+    """Drop this process's snapshots (tests and cache flushes)."""
+    with _local_lock:
+        _local.clear()
@@ -0,0 +1,56 @@
+"""
+Management command to run the pricing-engine microbenchmarks.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from services.benchmarks import BASELINE_PATH, run_suite
+from sysnyx.benchmarking import find_regressions, load_baseline, save_baseline
+
+
+class Command(BaseCommand):
+    help = (
+        'Times calculate_amount, apply_rules and apply_to_amount and compares the '
+        'per-item cost with the stored baseline; fails on regressions beyond --tolerance'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=2000, help='Calls per timing for single-item cases')
+        parser.add_argument('--repeat', type=int, default=5, help='Timings per case; the fastest is kept')
+        parser.add_argument('--only', default=None, help='Run only cases whose name contains this')
+        parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed growth in relative cost (0.25 = 25%%)')
+        parser.add_argument('--baseline', default=str(BASELINE_PATH), help='Baseline JSON file')
+        parser.add_argument('--save-baseline', action='store_true', help='Record this run as the new baseline')
+
+    def handle(self, *args, **options):
+        results = run_suite(options['number'], options['repeat'], options['only'])
+        baseline = load_baseline(options['baseline'])
+
+        self.stdout.write(f"Calibration: {results['calibration_ns']:.1f} ns per Decimal multiply and quantize")
+        self.stdout.write(f"{'case':<40} {'ns/call':>10} {'ns/item':>9} {'relative':>9} {'vs base':>8}")
+        for name, case in results['cases'].items():
+            previous = baseline['cases'].get(name) if baseline else None
+            change = f"{case['relative'] / previous['relative'] - 1:+8.1%}" if previous else '       -'
+            self.stdout.write(
+                f"{name:<40} {case['ns_per_call']:>10.1f} {case['ns_per_item']:>9.1f} "
+                f"{case['relative']:>9.3f} {change}"
+            )
+
+        if options['save_baseline']:
+            if options['only'] and baseline:
+                # Keep the cases that weren't run
+                results['cases'] = {**baseline['cases'], **results['cases']}
+            save_baseline(results, options['baseline'])
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {options['baseline']}"))
+            return
+
+        if baseline is None:
+            self.stdout.write(self.style.WARNING('No baseline found; run with --save-baseline to record one.'))
+            return
+
+        regressions = find_regressions(results, baseline, options['tolerance'])
+        if regressions:
+            for name, before, after, change in regressions:
+                self.stderr.write(f'{name}: relative cost {before:.3f} -> {after:.3f} ({change:+.1%})')
+            raise CommandError(
+                f"{len(regressions)} pricing benchmark(s) regressed by more than {options['tolerance']:.0%}."
+            )
+        self.stdout.write(self.style.SUCCESS(f"No regressions beyond {options['tolerance']:.0%}."))
@@ -69,13 +69,14 @@ class Service(models.Model):
         
         return amount.quantize(Decimal('0.01'))
     
-    def apply_rules(self, base_amount, context=None):
+    def apply_rules(self, base_amount, context=None, rules=None):
         """
         Apply all active pricing rules to base amount.
         
         Args:
             base_amount: Base calculated amount
             context: Optional context dict (e.g., {'time': datetime.now()})
+            rules: Active rules in priority order, if already fetched
         
         Returns:
             tuple: (final_amount, breakdown_list)
@@ -83,7 +84,8 @@ class Service(models.Model):
         breakdown = [{'type': 'base', 'amount': str(base_amount)}]
         final_amount = base_amount
         
-        rules = self.pricing_rules.filter(is_active=True).order_by('priority')
+        if rules is None:
+            rules = self.pricing_rules.filter(is_active=True).order_by('priority')
         for rule in rules:
             rule_amount = rule.apply_to_amount(final_amount, context)
             if rule_amount != final_amount:
@@ -0,0 +1,78 @@
+"""
+Hand-tuned read paths for service responses.
+
+Builds the same payloads as ServiceSerializer from ``.values()`` rows, with
+every service's pricing rules fetched in a single query.
+"""
+from sysnyx.renderers import format_datetime, format_decimal, row_mapper
+from .models import PricingRule
+
+
+SERVICE_FIELDS = (
+    ('id', 'id', None),
+    ('name', 'name', None),
+    ('description', 'description', None),
+    ('service_type', 'service_type', None),
+    ('base_price', 'base_price', format_decimal),
+    ('is_active', 'is_active', None),
+    ('created_at', 'created_at', format_datetime),
+    ('updated_at', 'updated_at', format_datetime),
+)
+
+RULE_FIELDS = (
+    ('id', 'id', None),
+    ('name', 'name', None),
+    ('rule_type', 'rule_type', None),
+    ('value', 'value', format_decimal),
+    ('conditions', 'conditions', None),
+    ('priority', 'priority', None),
+    ('is_active', 'is_active', None),
+    ('created_at', 'created_at', format_datetime),
+)
+
+_service = row_mapper(SERVICE_FIELDS)
+_rule = row_mapper(RULE_FIELDS)
+
+_service_columns = [key for _, key, _ in SERVICE_FIELDS]
+_rule_columns = ['service_id'] + [key for _, key, _ in RULE_FIELDS]
+
+
+def service_rows(queryset):
+    """The ``.values()`` rows service_payloads() expects; safe to paginate."""
+    return queryset.values(*_service_columns)
+
+
+def service_payloads(rows):
+    """
+    ServiceSerializer output for a page of service rows, in their order.
+
+    Args:
+        rows: Rows from service_rows()
+
+    Returns:
+        list: Service dicts with nested pricing_rules
+    """
+    rows = list(rows)
+    if not rows:
+        return []
+
+    rules = {row['id']: [] for row in rows}
+    # Meta ordering (priority, created_at) matches service.pricing_rules.all()
+    for row in PricingRule.objects.filter(service_id__in=rules).values(*_rule_columns):
+        rules[row['service_id']].append(_rule(row))
+
+    payloads = []
+    for row in rows:
+        data = _service(row)
+        payloads.append({
+            'id': data['id'],
+            'name': data['name'],
+            'description': data['description'],
+            'service_type': data['service_type'],
+            'base_price': data['base_price'],
+            'is_active': data['is_active'],
+            'pricing_rules': rules[row['id']],
+            'created_at': data['created_at'],
+            'updated_at': data['updated_at'],
+        })
+    return payloads
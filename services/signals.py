@@ -0,0 +1,17 @@
+"""
+Signal handlers keeping the service catalog version current.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .catalog import bump_catalog_version
+from .models import Service, PricingRule
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=PricingRule)
+@receiver(post_delete, sender=PricingRule)
+def catalog_changed(sender, **kwargs):
+    """Bump the catalog version once the write is committed."""
+    transaction.on_commit(bump_catalog_version)
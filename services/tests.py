@@ -5,7 +5,18 @@ import pytest
 from decimal import Decimal
 from django.core.exceptions import ValidationError
 from django.utils import timezone
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+from django.core.cache import cache
+from .benchmarks import BASELINE_PATH, run_suite
+from . import catalog
+from .catalog import bump_catalog_version, catalog_modified, catalog_version, clear_local_snapshots, get_snapshot
 from .models import Service, PricingRule
+from .readers import service_payloads, service_rows
+from .serializers import ServiceSerializer
+from sysnyx.benchmarking import find_regressions, load_baseline
+from sysnyx.testing import assert_constant_queries, locmem_cache  # noqa: F401
+
 
 
 @pytest.mark.django_db
@@ -161,3 +172,237 @@ class TestPricingRule:
         # 100 - 10% = 90, then 90 + 16% = 104.40
         assert final == Decimal('104.40')
         assert len(breakdown) == 4  # base, discount, tax, final
+
+
+@pytest.mark.django_db
+class TestServiceReaders:
+    """Tests for the values-based service reader."""
+    
+    def test_service_payloads_match_serializer(self):
+        """Test fast service payloads equal ServiceSerializer output."""
+        spa = Service.objects.create(
+            name='Spa',
+            description='Massage',
+            service_type='fixed',
+            base_price=Decimal('80.00')
+        )
+        Service.objects.create(name='Valet', service_type='per_unit', base_price=Decimal('5.00'))
+        PricingRule.objects.create(
+            service=spa, name='VAT', rule_type='tax', value=Decimal('16.00'), priority=2
+        )
+        PricingRule.objects.create(
+            service=spa, name='Happy Hour', rule_type='discount', value=Decimal('10.00'),
+            conditions={'peak_hours': '18:00-22:00'}, priority=1, is_active=False
+        )
+        
+        queryset = Service.objects.all()
+        assert service_payloads(service_rows(queryset)) == ServiceSerializer(queryset, many=True).data
+
+
+@pytest.mark.django_db
+class TestCatalogConditionalGet:
+    """Tests for catalog versioning and ETag revalidation."""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        cache.clear()
+        clear_local_snapshots()
+        self.service = Service.objects.create(
+            name='Laundry',
+            service_type='per_unit',
+            base_price=Decimal('3.00')
+        )
+        user = User.objects.create_user(username='dashboard', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(user=user)
+    
+    def test_writes_bump_version(self, django_capture_on_commit_callbacks):
+        """Test service and rule writes advance the catalog version."""
+        version = catalog_version()
+        with django_capture_on_commit_callbacks(execute=True):
+            PricingRule.objects.create(
+                service=self.service, name='VAT', rule_type='tax', value=Decimal('16.00')
+            )
+        assert catalog_version() > version
+    
+    def test_bumps_are_distinct_whatever_the_clock(self, monkeypatch):
+        """Test bumps in the same millisecond, or with a clock behind, get distinct versions."""
+        version = catalog_version()
+        stalled = version - 5000
+        monkeypatch.setattr(catalog, '_now_ms', lambda: stalled)
+        first = bump_catalog_version()
+        second = bump_catalog_version()
+        assert version < first < second == catalog_version()
+        assert catalog_modified(second).timestamp() == stalled / 1000
+        
+        # The time of an older version isn't kept; it counts as modified now
+        stalled += 1000
+        assert catalog_modified(first).timestamp() == stalled / 1000
+    
+    def test_not_modified_without_queries(self, django_capture_on_commit_callbacks, django_assert_num_queries):
+        """Test a current catalog ETag gets 304 without touching the database."""
+        first = self.client.get('/api/services/')
+        assert first.status_code == 200
+        
+        with django_assert_num_queries(0):
+            cached = self.client.get('/api/services/', HTTP_IF_NONE_MATCH=first['ETag'])
+        assert cached.status_code == 304
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            self.service.name = 'Express Laundry'
+            self.service.save()
+        changed = self.client.get('/api/services/', HTTP_IF_NONE_MATCH=first['ETag'])
+        assert changed.status_code == 200
+        assert changed.json()['results'][0]['name'] == 'Express Laundry'
+
+
+@pytest.mark.django_db
+class TestCatalogSnapshot:
+    """Tests for the versioned catalog snapshot."""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        cache.clear()
+        clear_local_snapshots()
+        self.spa = Service.objects.create(name='Spa', service_type='fixed', base_price=Decimal('80.00'))
+        self.closed = Service.objects.create(
+            name='Closed Bar', service_type='fixed', base_price=Decimal('9.00'), is_active=False
+        )
+        PricingRule.objects.create(service=self.spa, name='VAT', rule_type='tax', value=Decimal('16.00'))
+        PricingRule.objects.create(
+            service=self.spa, name='Old Promo', rule_type='discount', value=Decimal('5.00'), is_active=False
+        )
+        user = User.objects.create_user(username='kiosk', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(user=user)
+    
+    def test_snapshot_matches_serializer(self):
+        """Test snapshot payloads equal ServiceSerializer output."""
+        snapshot = get_snapshot()
+        assert snapshot.services(include_inactive=True) == ServiceSerializer(Service.objects.all(), many=True).data
+        assert [service['name'] for service in snapshot.services()] == ['Spa']
+        assert [rule['name'] for rule in snapshot.active_rules[self.spa.id]] == ['VAT']
+    
+    def test_reads_served_from_snapshot(self, django_assert_num_queries):
+        """Test repeat catalog reads skip the database entirely."""
+        first = self.client.get('/api/services/')
+        with django_assert_num_queries(0):
+            again = self.client.get('/api/services/')
+            detail = self.client.get(f'/api/services/{self.spa.id}/')
+        
+        assert again.content == first.content
+        assert detail.json()['name'] == 'Spa'
+        assert self.client.get(f'/api/services/{self.closed.id}/').status_code == 404
+        inactive = self.client.get('/api/services/?include_inactive=true').json()
+        assert inactive['count'] == 2
+    
+    def test_shared_cache_survives_local_loss(self, django_assert_num_queries):
+        """Test another process rebuilds its local copy from the shared cache."""
+        get_snapshot()
+        clear_local_snapshots()
+        with django_assert_num_queries(0):
+            assert len(get_snapshot().services()) == 1
+    
+    def test_write_publishes_new_snapshot(self, django_capture_on_commit_callbacks):
+        """Test a catalog write is visible on the next read."""
+        self.client.get('/api/services/')
+        with django_capture_on_commit_callbacks(execute=True):
+            self.spa.base_price = Decimal('95.00')
+            self.spa.save()
+        
+        response = self.client.get('/api/services/')
+        assert response.json()['results'][0]['base_price'] == '95.00'
+
+
+class TestPricingBenchmarks:
+    """Tests for the pricing microbenchmark suite."""
+    
+    def test_suite_covers_baseline(self):
+        """Test every case runs and has a stored baseline."""
+        results = run_suite(number=10, repeat=1)
+        baseline = load_baseline(BASELINE_PATH)
+        
+        assert baseline is not None
+        assert set(results['cases']) == set(baseline['cases'])
+        assert all(case['relative'] > 0 for case in results['cases'].values())
+    
+    def test_regressions_beyond_tolerance(self):
+        """Test only cases slower than the tolerance are flagged."""
+        baseline = {'cases': {'a': {'relative': 1.0}, 'b': {'relative': 2.0}}}
+        results = {'cases': {
+            'a': {'relative': 1.2},
+            'b': {'relative': 3.0},
+            'new': {'relative': 9.0},
+        }}
+        regressions = find_regressions(results, baseline, tolerance=0.25)
+        assert [name for name, *_ in regressions] == ['b']
+        assert regressions[0][3] == pytest.approx(0.5)
+
+
+@pytest.mark.django_db
+class TestQueryBudgets:
+    """Performance contracts: catalog endpoints cost the same queries at any data size."""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.service = Service.objects.create(name='Spa', service_type='per_unit', base_price=Decimal('80.00'))
+        user = User.objects.create_user(username='budget', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(user=user)
+    
+    def reset(self):
+        cache.clear()
+        clear_local_snapshots()
+    
+    def grow_services(self, size):
+        existing = Service.objects.count()
+        services = Service.objects.bulk_create([
+            Service(name=f'Service {i:05d}', service_type='fixed', base_price=Decimal('5.00'))
+            for i in range(existing, size)
+        ])
+        PricingRule.objects.bulk_create([
+            PricingRule(service=service, name='VAT', rule_type='tax', value=Decimal('16.00'))
+            for service in services
+        ])
+    
+    def grow_rules(self, size):
+        existing = self.service.pricing_rules.count()
+        PricingRule.objects.bulk_create([
+            PricingRule(service=self.service, name=f'Rule {i}', rule_type='tax', value=Decimal('0.10'), priority=i)
+            for i in range(existing, size)
+        ])
+    
+    @pytest.mark.parametrize('fast', [True, False])
+    def test_service_list(self, settings, fast):
+        """Test a catalog page costs the same however many services exist."""
+        if not fast:
+            settings.FAST_READ_ENDPOINTS = set()
+        results = assert_constant_queries(
+            self.grow_services, lambda: self.client.get('/api/services/'), reset=self.reset
+        )
+        assert results[10000].json()['count'] == 10000
+    
+    @pytest.mark.parametrize('fast', [True, False])
+    def test_service_detail(self, settings, fast):
+        """Test a service costs the same with 1 or 10,000 pricing rules."""
+        if not fast:
+            settings.FAST_READ_ENDPOINTS = set()
+        results = assert_constant_queries(
+            self.grow_rules, lambda: self.client.get(f'/api/services/{self.service.id}/'), reset=self.reset
+        )
+        assert len(results[10000].json()['pricing_rules']) == 10000
+    
+    def test_preview(self):
+        """Test a preview costs the same with 1 or 10,000 pricing rules."""
+        results = assert_constant_queries(
+            self.grow_rules,
+            lambda: self.client.post('/api/services/calc/preview/', {'service_id': self.service.id}, format='json'),
+            reset=self.reset
+        )
+        assert results[10000].status_code == 200
+    
+    def test_rule_list(self):
+        """Test a page of pricing rules costs the same however many exist."""
+        assert_constant_queries(
+            self.grow_rules, lambda: self.client.get('/api/services/rules/'), reset=self.reset
+        )
@@ -2,10 +2,14 @@
 API views for services module.
 """
 from rest_framework import viewsets, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse
+from sysnyx.conditional import make_etag, not_modified, set_validators
+from sysnyx.renderers import endpoint_renderers, fast_reads
+from .catalog import catalog_modified, catalog_version, get_snapshot
 from .models import Service, PricingRule
 from .serializers import (
     ServiceSerializer,
@@ -21,13 +25,80 @@ class ServiceViewSet(viewsets.ModelViewSet):
     queryset = Service.objects.all()
     serializer_class = ServiceSerializer
     permission_classes = [IsAuthenticated]
+    renderer_classes = endpoint_renderers('services')
     
     def get_queryset(self):
         """Filter active services by default."""
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().prefetch_related('pricing_rules')
         if self.request.query_params.get('include_inactive') != 'true':
             queryset = queryset.filter(is_active=True)
         return queryset
+    
+    def _catalog_validators(self, request, version):
+        """ETag and Last-Modified from the catalog version, without a query."""
+        return make_etag('services', request.get_full_path(), version), catalog_modified(version)
+    
+    def _include_inactive(self):
+        return self.request.query_params.get('include_inactive') == 'true'
+    
+    def _snapshot_response(self, request, snapshot, build):
+        """
+        Serve a body built from the snapshot, pre-rendered per URL.
+        
+        Rendering is skipped on repeat requests for the same page; the
+        browsable API still goes through normal content negotiation.
+        """
+        if request.accepted_renderer.format != 'json':
+            return build()
+        content = snapshot.rendered(
+            request.build_absolute_uri(),
+            lambda: request.accepted_renderer.render(build().data)
+        )
+        return HttpResponse(content, content_type='application/json')
+    
+    def list(self, request, *args, **kwargs):
+        """List services from the catalog snapshot, answering conditional requests with 304."""
+        version = catalog_version()
+        validators = self._catalog_validators(request, version)
+        response = not_modified(request, *validators)
+        if response is not None:
+            return response
+        
+        if not fast_reads('services'):
+            response = super().list(request, *args, **kwargs)
+        else:
+            snapshot = get_snapshot(version)
+            
+            def build():
+                services = snapshot.services(self._include_inactive())
+                page = self.paginate_queryset(services)
+                if page is not None:
+                    return self.get_paginated_response(page)
+                return Response(services)
+            
+            response = self._snapshot_response(request, snapshot, build)
+        return set_validators(response, *validators)
+    
+    def retrieve(self, request, *args, **kwargs):
+        """Retrieve a service from the catalog snapshot, answering conditional requests with 304."""
+        version = catalog_version()
+        validators = self._catalog_validators(request, version)
+        response = not_modified(request, *validators)
+        if response is not None:
+            return response
+        
+        if not fast_reads('services'):
+            response = super().retrieve(request, *args, **kwargs)
+        else:
+            snapshot = get_snapshot(version)
+            try:
+                service = snapshot.get(int(kwargs['pk']), self._include_inactive())
+            except (TypeError, ValueError):
+                service = None
+            if service is None:
+                raise Http404
+            response = self._snapshot_response(request, snapshot, lambda: Response(service))
+        return set_validators(response, *validators)
 
 
 class PricingRuleViewSet(viewsets.ModelViewSet):
@@ -49,6 +120,7 @@ class PricingRuleViewSet(viewsets.ModelViewSet):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@renderer_classes(endpoint_renderers('preview'))
 def preview_calc(request):
     """
     Preview charge calculation for a service.
@@ -0,0 +1,16 @@
+"""
+Admin configuration for sync module.
+"""
+from django.contrib import admin
+from .models import OfflineTap
+
+
+@admin.register(OfflineTap)
+class OfflineTapAdmin(admin.ModelAdmin):
+    list_display = ['tap_id', 'room_number', 'device_id', 'status', 'captured_at', 'received_at']
+    list_filter = ['status', 'received_at']
+    search_fields = ['tap_id', 'room_number', 'device_id']
+    readonly_fields = [
+        'tap_id', 'device_id', 'room_number', 'payload', 'captured_at',
+        'status', 'charge', 'error', 'received_at'
+    ]
@@ -0,0 +1,184 @@
+"""
+Delta feed of catalog and room occupancy changes for NFC readers.
+
+Writes append the identity of what changed to SyncChange once their
+transaction commits. A pull returns the current state of everything changed
+after the reader's sequence number, so many edits to one service collapse
+into a single entry and deletions show up as keys without a payload.
+
+Each change is its own single-row insert stamped with the database clock,
+so created_at is as good as its commit time. Sequence numbers can still
+commit out of order while concurrent inserts are in flight; pulls leave out
+changes younger than SYNC_SETTLE_SECONDS, which only has to cover one such
+insert rather than the writing transaction. A change is lost if its process
+dies between the write committing and the insert; readers pick it up on
+their next snapshot.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import Now
+from django.utils import timezone
+from billing.models import Guest
+from services.models import Service
+from .models import SyncChange, SyncWatermark
+
+
+ROOM_FIELDS = ('room_number', 'id', 'name', 'check_in', 'check_out', 'folio__id', 'folio__status')
+
+
+class ChangesPruned(Exception):
+    """Raised when a reader asks for changes that are no longer kept."""
+
+    def __init__(self, pruned_through):
+        super().__init__(f'Changes up to #{pruned_through} have been pruned.')
+        self.pruned_through = pruned_through
+
+
+def record_change(entity_type, entity_key):
+    """Append a change for a service id or room number once the current transaction commits."""
+    entity_key = str(entity_key)
+    transaction.on_commit(lambda: SyncChange.objects.create(
+        entity_type=entity_type, entity_key=entity_key, created_at=Now()
+    ))
+
+
+def _pruned_through():
+    return SyncWatermark.objects.filter(pk=1).values_list('pruned_through', flat=True).first() or 0
+
+
+def current_seq():
+    """Highest sequence number readers may safely start from."""
+    last_id = SyncChange.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    # Pruning may have emptied the feed; never hand out a seq below it
+    return max(last_id, _pruned_through())
+
+
+def room_payloads(room_numbers=None):
+    """
+    Active room -> guest/folio mappings.
+    
+    A room maps to its most recently checked-in active guest, with the
+    folio id once one exists.
+    
+    Args:
+        room_numbers: Rooms to look up (all occupied rooms when omitted)
+    
+    Returns:
+        dict: room_number -> payload
+    """
+    guests = Guest.objects.filter(is_active=True)
+    if room_numbers is not None:
+        guests = guests.filter(room_number__in=room_numbers)
+    rooms = {}
+    for row in guests.order_by('room_number', '-check_in').values(*ROOM_FIELDS):
+        if row['room_number'] in rooms:
+            continue
+        rooms[row['room_number']] = {
+            'room_number': row['room_number'],
+            'guest_id': row['id'],
+            'guest_name': row['name'],
+            'check_in': row['check_in'],
+            'check_out': row['check_out'],
+            'folio_id': row['folio__id'],
+            'folio_status': row['folio__status'],
+        }
+    return rooms
+
+
+def snapshot():
+    """
+    Full reader state with the sequence number to pull changes from.
+    
+    The sequence is read first: anything committed while the snapshot is
+    built is replayed by the next pull, and replaying an upsert is harmless.
+    """
+    # Deferred: readers pull in DRF, and this module is imported at startup
+    # (for the signal handlers) by workers and commands that never serve a read
+    from services.readers import service_payloads, service_rows
+    seq = current_seq()
+    return {
+        'seq': seq,
+        'services': service_payloads(service_rows(Service.objects.all())),
+        'rooms': list(room_payloads().values()),
+    }
+
+
+def changes_since(since, limit=None):
+    """
+    Collapsed changes after ``since``.
+    
+    Args:
+        since: Last sequence number the reader applied
+        limit: Maximum change rows read (SYNC_PAGE_SIZE by default)
+    
+    Returns:
+        dict: seq to resume from, has_more, and upserts/deletes per entity type
+    
+    Raises:
+        ChangesPruned: If changes after ``since`` have already been pruned
+    """
+    from services.readers import service_payloads, service_rows
+    limit = limit or settings.SYNC_PAGE_SIZE
+    watermark = _pruned_through()
+    if since < watermark:
+        raise ChangesPruned(watermark)
+
+    # Against the database clock that stamped the changes
+    settled = Now() - timedelta(seconds=settings.SYNC_SETTLE_SECONDS)
+    rows = list(
+        SyncChange.objects.filter(id__gt=since, created_at__lte=settled)
+        .order_by('id')
+        .values_list('id', 'entity_type', 'entity_key')[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    keys = {'service': set(), 'room': set()}
+    for _, entity_type, entity_key in rows:
+        keys[entity_type].add(entity_key)
+
+    service_ids = {int(key) for key in keys['service']}
+    services = {
+        payload['id']: payload
+        for payload in service_payloads(service_rows(Service.objects.filter(id__in=service_ids)))
+    } if service_ids else {}
+    rooms = room_payloads(keys['room']) if keys['room'] else {}
+
+    return {
+        'since': since,
+        'seq': rows[-1][0] if rows else since,
+        'has_more': has_more,
+        'services': {
+            'upserts': list(services.values()),
+            'deletes': sorted(service_ids - set(services)),
+        },
+        'rooms': {
+            'upserts': list(rooms.values()),
+            'deletes': sorted(keys['room'] - set(rooms)),
+        },
+    }
+
+
+def prune_changes(days=None):
+    """
+    Drop changes older than the retention period.
+    
+    Readers behind the pruned range get 410 and must take a new snapshot.
+    
+    Returns:
+        int: Number of changes deleted
+    """
+    days = settings.SYNC_RETENTION_DAYS if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    with transaction.atomic():
+        last_id = SyncChange.objects.filter(
+            created_at__lt=cutoff
+        ).order_by('-id').values_list('id', flat=True).first()
+        if last_id is None:
+            return 0
+        watermark, _ = SyncWatermark.objects.select_for_update().get_or_create(pk=1)
+        watermark.pruned_through = max(watermark.pruned_through, last_id)
+        watermark.save(update_fields=['pruned_through'])
+        deleted, _ = SyncChange.objects.filter(id__lte=last_id).delete()
+    return deleted
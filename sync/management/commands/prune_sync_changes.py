@@ -0,0 +1,17 @@
+"""
+Management command to prune the reader change feed.
+"""
+from django.core.management.base import BaseCommand
+from sync.feed import prune_changes
+
+
+class Command(BaseCommand):
+    help = 'Deletes reader sync changes older than SYNC_RETENTION_DAYS'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Override the retention period')
+
+    def handle(self, *args, **options):
+        deleted = prune_changes(options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Pruned {deleted} sync changes.'))
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('billing', '0002_folio_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity_type', models.CharField(choices=[('service', 'Service'), ('room', 'Room')], max_length=20)),
+                ('entity_key', models.CharField(help_text='Service id or room number', max_length=50)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SyncWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pruned_through', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OfflineTap',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tap_id', models.CharField(max_length=100, unique=True)),
+                ('device_id', models.CharField(blank=True, max_length=100)),
+                ('room_number', models.CharField(max_length=20)),
+                ('payload', models.JSONField(default=dict, help_text='Tap as uploaded by the reader')),
+                ('captured_at', models.DateTimeField()),
+                ('status', models.CharField(choices=[('applied', 'Applied'), ('rejected', 'Rejected')], max_length=20)),
+                ('error', models.CharField(blank=True, max_length=200)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('charge', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='offline_taps', to='billing.charge')),
+            ],
+            options={
+                'ordering': ['-received_at'],
+                'indexes': [models.Index(fields=['status', '-received_at'], name='sync_offlin_status_2a0622_idx')],
+            },
+        ),
+    ]
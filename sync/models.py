@@ -0,0 +1,76 @@
+"""
+Change log and offline tap models for reader synchronization.
+"""
+from django.db import models
+from django.utils import timezone
+from billing.models import Charge
+
+
+class SyncChange(models.Model):
+    """
+    One entry in the change feed readers pull from.
+    
+    The primary key is the sequence number. Only the identity of what
+    changed is stored; readers receive its state as of the pull.
+    """
+    ENTITY_TYPES = [
+        ('service', 'Service'),
+        ('room', 'Room'),
+    ]
+    
+    entity_type = models.CharField(max_length=20, choices=ENTITY_TYPES)
+    entity_key = models.CharField(max_length=50, help_text='Service id or room number')
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    class Meta:
+        ordering = ['id']
+    
+    def __str__(self):
+        return f"#{self.id} {self.entity_type} {self.entity_key}"
+
+
+class SyncWatermark(models.Model):
+    """
+    Single row recording how far the change feed has been pruned.
+    """
+    pruned_through = models.BigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"Pruned through #{self.pruned_through}"
+
+
+class OfflineTap(models.Model):
+    """
+    A tap captured by a reader while offline and uploaded later.
+    
+    The reader-generated tap_id makes uploads safe to retry.
+    """
+    STATUS_CHOICES = [
+        ('applied', 'Applied'),
+        ('rejected', 'Rejected'),
+    ]
+    
+    tap_id = models.CharField(max_length=100, unique=True)
+    device_id = models.CharField(max_length=100, blank=True)
+    room_number = models.CharField(max_length=20)
+    payload = models.JSONField(default=dict, help_text='Tap as uploaded by the reader')
+    captured_at = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    charge = models.ForeignKey(
+        Charge,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='offline_taps'
+    )
+    error = models.CharField(max_length=200, blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-received_at']
+        indexes = [
+            models.Index(fields=['status', '-received_at']),
+        ]
+    
+    def __str__(self):
+        return f"Tap {self.tap_id} room {self.room_number} ({self.status})"
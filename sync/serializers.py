@@ -0,0 +1,34 @@
+"""
+DRF serializers for reader sync.
+"""
+from django.conf import settings
+from rest_framework import serializers
+
+
+class OfflineTapSerializer(serializers.Serializer):
+    """A single tap captured offline."""
+    tap_id = serializers.CharField(max_length=100)
+    room_number = serializers.CharField(max_length=20)
+    service_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(default=1, min_value=1)
+    extras = serializers.JSONField(required=False, allow_null=True)
+    description = serializers.CharField(required=False, allow_blank=True, max_length=500)
+    captured_at = serializers.DateTimeField()
+
+
+class TapUploadSerializer(serializers.Serializer):
+    """
+    A batch of offline taps from one reader.
+    
+    Taps are validated one by one in the view so a malformed tap can't hold
+    up the rest of the reader's queue.
+    """
+    device_id = serializers.CharField(max_length=100, required=False, allow_blank=True)
+    taps = serializers.ListField(child=serializers.DictField())
+    
+    def validate_taps(self, value):
+        if len(value) > settings.SYNC_MAX_TAPS:
+            raise serializers.ValidationError(
+                f'At most {settings.SYNC_MAX_TAPS} taps per upload.'
+            )
+        return value
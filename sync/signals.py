@@ -0,0 +1,69 @@
+"""
+Signal handlers feeding the reader change log.
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from billing.models import Guest, Folio
+from services.models import Service, PricingRule
+from .feed import record_change
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def service_changed(sender, instance, **kwargs):
+    record_change('service', instance.pk)
+
+
+@receiver(post_save, sender=PricingRule)
+@receiver(post_delete, sender=PricingRule)
+def pricing_rule_changed(sender, instance, **kwargs):
+    # Rules travel nested in their service's payload
+    record_change('service', instance.service_id)
+
+
+@receiver(pre_save, sender=Guest)
+def remember_guest_room(sender, instance, **kwargs):
+    """Note the stored room so a room move updates both rooms."""
+    if instance._state.adding or getattr(instance, '_loaded_room_number', None) is not None:
+        return
+    # Not loaded with the instance (deferred, or built from a pk)
+    if instance.pk:
+        instance._loaded_room_number = Guest.objects.filter(
+            pk=instance.pk
+        ).values_list('room_number', flat=True).first()
+
+
+@receiver(post_save, sender=Guest)
+@receiver(post_delete, sender=Guest)
+def guest_changed(sender, instance, **kwargs):
+    record_change('room', instance.room_number)
+    old_room = getattr(instance, '_loaded_room_number', None)
+    if old_room and old_room != instance.room_number:
+        record_change('room', old_room)
+    instance._loaded_room_number = instance.room_number
+
+
+@receiver(pre_save, sender=Folio)
+def remember_folio_status(sender, instance, **kwargs):
+    """Flag folio creation and status changes; total updates don't move rooms."""
+    loaded = getattr(instance, '_audit_loaded', None)
+    instance._sync_room_changed = (
+        instance._state.adding
+        or loaded is None
+        or loaded.get('status') != instance.status
+    )
+
+
+@receiver(post_save, sender=Folio)
+def folio_changed(sender, instance, **kwargs):
+    if getattr(instance, '_sync_room_changed', False):
+        record_change('room', instance.guest.room_number)
+
+
+@receiver(post_delete, sender=Folio)
+def folio_deleted(sender, instance, **kwargs):
+    try:
+        record_change('room', instance.guest.room_number)
+    except Guest.DoesNotExist:
+        # Deleted along with its guest, which records the room itself
+        pass
@@ -0,0 +1,117 @@
+"""
+Reconciliation of taps captured by readers while offline.
+"""
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from billing.models import Guest, Folio, Charge
+from services.models import Service
+from .models import OfflineTap
+
+
+def _result(tap, duplicate=False):
+    return {
+        'tap_id': tap.tap_id,
+        'status': tap.status,
+        'charge_id': tap.charge_id,
+        'error': tap.error,
+        'duplicate': duplicate,
+    }
+
+
+def _guest_at(room_number, captured_at):
+    """The guest occupying a room when the tap happened, even if checked out since."""
+    return Guest.objects.filter(
+        room_number=room_number,
+        check_in__lte=captured_at
+    ).filter(
+        Q(check_out__isnull=True) | Q(check_out__gte=captured_at)
+    ).order_by('-check_in').first()
+
+
+def _charge_tap(data):
+    """
+    Post one tap as a charge.
+    
+    Returns:
+        tuple: (charge or None, error message)
+    """
+    guest = _guest_at(data['room_number'], data['captured_at'])
+    if guest is None:
+        return None, 'No guest occupied the room at the time of the tap.'
+
+    folio, _ = Folio.objects.get_or_create(guest=guest, defaults={'status': 'open'})
+    existing = Charge.objects.filter(folio=folio, idempotency_key=data['tap_id']).first()
+    if existing:
+        # Posted online before the reader lost its confirmation
+        return existing, ''
+    if folio.status != 'open':
+        return None, f'Folio is {folio.status}.'
+
+    service = Service.objects.filter(id=data['service_id'], is_active=True).first()
+    if service is None:
+        return None, 'Service not found or inactive.'
+
+    try:
+        charge = folio.add_charge(
+            service=service,
+            quantity=data.get('quantity', 1),
+            extras=data.get('extras'),
+            description=data.get('description', ''),
+            idempotency_key=data['tap_id'],
+            context={'time': data['captured_at']}
+        )
+    except ValidationError as e:
+        return None, '; '.join(e.messages)[:200]
+    return charge, ''
+
+
+def apply_offline_tap(data, device_id=''):
+    """
+    Apply an uploaded tap exactly once.
+    
+    Taps are priced as of when they were captured. Taps that can no longer
+    be charged are kept as rejected for the front desk to review.
+    
+    Args:
+        data: Validated OfflineTapSerializer data
+        device_id: Uploading reader
+    
+    Returns:
+        dict: tap_id, status, charge_id, error and whether it was a duplicate.
+        A tap that hit any other constraint comes back as a conflict and is
+        not recorded, so the reader can upload it again.
+    """
+    existing = OfflineTap.objects.filter(tap_id=data['tap_id']).first()
+    if existing:
+        return _result(existing, duplicate=True)
+
+    try:
+        with transaction.atomic():
+            charge, error = _charge_tap(data)
+            tap = OfflineTap.objects.create(
+                tap_id=data['tap_id'],
+                device_id=device_id,
+                room_number=data['room_number'],
+                payload={
+                    key: value.isoformat() if key == 'captured_at' else value
+                    for key, value in data.items()
+                },
+                captured_at=data['captured_at'],
+                status='applied' if charge else 'rejected',
+                charge=charge,
+                error=error
+            )
+    except IntegrityError as e:
+        # The same tap arrived concurrently from a retry
+        existing = OfflineTap.objects.filter(tap_id=data['tap_id']).first()
+        if existing:
+            return _result(existing, duplicate=True)
+        return {
+            'tap_id': data['tap_id'],
+            'status': 'conflict',
+            'charge_id': None,
+            'error': str(e)[:200],
+            'duplicate': False,
+        }
+    return _result(tap)
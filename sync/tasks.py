@@ -0,0 +1,11 @@
+"""
+Celery tasks for the sync module.
+"""
+from sysnyx.celery import app
+from .feed import prune_changes
+
+
+@app.task
+def prune_sync_changes():
+    """Daily pruning of the reader change feed."""
+    return prune_changes()
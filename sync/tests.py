@@ -0,0 +1,264 @@
+"""
+Test suite for sync module.
+"""
+import pytest
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from billing.models import Guest, Folio, Charge
+from services.models import Service, PricingRule
+from sysnyx.testing import assert_constant_queries, locmem_cache  # noqa: F401
+from .feed import changes_since, current_seq, prune_changes
+from .models import SyncChange, OfflineTap
+
+
+
+@pytest.mark.django_db
+class TestChangeFeed:
+    """Tests for the collapsed change feed."""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self, settings, django_capture_on_commit_callbacks):
+        settings.SYNC_SETTLE_SECONDS = 0
+        # Changes are recorded once the write commits
+        self.committed = lambda: django_capture_on_commit_callbacks(execute=True)
+        with self.committed():
+            self.service = Service.objects.create(
+                name='Pool Bar',
+                service_type='variable',
+                base_price=Decimal('0.00')
+            )
+            self.guest = Guest.objects.create(name='Feed Guest', room_number='501', check_in=timezone.now())
+    
+    def test_edits_collapse_to_current_state(self):
+        """Test many writes to one service return one upsert."""
+        since = current_seq()
+        with self.committed():
+            self.service.name = 'Pool Bar & Grill'
+            self.service.save()
+            PricingRule.objects.create(service=self.service, name='VAT', rule_type='tax', value=Decimal('16.00'))
+        
+        changes = changes_since(since)
+        assert [s['name'] for s in changes['services']['upserts']] == ['Pool Bar & Grill']
+        assert changes['services']['upserts'][0]['pricing_rules'][0]['name'] == 'VAT'
+        assert changes['seq'] == current_seq()
+        assert changes_since(changes['seq'])['services']['upserts'] == []
+    
+    def test_changes_wait_for_commit(self):
+        """Test a change gets its sequence number only when its write commits."""
+        since = current_seq()
+        with self.committed():
+            self.service.save()
+            assert current_seq() == since
+        assert current_seq() > since
+    
+    def test_room_mapping_follows_folio_and_checkout(self):
+        """Test folio creation maps the room and checkout removes it."""
+        since = current_seq()
+        with self.committed():
+            folio = Folio.objects.create(guest=self.guest)
+        rooms = changes_since(since)['rooms']
+        assert rooms['upserts'][0]['folio_id'] == folio.id
+        
+        # Total updates alone don't touch the feed
+        since = current_seq()
+        with self.committed():
+            folio.recalculate_totals()
+        assert current_seq() == since
+        
+        with self.committed():
+            self.guest.is_active = False
+            self.guest.save()
+        assert changes_since(since)['rooms']['deletes'] == ['501']
+    
+    def test_room_move_updates_both_rooms_without_select(self):
+        """Test the old room of a loaded guest comes from the instance, not a query."""
+        guest = Guest.objects.get(pk=self.guest.pk)
+        guest.room_number = '502'
+        since = current_seq()
+        with self.committed():
+            with CaptureQueriesContext(connection) as queries:
+                guest.save()
+        
+        assert not [q for q in queries.captured_queries if q['sql'].upper().startswith('SELECT')]
+        rooms = changes_since(since)['rooms']
+        assert [room['room_number'] for room in rooms['upserts']] == ['502']
+        assert rooms['deletes'] == ['501']
+    
+    def test_deleted_service_and_pagination(self):
+        """Test deletions and has_more paging."""
+        since = current_seq()
+        with self.committed():
+            other = Service.objects.create(name='Spa', service_type='fixed', base_price=Decimal('50.00'))
+            other_id = other.id
+            other.delete()
+        
+        first = changes_since(since, limit=1)
+        assert first['has_more'] is True
+        second = changes_since(first['seq'], limit=10)
+        assert second['services']['deletes'] == [other_id]
+    
+    def test_settle_window_holds_back_recent_changes(self, settings):
+        """Test changes younger than the settle window are not returned yet."""
+        settings.SYNC_SETTLE_SECONDS = 60
+        since = current_seq()
+        with self.committed():
+            self.service.save()
+        assert current_seq() > since
+        assert changes_since(since)['seq'] == since
+    
+    def test_pruned_range_is_gone(self):
+        """Test readers behind the pruned range must resync."""
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_user(username='reader', password='pass'))
+        SyncChange.objects.update(created_at=timezone.now() - timedelta(days=30))
+        assert prune_changes(days=7) > 0
+        
+        response = client.get('/api/sync/changes/?since=0')
+        assert response.status_code == 410
+        assert response.json()['resync'] is True
+        
+        snapshot = client.get('/api/sync/snapshot/').json()
+        assert client.get(f"/api/sync/changes/?since={snapshot['seq']}").status_code == 200
+        assert snapshot['rooms'][0]['room_number'] == '501'
+
+
+@pytest.mark.django_db
+class TestOfflineTaps:
+    """Tests for offline tap upload and reconciliation."""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.service = Service.objects.create(
+            name='Valet',
+            service_type='per_unit',
+            base_price=Decimal('5.00')
+        )
+        PricingRule.objects.create(
+            service=self.service,
+            name='Night Surcharge',
+            rule_type='surcharge',
+            value=Decimal('20.00'),
+            conditions={'peak_hours': '22:00-23:59'}
+        )
+        self.guest = Guest.objects.create(
+            name='Offline Guest',
+            room_number='502',
+            check_in=timezone.now() - timedelta(days=2)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_user(username='reader', password='pass'))
+    
+    def _upload(self, *taps):
+        return self.client.post(
+            '/api/sync/taps/',
+            {'device_id': 'reader-1', 'taps': list(taps)},
+            format='json'
+        )
+    
+    def _tap(self, tap_id, captured_at, room='502'):
+        return {
+            'tap_id': tap_id,
+            'room_number': room,
+            'service_id': self.service.id,
+            'quantity': 2,
+            'captured_at': captured_at.isoformat(),
+        }
+    
+    def test_taps_apply_once_and_price_at_capture_time(self):
+        """Test retries are idempotent and pricing uses the tap time."""
+        night = (timezone.now() - timedelta(days=1)).replace(hour=22, minute=30)
+        first = self._upload(self._tap('tap-1', night), {'tap_id': 'bad'})
+        retry = self._upload(self._tap('tap-1', night))
+        
+        results = first.json()['results']
+        assert results[0]['status'] == 'applied'
+        assert results[1]['status'] == 'invalid'
+        assert retry.json()['results'][0]['duplicate'] is True
+        assert Charge.objects.get().final_amount == Decimal('12.00')
+    
+    def test_checked_out_guest_is_rejected_for_review(self):
+        """Test a tap on a settled folio is kept as rejected."""
+        captured = timezone.now() - timedelta(hours=3)
+        folio = Folio.objects.create(guest=self.guest)
+        self.guest.check_out = timezone.now() - timedelta(hours=1)
+        self.guest.is_active = False
+        self.guest.save()
+        folio.status = 'settled'
+        folio.save()
+        
+        result = self._upload(self._tap('tap-2', captured)).json()['results'][0]
+        assert result['status'] == 'rejected'
+        assert 'settled' in result['error']
+        assert OfflineTap.objects.get(tap_id='tap-2').status == 'rejected'
+    
+    def test_tap_already_posted_online_is_linked(self):
+        """Test a tap whose online post succeeded is matched to its charge."""
+        folio = Folio.objects.create(guest=self.guest)
+        charge = folio.add_charge(service=self.service, idempotency_key='tap-3')
+        
+        result = self._upload(self._tap('tap-3', timezone.now())).json()['results'][0]
+        assert result['status'] == 'applied'
+        assert result['charge_id'] == charge.id
+        assert Charge.objects.count() == 1
+    
+    def test_inactive_service_is_rejected(self):
+        """Test offline taps honour the same active check as online taps."""
+        self.service.is_active = False
+        self.service.save()
+        
+        result = self._upload(self._tap('tap-4', timezone.now())).json()['results'][0]
+        assert result['status'] == 'rejected'
+        assert 'inactive' in result['error']
+        assert not Charge.objects.exists()
+    
+    def test_other_integrity_errors_are_conflicts(self, monkeypatch):
+        """Test a constraint failure not caused by a duplicate tap is reported, not a 500."""
+        def violate(data):
+            raise IntegrityError('FOREIGN KEY constraint failed')
+        monkeypatch.setattr('sync.taps._charge_tap', violate)
+        
+        response = self._upload(self._tap('tap-5', timezone.now()))
+        assert response.status_code == 200
+        result = response.json()['results'][0]
+        assert result['status'] == 'conflict'
+        assert result['duplicate'] is False
+        assert not OfflineTap.objects.filter(tap_id='tap-5').exists()
+
+
+@pytest.mark.django_db
+class TestQueryBudgets:
+    """Performance contracts: reader sync costs the same queries at any data size."""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        settings.SYNC_SETTLE_SECONDS = 0
+        Service.objects.create(name='Valet', service_type='fixed', base_price=Decimal('5.00'))
+        user = User.objects.create_user(username='budget-reader', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(user=user)
+    
+    def grow_rooms(self, size):
+        existing = Guest.objects.count()
+        guests = Guest.objects.bulk_create([
+            Guest(name=f'Guest {i}', room_number=f'R{i:05d}', check_in=timezone.now())
+            for i in range(existing, size)
+        ])
+        Folio.objects.bulk_create([Folio(guest=guest) for guest in guests])
+        SyncChange.objects.bulk_create([
+            SyncChange(entity_type='room', entity_key=guest.room_number) for guest in guests
+        ])
+    
+    def test_snapshot(self):
+        """Test a snapshot costs the same with 1 or 10,000 occupied rooms."""
+        results = assert_constant_queries(self.grow_rooms, lambda: self.client.get('/api/sync/snapshot/'))
+        assert len(results[10000].json()['rooms']) == 10000
+    
+    def test_changes(self):
+        """Test a page of changes costs the same however many are pending."""
+        results = assert_constant_queries(self.grow_rooms, lambda: self.client.get('/api/sync/changes/?since=0'))
+        assert results[10000].json()['has_more'] is True
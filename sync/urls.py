@@ -0,0 +1,11 @@
+"""
+URL routing for sync module.
+"""
+from django.urls import path
+from .views import sync_snapshot, sync_changes, upload_taps
+
+urlpatterns = [
+    path('snapshot/', sync_snapshot, name='sync-snapshot'),
+    path('changes/', sync_changes, name='sync-changes'),
+    path('taps/', upload_taps, name='sync-taps'),
+]
@@ -0,0 +1,103 @@
+"""
+API views for reader sync.
+"""
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from sysnyx.throttling import DeviceTokenBucketThrottle
+from .feed import ChangesPruned, changes_since, snapshot
+from .serializers import OfflineTapSerializer, TapUploadSerializer
+from .taps import apply_offline_tap
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sync_snapshot(request):
+    """
+    Full catalog and room occupancy for a reader starting from scratch.
+    
+    GET /api/sync/snapshot/
+    
+    Returns: {"seq": 1042, "services": [...], "rooms": [...]}
+    """
+    return Response(snapshot())
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sync_changes(request):
+    """
+    Changes since the reader's last applied sequence number.
+    
+    GET /api/sync/changes/?since=1042
+    
+    Returns: {
+        "since": 1042,
+        "seq": 1050,
+        "has_more": false,
+        "services": {"upserts": [...], "deletes": [7]},
+        "rooms": {"upserts": [...], "deletes": ["204"]}
+    }
+    
+    Responds 410 when the range has been pruned; the reader must take a
+    new snapshot.
+    """
+    try:
+        since = int(request.query_params.get('since', ''))
+        if since < 0:
+            raise ValueError
+    except ValueError:
+        return Response(
+            {'error': 'since must be a non-negative sequence number.'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    
+    try:
+        return Response(changes_since(since))
+    except ChangesPruned as e:
+        return Response(
+            {'error': str(e), 'resync': True, 'pruned_through': e.pruned_through},
+            status=status.HTTP_410_GONE
+        )
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([DeviceTokenBucketThrottle])
+def upload_taps(request):
+    """
+    Upload taps captured while offline.
+    
+    POST /api/sync/taps/
+    Body: {
+        "device_id": "reader-pool-bar",
+        "taps": [{
+            "tap_id": "uuid",
+            "room_number": "101",
+            "service_id": 1,
+            "quantity": 2,
+            "captured_at": "2026-01-01T18:30:00Z"
+        }]
+    }
+    
+    Every tap gets a result; retrying an upload is safe.
+    """
+    serializer = TapUploadSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    
+    device_id = serializer.validated_data.get('device_id', '')
+    results = []
+    for raw in serializer.validated_data['taps']:
+        tap = OfflineTapSerializer(data=raw)
+        if not tap.is_valid():
+            results.append({
+                'tap_id': raw.get('tap_id'),
+                'status': 'invalid',
+                'errors': tap.errors,
+            })
+            continue
+        results.append(apply_offline_tap(tap.validated_data, device_id))
+    
+    return Response({'results': results}, status=status.HTTP_200_OK)
@@ -1,7 +1,13 @@
 from __future__ import absolute_import, unicode_literals
 
-# This will make sure the app is always imported when
-# Django starts so that shared_task will use this app.
-from .celery import app as celery_app
-
 __all__ = ('celery_app',)
+
+
+def __getattr__(name):
+    # Celery costs ~100ms to import, which every manage.py command would pay
+    # if the app were created here. Task modules import sysnyx.celery
+    # themselves, so the app exists wherever tasks are sent or run.
+    if name == 'celery_app':
+        from .celery import app
+        return app
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -1,5 +1,8 @@
 """
 ASGI config for sysnyx project.
+
+Serve with an ASGI server (e.g. ``uvicorn sysnyx.asgi:application``) for the
+folio event streams; under WSGI they answer 501.
 """
 
 import os
@@ -0,0 +1,154 @@
+"""
+Token authentication with cached token -> user lookups.
+
+DRF's TokenAuthentication joins Token and User on every request. Here a
+bounded, short-lived LRU in each process sits in front of the shared Django
+cache, which sits in front of the database. Each request gets its own copy
+of the cached user, so per-request state (permission caches, attributes set
+by views) never leaks between requests or threads.
+
+Deleting a token, saving its user or changing the user's groups or
+permissions evicts the shared entry and this process's copy; other
+processes keep serving theirs for up to AUTH_TOKEN_LOCAL_TTL seconds.
+Writes that send no signals, such as ``User.objects.filter(...).update()``,
+evict nothing: call ``invalidate_users`` after them, or the old user is
+served for up to AUTH_TOKEN_CACHE_TTL seconds.
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+class LocalTokenCache:
+    """Thread-safe LRU of token key -> user with a per-entry TTL."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            user, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return user
+
+    def set(self, key, user):
+        with self._lock:
+            self._entries[key] = (user, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_local = None
+_local_lock = threading.Lock()
+
+
+def local_cache():
+    """The process-wide LocalTokenCache, sized from settings on first use."""
+    global _local
+    if _local is None:
+        with _local_lock:
+            if _local is None:
+                _local = LocalTokenCache(settings.AUTH_TOKEN_CACHE_SIZE, settings.AUTH_TOKEN_LOCAL_TTL)
+    return _local
+
+
+def _cache_key(key):
+    # Raw tokens never leave the process as cache keys
+    return 'auth:token:' + hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def lookup_token_user(key):
+    """
+    User owning a token key, or None if the token does not exist.
+    
+    Inactive users are returned too; callers decide how to refuse them.
+    """
+    local = local_cache()
+    user = local.get(key)
+    if user is not None:
+        return copy.copy(user)
+    user = cache.get(_cache_key(key))
+    if user is None:
+        token = Token.objects.select_related('user').filter(key=key).first()
+        if token is None:
+            return None
+        user = token.user
+        cache.set(_cache_key(key), user, settings.AUTH_TOKEN_CACHE_TTL)
+    local.set(key, user)
+    return copy.copy(user)
+
+
+async def alookup_token_user(key):
+    """Async variant of lookup_token_user for async views."""
+    local = local_cache()
+    user = local.get(key)
+    if user is not None:
+        return copy.copy(user)
+    user = await cache.aget(_cache_key(key))
+    if user is None:
+        token = await Token.objects.select_related('user').filter(key=key).afirst()
+        if token is None:
+            return None
+        user = token.user
+        await cache.aset(_cache_key(key), user, settings.AUTH_TOKEN_CACHE_TTL)
+    local.set(key, user)
+    return copy.copy(user)
+
+
+def invalidate_token(key):
+    """Evict a token from the shared cache and this process's LRU."""
+    local_cache().discard(key)
+    cache.delete(_cache_key(key))
+
+
+def invalidate_user(user):
+    """Evict every token belonging to a user."""
+    invalidate_users([user.pk])
+
+
+def invalidate_users(user_ids):
+    """Evict every token belonging to the given user ids."""
+    for key in Token.objects.filter(user_id__in=user_ids).values_list('key', flat=True):
+        invalidate_token(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in replacement for TokenAuthentication backed by the token caches.
+    
+    ``request.auth`` is an unsaved Token carrying the key and user.
+    """
+
+    def authenticate_credentials(self, key):
+        user = lookup_token_user(key)
+        if user is None:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return (user, Token(key=key, user=user))
@@ -0,0 +1,45 @@
+"""
+Baseline files shared by the benchmark commands.
+
+A baseline is the JSON results of one run, with a ``cases`` dict whose
+entries carry a ``relative`` cost (time over a calibration measured in the
+same run). Comparing relative costs keeps a baseline recorded on one
+machine usable on another.
+
+This module imports nothing from the apps, so ``bench_startup`` can use
+it without loading the code it is timing.
+"""
+import json
+from pathlib import Path
+
+
+def load_baseline(path):
+    """Read a baseline, or return None when there isn't one yet."""
+    path = Path(path)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def save_baseline(results, path):
+    Path(path).write_text(json.dumps(results, indent=2, sort_keys=True) + '\n')
+
+
+def find_regressions(results, baseline, tolerance):
+    """
+    Cases whose relative cost grew by more than ``tolerance``.
+
+    Cases missing from the baseline are not compared.
+
+    Returns:
+        list: (name, baseline relative, current relative, fractional change)
+    """
+    regressions = []
+    for name, current in results['cases'].items():
+        previous = baseline['cases'].get(name)
+        if previous is None:
+            continue
+        change = current['relative'] / previous['relative'] - 1
+        if change > tolerance:
+            regressions.append((name, previous['relative'], current['relative'], change))
+    return regressions
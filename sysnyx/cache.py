@@ -0,0 +1,425 @@
+"""
+Two-tier cache: a bounded in-process LRU in front of Redis.
+
+Keys starting with one of the ``LOCAL_PREFIXES`` option are also kept in
+process memory for up to ``LOCAL_TIMEOUT`` seconds, so hot reads such as
+the catalog version skip the network. Every write or delete of such a key
+is published on a Redis channel and a listener thread in each process
+drops its copy; the local timeout bounds staleness if a message is lost.
+All other keys behave exactly as with Django's RedisCache.
+
+When Redis stops answering the cache degrades instead of raising: for
+``RETRY_INTERVAL`` seconds at a time every operation is served from
+process memory, so callers keep working with a cold, per-process cache
+until Redis is back. The local tier is dropped on recovery, as it may
+hold values Redis never saw.
+
+Django builds one cache backend per thread; the local tier and the
+degraded state are shared by all of them in a process.
+"""
+import logging
+import os
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.redis import RedisCache
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+from .metrics import InstrumentedRedisCache, get_registry
+
+
+logger = logging.getLogger(__name__)
+
+REDIS_ERRORS = (RedisConnectionError, RedisTimeoutError)
+
+_MISSING = object()
+# Returned by TwoTierCache._remote when Redis is unavailable
+_DOWN = object()
+
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+class LocalLRU:
+    """
+    Thread-safe bounded LRU with per-entry expiry.
+
+    Values are pickled, as in LocMemCache, so callers mutating what they
+    got back can't change what the next caller gets.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def _live(self, key):
+        # Caller holds the lock
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key, value, ttl):
+        # Caller holds the lock
+        expires = None if ttl is None else time.monotonic() + ttl
+        self._entries[key] = (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self._live(key)
+        if entry is None:
+            return default
+        return pickle.loads(entry[0])
+
+    def set(self, key, value, ttl):
+        """Store ``value`` for ``ttl`` seconds (None keeps it until evicted)."""
+        if ttl is not None and ttl <= 0:
+            self.delete(key)
+            return
+        with self.lock:
+            self._store(key, value, ttl)
+
+    def add(self, key, value, ttl):
+        with self.lock:
+            if self._live(key) is not None:
+                return False
+            if ttl is None or ttl > 0:
+                self._store(key, value, ttl)
+            return True
+
+    def incr(self, key, delta):
+        with self.lock:
+            entry = self._live(key)
+            if entry is None:
+                raise ValueError(f"Key '{key}' not found.")
+            value = pickle.loads(entry[0]) + delta
+            self._entries[key] = (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), entry[1])
+            return value
+
+    def touch(self, key, ttl):
+        with self.lock:
+            entry = self._live(key)
+            if entry is None:
+                return False
+            self._store(key, pickle.loads(entry[0]), ttl)
+            return True
+
+    def has(self, key):
+        with self.lock:
+            return self._live(key) is not None
+
+    def delete(self, key):
+        with self.lock:
+            return self._entries.pop(key, None) is not None
+
+    def clear(self):
+        with self.lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class LocalTier:
+    """A process's local entries and Redis health for one cache location."""
+
+    def __init__(self, max_entries):
+        self.store = LocalLRU(max_entries)
+        self.lock = threading.Lock()
+        self.pid = None
+        self.origin = None
+        self.down_until = 0.0
+        self.degraded = False
+
+
+def _tier_for(key, max_entries):
+    with _tiers_lock:
+        tier = _tiers.get(key)
+        if tier is None:
+            tier = _tiers[key] = LocalTier(max_entries)
+        return tier
+
+
+class TwoTierCache(RedisCache):
+    """
+    RedisCache with a local LRU for selected keys and a local-only fallback.
+
+    Extra OPTIONS, removed before the rest reach the redis client:
+
+        LOCAL_PREFIXES: Raw key prefixes also cached in process (default none)
+        LOCAL_TIMEOUT: Seconds a local entry may be served (default 10)
+        LOCAL_MAX_ENTRIES: Local entries kept per process (default 10000)
+        RETRY_INTERVAL: Seconds between attempts to reach Redis while it is down (default 5)
+        INVALIDATION_CHANNEL: Pub/sub channel for invalidations
+    """
+
+    def __init__(self, server, params):
+        params = dict(params)
+        options = dict(params.get('OPTIONS') or {})
+        self.local_prefixes = tuple(options.pop('LOCAL_PREFIXES', ()))
+        self.local_timeout = options.pop('LOCAL_TIMEOUT', 10)
+        max_entries = options.pop('LOCAL_MAX_ENTRIES', 10000)
+        self.retry_interval = options.pop('RETRY_INTERVAL', 5)
+        self.channel = options.pop('INVALIDATION_CHANNEL', 'sysnyx:cache:invalidate')
+        params['OPTIONS'] = options
+        super().__init__(server, params)
+        self._tier = _tier_for((str(server), self.channel), max_entries)
+
+    def _is_local(self, key):
+        return bool(self.local_prefixes) and key.startswith(self.local_prefixes)
+
+    # Redis health
+
+    def _remote(self, method, *args):
+        """Call ``method`` on Redis, or return _DOWN if it is unavailable."""
+        tier = self._tier
+        if tier.down_until > time.monotonic():
+            get_registry().inc('sysnyx_cache_fallbacks_total', ())
+            return _DOWN
+        try:
+            result = method(*args)
+        except REDIS_ERRORS as exc:
+            self._went_down(exc)
+            get_registry().inc('sysnyx_cache_fallbacks_total', ())
+            return _DOWN
+        if tier.degraded:
+            self._recovered()
+        return result
+
+    def _went_down(self, exc):
+        tier = self._tier
+        with tier.lock:
+            tier.down_until = time.monotonic() + self.retry_interval
+            if tier.degraded:
+                return
+            tier.degraded = True
+        logger.warning('Redis cache unavailable (%s); serving from process memory', exc)
+
+    def _recovered(self):
+        tier = self._tier
+        with tier.lock:
+            if not tier.degraded:
+                return
+            tier.degraded = False
+            tier.store.clear()
+        logger.info('Redis cache reachable again; local-only entries dropped')
+
+    @property
+    def degraded(self):
+        """True while operations are served from process memory only."""
+        return self._tier.degraded
+
+    # Local tier and invalidation
+
+    def _local_ttl(self, timeout):
+        ttl = self.get_backend_timeout(timeout)
+        if self._tier.degraded:
+            # The local copy is the only one
+            return ttl
+        return self.local_timeout if ttl is None else min(ttl, self.local_timeout)
+
+    def _keep(self, made_key, value, timeout=DEFAULT_TIMEOUT):
+        self._ensure_listener()
+        self._tier.store.set(made_key, value, self._local_ttl(timeout))
+
+    def _publish(self, made_key):
+        self._ensure_listener()
+        message = f'{self._tier.origin}|{made_key}'
+        self._remote(lambda: self._cache.get_client(write=True).publish(self.channel, message))
+
+    def _ensure_listener(self):
+        tier = self._tier
+        pid = os.getpid()
+        if tier.pid == pid:
+            return
+        with tier.lock:
+            if tier.pid == pid:
+                return
+            # Entries inherited across a fork were never watched in this process
+            tier.store.clear()
+            tier.pid = pid
+            tier.origin = f'{uuid.uuid4().hex}-{pid}'
+        threading.Thread(target=self._listen, name='cache-invalidation', daemon=True).start()
+
+    def _listen(self):
+        tier = self._tier
+        while tier.pid == os.getpid():
+            pubsub = None
+            try:
+                pubsub = self._cache.get_client(write=True).pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # Anything published while unsubscribed was missed
+                tier.store.clear()
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        self.invalidated(message['data'])
+            except REDIS_ERRORS:
+                time.sleep(self.retry_interval)
+            except Exception:
+                logger.exception('Cache invalidation listener failed')
+                time.sleep(self.retry_interval)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    def invalidated(self, data):
+        """Apply an invalidation message from another process."""
+        if isinstance(data, bytes):
+            data = data.decode()
+        origin, _, made_key = data.partition('|')
+        tier = self._tier
+        if origin == tier.origin:
+            return
+        if made_key == '*':
+            tier.store.clear()
+        else:
+            tier.store.delete(made_key)
+
+    # Cache API
+
+    def get(self, key, default=None, version=None):
+        store = self._tier.store
+        made_key = self.make_and_validate_key(key, version=version)
+        local = self._is_local(key)
+        if local:
+            value = store.get(made_key, _MISSING)
+            if value is not _MISSING:
+                return value
+        value = self._remote(super().get, key, _MISSING, version)
+        if value is _DOWN:
+            return default if local else store.get(made_key, default)
+        if value is _MISSING:
+            return default
+        if local:
+            self._keep(made_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        store = self._tier.store
+        made_keys = {key: self.make_and_validate_key(key, version=version) for key in keys}
+        found, pending = {}, []
+        for key, made_key in made_keys.items():
+            value = store.get(made_key, _MISSING) if self._is_local(key) else _MISSING
+            if value is _MISSING:
+                pending.append(key)
+            else:
+                found[key] = value
+        if not pending:
+            return found
+        fetched = self._remote(super().get_many, pending, version)
+        if fetched is _DOWN:
+            for key in pending:
+                value = store.get(made_keys[key], _MISSING)
+                if value is not _MISSING:
+                    found[key] = value
+            return found
+        for key, value in fetched.items():
+            if self._is_local(key):
+                self._keep(made_keys[key], value)
+        found.update(fetched)
+        return found
+
+    def has_key(self, key, version=None):
+        store = self._tier.store
+        made_key = self.make_and_validate_key(key, version=version)
+        if self._is_local(key) and store.has(made_key):
+            return True
+        result = self._remote(super().has_key, key, version)
+        return store.has(made_key) if result is _DOWN else result
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        made_key = self.make_and_validate_key(key, version=version)
+        if self._remote(super().set, key, value, timeout, version) is _DOWN:
+            self._tier.store.set(made_key, value, self._local_ttl(timeout))
+        elif self._is_local(key):
+            self._keep(made_key, value, timeout)
+            self._publish(made_key)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        made_key = self.make_and_validate_key(key, version=version)
+        added = self._remote(super().add, key, value, timeout, version)
+        if added is _DOWN:
+            return self._tier.store.add(made_key, value, self._local_ttl(timeout))
+        if added and self._is_local(key):
+            self._tier.store.delete(made_key)
+            self._publish(made_key)
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        made_key = self.make_and_validate_key(key, version=version)
+        value = self._remote(super().incr, key, delta, version)
+        if value is _DOWN:
+            return self._tier.store.incr(made_key, delta)
+        if self._is_local(key):
+            self._tier.store.delete(made_key)
+            self._publish(made_key)
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        made_key = self.make_and_validate_key(key, version=version)
+        touched = self._remote(super().touch, key, timeout, version)
+        if touched is _DOWN:
+            return self._tier.store.touch(made_key, self._local_ttl(timeout))
+        return touched
+
+    def delete(self, key, version=None):
+        made_key = self.make_and_validate_key(key, version=version)
+        deleted_locally = self._tier.store.delete(made_key)
+        deleted = self._remote(super().delete, key, version)
+        if deleted is _DOWN:
+            return deleted_locally
+        if self._is_local(key):
+            self._publish(made_key)
+        return deleted
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        if not data:
+            return []
+        if self._remote(super().set_many, data, timeout, version) is _DOWN:
+            for key, value in data.items():
+                self._tier.store.set(self.make_and_validate_key(key, version=version), value, self._local_ttl(timeout))
+            return []
+        for key, value in data.items():
+            if self._is_local(key):
+                made_key = self.make_and_validate_key(key, version=version)
+                self._keep(made_key, value, timeout)
+                self._publish(made_key)
+        return []
+
+    def delete_many(self, keys, version=None):
+        if not keys:
+            return
+        made_keys = {key: self.make_and_validate_key(key, version=version) for key in keys}
+        for made_key in made_keys.values():
+            self._tier.store.delete(made_key)
+        if self._remote(super().delete_many, keys, version) is _DOWN:
+            return
+        for key, made_key in made_keys.items():
+            if self._is_local(key):
+                self._publish(made_key)
+
+    def clear(self):
+        self._tier.store.clear()
+        cleared = self._remote(super().clear)
+        if cleared is _DOWN:
+            return True
+        self._publish('*')
+        return cleared
+
+
+class InstrumentedTwoTierCache(InstrumentedRedisCache, TwoTierCache):
+    """TwoTierCache counting hits and misses (local hits included) for MetricsMiddleware."""
@@ -6,6 +6,10 @@ import os
 from celery import Celery
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sysnyx.settings')
+# Celery runs Django's system checks on every worker boot, which imports every
+# URLconf and view (and DRF with them) in a process that serves no requests.
+# Deploys already run them; set CELERY_SKIP_CHECKS= (empty) to run them here too.
+os.environ.setdefault('CELERY_SKIP_CHECKS', 'True')
 
 app = Celery('sysnyx')
 
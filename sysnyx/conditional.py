@@ -0,0 +1,60 @@
+"""
+ETag / Last-Modified helpers for conditional GETs.
+
+Views compute validators from a cheap version lookup first and only build
+the payload when the client's copy is stale.
+"""
+import hashlib
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+
+def make_etag(*parts):
+    """
+    Build a quoted ETag from version parts.
+
+    Args:
+        *parts: Values that change whenever the representation changes
+
+    Returns:
+        str: Quoted strong ETag
+    """
+    digest = hashlib.md5(':'.join(str(part) for part in parts).encode('utf-8'))
+    return f'"{digest.hexdigest()}"'
+
+
+def _timestamp(last_modified):
+    if last_modified is None:
+        return None
+    return int(last_modified.timestamp())
+
+
+def not_modified(request, etag, last_modified=None):
+    """
+    Answer If-None-Match / If-Modified-Since when the client is current.
+
+    Args:
+        request: The incoming request
+        etag: Current ETag from make_etag()
+        last_modified: Current modification datetime, if known
+
+    Returns:
+        HttpResponse or None: A 304 response, or None to build the full response
+    """
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=_timestamp(last_modified)
+    )
+    if response is None:
+        return None
+    return set_validators(response, etag, last_modified)
+
+
+def set_validators(response, etag, last_modified=None):
+    """Attach ETag, Last-Modified and revalidation headers to a response."""
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(_timestamp(last_modified))
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,58 @@
+"""
+Management command to benchmark cold start of commands and Celery workers.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from sysnyx.benchmarking import find_regressions, load_baseline, save_baseline
+from sysnyx.startup import BASELINE_PATH, run_suite
+
+
+class Command(BaseCommand):
+    help = (
+        'Times Django setup, a one-off command, Celery worker boot and system checks in fresh '
+        'interpreters and compares them with the stored baseline; fails on regressions beyond --tolerance'
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Cold runs per scenario; the fastest is compared')
+        parser.add_argument('--only', default=None, help='Run only scenarios whose name contains this')
+        parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed growth in relative cost (0.25 = 25%%)')
+        parser.add_argument('--baseline', default=str(BASELINE_PATH), help='Baseline JSON file')
+        parser.add_argument('--save-baseline', action='store_true', help='Record this run as the new baseline')
+
+    def handle(self, *args, **options):
+        try:
+            results = run_suite(options['repeat'], options['only'])
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        baseline = load_baseline(options['baseline'])
+
+        self.stdout.write(f"Calibration: {results['calibration_ms']:.1f} ms for a bare interpreter")
+        self.stdout.write(f"{'scenario':<24} {'min ms':>9} {'median ms':>10} {'relative':>9} {'vs base':>8}")
+        for name, case in results['cases'].items():
+            previous = baseline['cases'].get(name) if baseline else None
+            change = f"{case['relative'] / previous['relative'] - 1:+8.1%}" if previous else '       -'
+            self.stdout.write(
+                f"{name:<24} {case['min_ms']:>9.1f} {case['median_ms']:>10.1f} {case['relative']:>9.2f} {change}"
+            )
+
+        if options['save_baseline']:
+            if options['only'] and baseline:
+                results['cases'] = {**baseline['cases'], **results['cases']}
+            save_baseline(results, options['baseline'])
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {options['baseline']}"))
+            return
+
+        if baseline is None:
+            self.stdout.write(self.style.WARNING('No baseline found; run with --save-baseline to record one.'))
+            return
+
+        regressions = find_regressions(results, baseline, options['tolerance'])
+        if regressions:
+            for name, before, after, change in regressions:
+                self.stderr.write(f'{name}: relative cost {before:.2f} -> {after:.2f} ({change:+.1%})')
+            raise CommandError(
+                f"{len(regressions)} startup scenario(s) regressed by more than {options['tolerance']:.0%}; "
+                'see manage.py profile_imports.'
+            )
+        self.stdout.write(self.style.SUCCESS(f"No regressions beyond {options['tolerance']:.0%}."))
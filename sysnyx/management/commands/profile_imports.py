@@ -0,0 +1,56 @@
+"""
+Management command to show where a cold start spends its import time.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from sysnyx.startup import SCENARIOS, by_package, import_profile
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs a startup scenario under python -X importtime and lists the most expensive '
+        'imports and packages'
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', default='celery worker boot', choices=sorted(SCENARIOS),
+                            help='Scenario to profile')
+        parser.add_argument('--top', type=int, default=20, help='Rows to show in each table')
+        parser.add_argument('--module', default=None,
+                            help='Show only imports under this module and what they pulled in')
+
+    def handle(self, *args, **options):
+        try:
+            entries = import_profile(SCENARIOS[options['scenario']])
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        top = options['top']
+        total = sum(self_us for _, self_us, _, _ in entries)
+        self.stdout.write(f"{options['scenario']}: {len(entries)} modules, {total / 1000:.1f} ms importing")
+
+        if options['module']:
+            entries = self._subtree(entries, options['module'])
+            if not entries:
+                raise CommandError(f"{options['module']} is not imported in this scenario.")
+
+        # An import's cumulative time includes everything it pulled in first,
+        # so the outermost imports are the ones worth deferring
+        outermost = [entry for entry in entries if entry[3] == min(e[3] for e in entries)]
+        self.stdout.write(f"\n{'cumulative ms':>13} {'self ms':>8}  outermost import")
+        for name, self_us, cumulative_us, _ in sorted(outermost, key=lambda e: -e[2])[:top]:
+            self.stdout.write(f'{cumulative_us / 1000:>13.1f} {self_us / 1000:>8.1f}  {name}')
+
+        self.stdout.write(f"\n{'self ms':>13} {'modules':>8}  package")
+        for package, spent, count in by_package(entries)[:top]:
+            self.stdout.write(f'{spent / 1000:>13.1f} {count:>8}  {package}')
+
+    def _subtree(self, entries, module):
+        """The entry for ``module`` and the imports nested under it."""
+        # importtime lists children before their parent
+        for index, (name, _, _, depth) in enumerate(entries):
+            if name == module:
+                start = index
+                while start > 0 and entries[start - 1][3] > depth:
+                    start -= 1
+                return entries[start:index + 1]
+        return []
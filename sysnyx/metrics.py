@@ -0,0 +1,469 @@
+"""
+Per-endpoint request metrics in Prometheus text format.
+
+MetricsMiddleware records, for every request, its latency, status, the
+number and total time of its database queries, and its cache hits and
+misses, all labelled with the URL route pattern (never the raw path).
+
+Recording is cheap: each thread increments counters in its own shard, so
+the hot path takes no lock, and shards are only summed when /metrics is
+scraped. Under gunicorn each worker periodically writes its totals to
+``METRICS_DIR/metrics-<pid>-<start>.json``; the endpoint sums every file
+so any worker can answer a scrape. When a scrape finds files of exited
+workers it folds them into ``metrics-aggregate.json`` and removes them, so
+counters stay monotonic across restarts while the directory stays small.
+METRICS_DIR must be local to one host, as workers are judged alive by pid.
+"""
+import bisect
+import contextlib
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+from django.core.exceptions import MiddlewareNotUsed
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    'sysnyx_http_requests_total': ('counter', 'Requests by route, method and status.'),
+    'sysnyx_http_request_duration_seconds': ('histogram', 'Request latency by route and method.'),
+    'sysnyx_http_exceptions_total': ('counter', 'Unhandled view exceptions by route and type.'),
+    'sysnyx_db_queries_total': ('counter', 'Database queries by route.'),
+    'sysnyx_db_query_seconds_total': ('counter', 'Time spent in database queries by route.'),
+    'sysnyx_cache_requests_total': ('counter', 'Cache reads by route and result (hit or miss).'),
+    'sysnyx_folio_recalcs_scheduled_total': ('counter', 'Deferred folio recalculations scheduled.'),
+    'sysnyx_folio_recalcs_coalesced_total': ('counter', 'Folio writes folded into an already scheduled recalculation.'),
+    'sysnyx_cache_fallbacks_total': ('counter', 'Cache operations served from process memory while Redis was down.'),
+}
+
+UNMATCHED_ROUTE = '<unmatched>'
+
+
+class Shard:
+    """One thread's counters; only that thread writes to it."""
+    __slots__ = ('counters', 'histograms')
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+
+class MetricsRegistry:
+    """
+    Counters and histograms sharded by thread.
+
+    Keys are ``(name, labels)`` with labels a tuple of (name, value) pairs.
+    A histogram keeps one count per bucket (not cumulative), then the
+    overflow bucket, the sum and the count.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []
+        self.started = time.time_ns()
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = Shard()
+            with self._lock:
+                self._shards.append(shard)
+            return shard
+
+    def inc(self, name, labels, amount=1):
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        histograms = self._shard().histograms
+        key = (name, labels)
+        values = histograms.get(key)
+        if values is None:
+            values = histograms[key] = [0] * (len(self.buckets) + 3)
+        values[bisect.bisect_left(self.buckets, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    def collect(self):
+        """
+        Sum every shard.
+
+        Returns:
+            tuple: (counters, histograms) dicts keyed like the shards
+        """
+        with self._lock:
+            shards = list(self._shards)
+        counters, histograms = {}, {}
+        for shard in shards:
+            # dict() and list() copies are atomic under the GIL
+            for key, value in dict(shard.counters).items():
+                counters[key] = counters.get(key, 0) + value
+            for key, values in dict(shard.histograms).items():
+                _add_values(histograms, key, list(values))
+        return counters, histograms
+
+    def clear(self):
+        with self._lock:
+            self._shards = []
+        self._local = threading.local()
+
+    def _after_fork(self):
+        # A forked worker must not re-export what its parent recorded
+        self._lock = threading.Lock()
+        self.clear()
+        self.started = time.time_ns()
+
+
+def _add_values(histograms, key, values):
+    total = histograms.get(key)
+    if total is None:
+        histograms[key] = values
+    else:
+        for i, value in enumerate(values):
+            total[i] += value
+
+
+_registry = MetricsRegistry()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_registry._after_fork)
+
+
+def get_registry():
+    return _registry
+
+
+# Per-request tallies, reached from query wrappers and cache backends through
+# the context, which sync_to_async carries into its worker threads
+_current = contextvars.ContextVar('sysnyx_request_stats', default=None)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_time', 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+def count_queries(execute, sql, params, many, context):
+    """Database execute wrapper installed on every connection."""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_time += time.perf_counter() - start
+        stats.queries += 1
+
+
+def install_query_counter(connection):
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+def record_cache(hits, misses):
+    stats = _current.get()
+    if stats is not None:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+
+_MISSING = object()
+
+
+class CacheMetricsMixin:
+    """Counts hits and misses of get() for the current request."""
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        if value is _MISSING:
+            record_cache(0, 1)
+            return default
+        record_cache(1, 0)
+        return value
+
+
+class InstrumentedRedisCache(CacheMetricsMixin, RedisCache):
+
+    def get_many(self, keys, version=None):
+        # Redis fetches these in one round trip rather than through get()
+        keys = list(keys)
+        found = super().get_many(keys, version)
+        record_cache(len(found), len(keys) - len(found))
+        return found
+
+
+class InstrumentedLocMemCache(CacheMetricsMixin, LocMemCache):
+    pass
+
+
+def route_of(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNMATCHED_ROUTE
+    return '/' + match.route if match.route else match.view_name or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """
+    Records per-route request metrics; works in sync and async chains.
+
+    Place it first in MIDDLEWARE so the latency covers the whole stack.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.registry = get_registry()
+        self.next_flush = 0.0
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    def process_exception(self, request, exception):
+        labels = (('route', route_of(request)), ('exception', type(exception).__name__))
+        self.registry.inc('sysnyx_http_exceptions_total', labels)
+
+    def record(self, request, response, stats, elapsed):
+        registry = self.registry
+        route = route_of(request)
+        registry.inc('sysnyx_http_requests_total', (
+            ('method', request.method), ('route', route), ('status', str(response.status_code))
+        ))
+        registry.observe(
+            'sysnyx_http_request_duration_seconds',
+            (('method', request.method), ('route', route)),
+            elapsed
+        )
+        if stats.queries:
+            registry.inc('sysnyx_db_queries_total', (('route', route),), stats.queries)
+            registry.inc('sysnyx_db_query_seconds_total', (('route', route),), stats.db_time)
+        if stats.cache_hits:
+            registry.inc('sysnyx_cache_requests_total', (('route', route), ('result', 'hit')), stats.cache_hits)
+        if stats.cache_misses:
+            registry.inc('sysnyx_cache_requests_total', (('route', route), ('result', 'miss')), stats.cache_misses)
+
+        if settings.METRICS_DIR:
+            now = time.monotonic()
+            if now >= self.next_flush:
+                self.next_flush = now + settings.METRICS_FLUSH_INTERVAL
+                flush(registry)
+
+
+AGGREGATE_FILE = 'metrics-aggregate.json'
+_WORKER_FILE = re.compile(r'metrics-(\d+)-\d+\.json$')
+
+
+def _metrics_path(directory, registry):
+    return Path(directory) / f'metrics-{os.getpid()}-{registry.started}.json'
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read(path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _write(path, data):
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_text(json.dumps(data, separators=(',', ':')))
+    os.replace(tmp, path)
+
+
+def _add_file(counters, histograms, data):
+    for name, labels, value in data['counters']:
+        key = (name, tuple(map(tuple, labels)))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, values in data['histograms']:
+        _add_values(histograms, (name, tuple(map(tuple, labels))), values)
+
+
+def _as_file(counters, histograms):
+    return {
+        'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+        'histograms': [[name, labels, values] for (name, labels), values in histograms.items()],
+    }
+
+
+@contextlib.contextmanager
+def _locked(directory, exclusive):
+    """Hold the directory's lock: shared to read the files, exclusive to compact them."""
+    if fcntl is None:
+        yield
+        return
+    with open(Path(directory) / '.metrics.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+
+
+def compact(directory=None):
+    """
+    Fold files of exited workers into the aggregate file and delete them.
+
+    The aggregate lists the files it has absorbed until they are gone, so a
+    crash between writing it and deleting them never counts a file twice.
+
+    Returns:
+        int: Worker files folded
+    """
+    directory = Path(directory or settings.METRICS_DIR)
+    if fcntl is None:
+        return 0
+    with _locked(directory, exclusive=True):
+        aggregate_path = directory / AGGREGATE_FILE
+        aggregate = _read(aggregate_path) or {'counters': [], 'histograms': [], 'folded': []}
+        folded = {name for name in aggregate.get('folded', []) if (directory / name).exists()}
+        dead = []
+        for path in directory.glob('metrics-*.json'):
+            match = _WORKER_FILE.match(path.name)
+            if match and path.name not in folded and not _pid_alive(int(match.group(1))):
+                dead.append(path)
+        if not dead and folded == set(aggregate.get('folded', [])):
+            return 0
+
+        counters, histograms = {}, {}
+        _add_file(counters, histograms, aggregate)
+        for path in dead:
+            data = _read(path)
+            if data is not None:
+                _add_file(counters, histograms, data)
+            folded.add(path.name)
+        _write(aggregate_path, {**_as_file(counters, histograms), 'folded': sorted(folded)})
+        for name in folded:
+            (directory / name).unlink(missing_ok=True)
+        _write(aggregate_path, {**_as_file(counters, histograms), 'folded': []})
+        return len(dead)
+
+
+def flush(registry=None, directory=None):
+    """Write this process's totals to METRICS_DIR, replacing its previous file."""
+    registry = registry or get_registry()
+    directory = directory or settings.METRICS_DIR
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    _write(_metrics_path(directory, registry), _as_file(*registry.collect()))
+
+
+def collect_all(registry=None, directory=None):
+    """
+    Totals across every process that has written to METRICS_DIR.
+
+    Without METRICS_DIR only this process is reported.
+    """
+    registry = registry or get_registry()
+    directory = directory or settings.METRICS_DIR
+    if not directory:
+        return registry.collect()
+
+    # Refresh our own file first so the scrape sees this process up to now
+    flush(registry, directory)
+    compact(directory)
+    counters, histograms = {}, {}
+    with _locked(directory, exclusive=False):
+        for path in Path(directory).glob('metrics-*.json'):
+            data = _read(path)
+            if data is not None:
+                _add_file(counters, histograms, data)
+    return counters, histograms
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(labels, extra=()):
+    pairs = tuple(labels) + tuple(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def render(counters, histograms, buckets=LATENCY_BUCKETS):
+    """Render collected metrics in the Prometheus text exposition format."""
+    by_name = {}
+    for (name, labels), value in counters.items():
+        by_name.setdefault(name, []).append((labels, value))
+    for (name, labels), values in histograms.items():
+        by_name.setdefault(name, []).append((labels, values))
+
+    lines = []
+    for name, (kind, description) in METRICS.items():
+        samples = by_name.get(name)
+        if not samples:
+            continue
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in sorted(samples):
+            if kind != 'histogram':
+                lines.append(f'{name}{_labels(labels)} {_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), value):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {_number(value[-2])}')
+            lines.append(f'{name}_count{_labels(labels)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,92 @@
+"""
+Fast JSON rendering and read-path helpers for hot endpoints.
+
+Endpoints listed in FAST_READ_ENDPOINTS build their responses from
+``.values()`` rows with precompiled field mappings instead of ModelSerializer,
+and render them with orjson when it is installed. Output matches the DRF
+serializers field for field.
+"""
+from django.conf import settings
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+def _default(obj):
+    # Decimal, lazy translation strings and anything else DRF would stringify
+    return str(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSON renderer backed by orjson, falling back to DRF's renderer without it.
+
+    Decimals are written as strings, as DRF's DecimalField does by default.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        return orjson.dumps(
+            data,
+            default=_default,
+            option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+        )
+
+
+def fast_reads(endpoint):
+    """Whether an endpoint name is listed in FAST_READ_ENDPOINTS."""
+    return endpoint in settings.FAST_READ_ENDPOINTS
+
+
+def endpoint_renderers(endpoint):
+    """Renderer classes for a view: FastJSONRenderer when the endpoint is enabled."""
+    if fast_reads(endpoint):
+        return [FastJSONRenderer, BrowsableAPIRenderer]
+    return [JSONRenderer, BrowsableAPIRenderer]
+
+
+def format_decimal(value):
+    """Match DRF DecimalField output for values already at model precision."""
+    return None if value is None else '{:f}'.format(value)
+
+
+def format_datetime(value):
+    """Match DRF DateTimeField ISO-8601 output for UTC datetimes."""
+    if value is None:
+        return None
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def row_mapper(fields):
+    """
+    Compile a mapping from a ``.values()`` row to a response dict.
+
+    The mapping is generated as a single dict literal, the same way
+    dataclasses builds its methods, so building a row costs one function call.
+
+    Args:
+        fields: Sequence of (output_key, row_key, converter or None)
+
+    Returns:
+        callable: row -> dict, preserving field order
+    """
+    namespace = {}
+    items = []
+    for i, (out, key, convert) in enumerate(fields):
+        if convert is None:
+            items.append(f'{out!r}: row[{key!r}]')
+        else:
+            namespace[f'convert_{i}'] = convert
+            items.append(f'{out!r}: convert_{i}(row[{key!r}])')
+    source = 'def build(row):\n    return {' + ', '.join(items) + '}\n'
+    exec(source, namespace)
+    return namespace['build']
@@ -25,13 +25,16 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'rest_framework.authtoken',
+    'sysnyx',
     'services',
     'billing',
     'payments',
     'audit',
+    'sync',
 ]
 
 MIDDLEWARE = [
+    'sysnyx.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -39,6 +42,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'audit.middleware.AuditContextMiddleware',
 ]
 
 ROOT_URLCONF = 'sysnyx.urls'
@@ -108,7 +112,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'sysnyx.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -126,6 +130,53 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 20,
 }
 
+# Per-device token buckets on tap endpoints: refill rate and burst capacity
+DEVICE_THROTTLE_RATES = {
+    'reader': os.getenv('DEVICE_THROTTLE_READER_RATE', '600/min'),
+    'staff': os.getenv('DEVICE_THROTTLE_STAFF_RATE', '300/min'),
+    'guest': os.getenv('DEVICE_THROTTLE_GUEST_RATE', '30/min'),
+}
+DEVICE_THROTTLE_BURST = {
+    'reader': int(os.getenv('DEVICE_THROTTLE_READER_BURST', '60')),
+    'staff': int(os.getenv('DEVICE_THROTTLE_STAFF_BURST', '30')),
+    'guest': int(os.getenv('DEVICE_THROTTLE_GUEST_BURST', '10')),
+}
+# Cap per user across all of its devices (readers often share one account)
+DEVICE_THROTTLE_USER_RATES = {
+    'reader': os.getenv('DEVICE_THROTTLE_READER_USER_RATE', '6000/min'),
+    'staff': os.getenv('DEVICE_THROTTLE_STAFF_USER_RATE', '1200/min'),
+    'guest': os.getenv('DEVICE_THROTTLE_GUEST_USER_RATE', '60/min'),
+}
+DEVICE_THROTTLE_USER_BURST = {
+    'reader': int(os.getenv('DEVICE_THROTTLE_READER_USER_BURST', '600')),
+    'staff': int(os.getenv('DEVICE_THROTTLE_STAFF_USER_BURST', '120')),
+    'guest': int(os.getenv('DEVICE_THROTTLE_GUEST_USER_BURST', '20')),
+}
+# Seconds between syncs of a local bucket with the shared one
+DEVICE_THROTTLE_SYNC_INTERVAL = float(os.getenv('DEVICE_THROTTLE_SYNC_INTERVAL', '1.0'))
+
+# Token -> user lookups: per-process LRU in front of the shared cache
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', '1024'))
+AUTH_TOKEN_LOCAL_TTL = float(os.getenv('AUTH_TOKEN_LOCAL_TTL', '30'))
+AUTH_TOKEN_CACHE_TTL = int(os.getenv('AUTH_TOKEN_CACHE_TTL', '300'))
+
+# Endpoints served from hand-tuned values() readers and the orjson renderer
+FAST_READ_ENDPOINTS = set(filter(None, os.getenv(
+    'FAST_READ_ENDPOINTS', 'folios,guest-folio,services,tap,preview'
+).split(',')))
+
+# Reader sync: changes newer than the settle window are held back so a
+# slower transaction with a lower sequence number can't be skipped
+SYNC_SETTLE_SECONDS = float(os.getenv('SYNC_SETTLE_SECONDS', '2'))
+SYNC_RETENTION_DAYS = int(os.getenv('SYNC_RETENTION_DAYS', '7'))
+SYNC_PAGE_SIZE = int(os.getenv('SYNC_PAGE_SIZE', '500'))
+SYNC_MAX_TAPS = int(os.getenv('SYNC_MAX_TAPS', '500'))
+
+# Seconds a service catalog snapshot stays in the shared cache
+CATALOG_SNAPSHOT_TTL = int(os.getenv('CATALOG_SNAPSHOT_TTL', '86400'))
+# Rendered catalog responses kept per process and snapshot
+CATALOG_RENDERED_PAGES = int(os.getenv('CATALOG_RENDERED_PAGES', '64'))
+
 # Celery Configuration
 CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
@@ -134,14 +185,84 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
-# Redis Cache
+# Audit logging
+# Charges, payments and folio status changes are recorded automatically
+AUDIT_CAPTURE = os.getenv('AUDIT_CAPTURE', 'True') == 'True'
+# When buffered, audit events are spooled to disk and written in batches
+AUDIT_BUFFERED = os.getenv('AUDIT_BUFFERED', 'False') == 'True'
+AUDIT_BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', '500'))
+AUDIT_FLUSH_INTERVAL = float(os.getenv('AUDIT_FLUSH_INTERVAL', '1.0'))
+AUDIT_SPOOL_DIR = os.getenv('AUDIT_SPOOL_DIR', str(BASE_DIR / 'var' / 'audit-spool'))
+AUDIT_SPOOL_FSYNC = os.getenv('AUDIT_SPOOL_FSYNC', 'False') == 'True'
+# Entries between hash-chain checkpoints
+AUDIT_CHECKPOINT_INTERVAL = int(os.getenv('AUDIT_CHECKPOINT_INTERVAL', '10000'))
+# Months kept in the live table before archive_audit_logs rolls them into segments
+AUDIT_LIVE_MONTHS = int(os.getenv('AUDIT_LIVE_MONTHS', '3'))
+AUDIT_ARCHIVE_DIR = os.getenv('AUDIT_ARCHIVE_DIR', str(BASE_DIR / 'var' / 'audit-archive'))
+
+# Folio totals after a charge or payment: 'immediate' recalculates in the
+# same transaction; 'deferred' coalesces bursts into one Celery
+# recalculation per folio every FOLIO_RECALC_WINDOW seconds (see billing.recalc)
+FOLIO_RECALC_MODE = os.getenv('FOLIO_RECALC_MODE', 'immediate')
+FOLIO_RECALC_WINDOW = float(os.getenv('FOLIO_RECALC_WINDOW', '1'))
+
+# Redis cache behind a per-process LRU (see sysnyx.cache). Keys under
+# CACHE_LOCAL_PREFIXES are also served from process memory for up to
+# CACHE_LOCAL_TIMEOUT seconds; if Redis is down the cache runs local-only.
+# REDIS_CACHE_URL falls back to CELERY_BROKER_URL for older deployments.
+REDIS_CACHE_URL = os.getenv('REDIS_CACHE_URL', os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/1'))
+CACHE_LOCAL_PREFIXES = [
+    prefix for prefix in os.getenv('CACHE_LOCAL_PREFIXES', 'services:catalog:version').split(',') if prefix
+]
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
-        'LOCATION': os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/1'),
+        'BACKEND': 'sysnyx.cache.InstrumentedTwoTierCache',
+        'LOCATION': REDIS_CACHE_URL,
+        'OPTIONS': {
+            'LOCAL_PREFIXES': CACHE_LOCAL_PREFIXES,
+            'LOCAL_TIMEOUT': float(os.getenv('CACHE_LOCAL_TIMEOUT', '10')),
+            'LOCAL_MAX_ENTRIES': int(os.getenv('CACHE_LOCAL_MAX_ENTRIES', '10000')),
+            'RETRY_INTERVAL': float(os.getenv('CACHE_RETRY_INTERVAL', '5')),
+            # Fail fast into local-only mode rather than hang requests
+            'socket_connect_timeout': float(os.getenv('CACHE_SOCKET_TIMEOUT', '0.5')),
+            'socket_timeout': float(os.getenv('CACHE_SOCKET_TIMEOUT', '0.5')),
+        },
     }
 }
 
+# Request metrics served at /metrics. Set METRICS_DIR to a directory shared
+# by all workers on the host (e.g. under gunicorn) so any worker reports the
+# totals. Scrapes need METRICS_TOKEN as a bearer token; with no token set
+# /metrics is refused unless DEBUG is on.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Slow-query sampling into a shared ring buffer, viewable by staff at
+# /api/diagnostics/slow-queries/
+SLOW_QUERY_ENABLED = os.getenv('SLOW_QUERY_ENABLED', 'False') == 'True'
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', '100'))
+SLOW_QUERY_SAMPLE_RATE = float(os.getenv('SLOW_QUERY_SAMPLE_RATE', '1.0'))
+SLOW_QUERY_BUFFER_SIZE = int(os.getenv('SLOW_QUERY_BUFFER_SIZE', '200'))
+SLOW_QUERY_EXPLAIN = os.getenv('SLOW_QUERY_EXPLAIN', 'True') == 'True'
+# Parameters are kept as types and lengths only; raw values can hold tokens
+SLOW_QUERY_CAPTURE_PARAMS = os.getenv('SLOW_QUERY_CAPTURE_PARAMS', 'False') == 'True'
+
+# Route NFC taps to the async view; only worth it under the ASGI server
+TAP_VIEW_ASYNC = os.getenv('TAP_VIEW_ASYNC', 'False') == 'True'
+# Seconds a tap response stays cached for idempotent retries (async view)
+TAP_IDEMPOTENCY_TTL = int(os.getenv('TAP_IDEMPOTENCY_TTL', '300'))
+
+# Live folio events: 'redis' fans out across processes, 'memory' stays in-process
+FOLIO_EVENTS_BROKER = os.getenv('FOLIO_EVENTS_BROKER', 'redis')
+FOLIO_EVENTS_REDIS_URL = os.getenv('FOLIO_EVENTS_REDIS_URL', 'redis://localhost:6379/2')
+# Seconds between keep-alive comments on idle event streams
+FOLIO_EVENTS_HEARTBEAT = float(os.getenv('FOLIO_EVENTS_HEARTBEAT', '15'))
+
 # Stripe Configuration
 STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY', '')
 STRIPE_PUBLISHABLE_KEY = os.getenv('STRIPE_PUBLISHABLE_KEY', '')
+
+# Seconds a payment response stays cached for Idempotency-Key retries
+PAYMENT_IDEMPOTENCY_TTL = int(os.getenv('PAYMENT_IDEMPOTENCY_TTL', '300'))
@@ -0,0 +1,53 @@
+"""
+Signal handlers for project-wide caches and instrumentation.
+"""
+from django.contrib.auth.models import Group, User
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from .authentication import invalidate_token, invalidate_user, invalidate_users
+from .metrics import install_query_counter
+from .slowqueries import install_slow_query_sampler
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    """Evict a saved user; queryset updates send no signal (see invalidate_users)."""
+    if not created:
+        invalidate_user(instance)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def user_access_changed(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """Evict users whose groups or permissions changed, from either side of the relation."""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if isinstance(instance, User):
+        user_ids = [instance.pk]
+    elif isinstance(instance, Group):
+        # A group's permissions or members changed: its members are affected
+        user_ids = list(instance.user_set.values_list('pk', flat=True))
+        if model is User and pk_set:
+            user_ids += list(pk_set)
+    else:
+        # A permission added to or removed from users or groups
+        if model is User:
+            user_ids = list(pk_set or instance.user_set.values_list('pk', flat=True))
+        else:
+            groups = pk_set if pk_set is not None else instance.group_set.values_list('pk', flat=True)
+            user_ids = list(User.objects.filter(groups__in=list(groups)).values_list('pk', flat=True))
+    invalidate_users(user_ids)
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    install_query_counter(connection)
+    install_slow_query_sampler(connection)
@@ -0,0 +1,198 @@
+"""
+Opt-in sampler for slow database queries.
+
+With SLOW_QUERY_ENABLED, every query slower than SLOW_QUERY_THRESHOLD_MS is
+sampled (at SLOW_QUERY_SAMPLE_RATE) along with the view and project code
+that issued it and an EXPLAIN plan. Parameters are recorded only as types
+and lengths, and string literals are stripped from the SQL and the plan,
+since queries on tokens, guest sessions and idempotency keys would
+otherwise put secrets in the cache and the staff view; set
+SLOW_QUERY_CAPTURE_PARAMS to keep raw values while debugging. Samples go to a ring
+buffer of SLOW_QUERY_BUFFER_SIZE slots in the shared cache: an atomic
+counter picks the slot, so every worker writes to the same buffer and the
+oldest samples are overwritten.
+"""
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from audit.capture import current_request
+
+logger = logging.getLogger(__name__)
+
+SEQ_KEY = 'slowq:seq'
+SLOT_KEY = 'slowq:slot:{}'
+
+MAX_SQL_LENGTH = 4000
+MAX_PARAM_LENGTH = 200
+STACK_DEPTH = 5
+EXPLAINABLE = ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT')
+
+_STRING_LITERALS = re.compile(r"'(?:[^']|'')*'")
+
+_PROJECT_DIR = str(Path(settings.BASE_DIR).resolve())
+# Execute wrappers sit between the caller and the query; skip their frames
+_WRAPPER_FILES = {
+    os.path.abspath(__file__),
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'metrics.py'),
+}
+# Set while a sample is being taken so the EXPLAIN isn't sampled in turn
+_sampling = threading.local()
+
+
+def sample_slow_queries(execute, sql, params, many, context):
+    """Database execute wrapper installed on every connection."""
+    if not settings.SLOW_QUERY_ENABLED or getattr(_sampling, 'active', False):
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    result = execute(sql, params, many, context)
+    elapsed = (time.perf_counter() - start) * 1000
+    if elapsed >= settings.SLOW_QUERY_THRESHOLD_MS and random.random() < settings.SLOW_QUERY_SAMPLE_RATE:
+        _sampling.active = True
+        try:
+            record_sample(context['connection'], sql, params, many, elapsed)
+        except Exception:
+            # Diagnostics must never fail the query they describe
+            logger.warning('Could not record slow query sample', exc_info=True)
+        finally:
+            _sampling.active = False
+    return result
+
+
+def install_slow_query_sampler(connection):
+    if sample_slow_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sample_slow_queries)
+
+
+def call_stack():
+    """
+    Project frames that led to the query, innermost first.
+
+    Returns:
+        list: 'path/to/module.py:line in function' strings
+    """
+    frames = []
+    frame = sys._getframe(1)
+    while frame is not None and len(frames) < STACK_DEPTH:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if (filename.startswith(_PROJECT_DIR) and filename not in _WRAPPER_FILES
+                and 'site-packages' not in filename):
+            relative = os.path.relpath(filename, _PROJECT_DIR)
+            frames.append(f'{relative}:{frame.f_lineno} in {frame.f_code.co_name}')
+        frame = frame.f_back
+    return frames
+
+
+def explain(connection, sql, params):
+    """
+    The database's plan for a statement, without running it.
+
+    Returns:
+        list: Plan lines, or a single error line if it could not be explained
+    """
+    if connection.vendor == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    elif connection.vendor == 'postgresql':
+        prefix = 'EXPLAIN (FORMAT TEXT) '
+    else:
+        prefix = 'EXPLAIN '
+    try:
+        # A savepoint keeps a failed EXPLAIN from aborting the caller's transaction
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(prefix + sql, params)
+                rows = cursor.fetchall()
+    except DatabaseError as exc:
+        return [f'EXPLAIN failed: {exc}']
+    return [' | '.join(str(column) for column in row) for row in rows]
+
+
+def _param(value):
+    if not settings.SLOW_QUERY_CAPTURE_PARAMS:
+        if isinstance(value, (str, bytes, bytearray, memoryview)):
+            return f'<{type(value).__name__} len={len(value)}>'
+        return f'<{type(value).__name__}>'
+    text = repr(value)
+    if len(text) > MAX_PARAM_LENGTH:
+        text = text[:MAX_PARAM_LENGTH] + '...'
+    return text
+
+
+def _params(params, many):
+    if many or params is None:
+        return None
+    if isinstance(params, dict):
+        return {name: _param(value) for name, value in params.items()}
+    return [_param(value) for value in params]
+
+
+def _redact(text):
+    """Strip string literals (e.g. bound values a plan echoes) unless raw capture is on."""
+    if settings.SLOW_QUERY_CAPTURE_PARAMS:
+        return text
+    return _STRING_LITERALS.sub("'?'", text)
+
+
+def record_sample(connection, sql, params, many, elapsed_ms):
+    """Capture one slow query into the shared ring buffer."""
+    request = current_request()
+    view = None
+    if request is not None:
+        match = getattr(request, 'resolver_match', None)
+        view = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+        }
+
+    plan = None
+    if (settings.SLOW_QUERY_EXPLAIN and not many
+            and sql.lstrip()[:6].upper().startswith(EXPLAINABLE)):
+        plan = [_redact(line) for line in explain(connection, sql, params)]
+
+    sample = {
+        'recorded_at': timezone.now().isoformat(),
+        'duration_ms': round(elapsed_ms, 2),
+        'database': connection.alias,
+        'sql': _redact(sql)[:MAX_SQL_LENGTH],
+        'params': _params(params, many),
+        'many': many,
+        'request': view,
+        'call_site': call_stack(),
+        'plan': plan,
+        'pid': os.getpid(),
+    }
+    store_sample(sample)
+
+
+def store_sample(sample):
+    size = settings.SLOW_QUERY_BUFFER_SIZE
+    cache.add(SEQ_KEY, 0, None)
+    try:
+        seq = cache.incr(SEQ_KEY)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.add(SEQ_KEY, 0, None)
+        seq = cache.incr(SEQ_KEY)
+    sample['seq'] = seq
+    cache.set(SLOT_KEY.format(seq % size), sample, None)
+
+
+def recent_samples():
+    """Buffered samples, most recent first."""
+    size = settings.SLOW_QUERY_BUFFER_SIZE
+    found = cache.get_many([SLOT_KEY.format(slot) for slot in range(size)])
+    return sorted(found.values(), key=lambda sample: sample['seq'], reverse=True)
+
+
+def clear_samples():
+    size = settings.SLOW_QUERY_BUFFER_SIZE
+    cache.delete_many([SLOT_KEY.format(slot) for slot in range(size)] + [SEQ_KEY])
@@ -0,0 +1,153 @@
+"""
+Cold-start measurements for management commands and Celery workers.
+
+Each scenario is run in a fresh interpreter, as a cron job or an autoscaled
+worker would be, and timed from spawn to exit. Times are also reported
+relative to a bare ``python -c pass`` on the same machine, which keeps a
+baseline recorded on one machine comparable on another.
+
+``import_profile`` runs a scenario under ``python -X importtime`` and
+returns what each module cost, which is where to look when a scenario
+regresses.
+
+Baselines live in ``startup_baseline.json`` beside this module; run
+``manage.py bench_startup --save-baseline`` after an intended change.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from django.conf import settings
+
+
+BASELINE_PATH = Path(__file__).resolve().parent / 'startup_baseline.json'
+
+CALIBRATION = ('-c', 'pass')
+
+# name -> interpreter arguments, run from the project directory
+SCENARIOS = {
+    'django setup': ('-c', 'import django; django.setup()'),
+    # Loads the command and everything a real run would, without touching the database
+    'one-off command': ('manage.py', 'prune_sync_changes', '--help'),
+    'celery worker boot': (
+        '-c',
+        # What a worker does before it connects to the broker
+        'from sysnyx.celery import app; app.loader.import_default_modules()',
+    ),
+    'system checks': ('manage.py', 'check'),
+}
+
+
+def _environ():
+    env = dict(os.environ)
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'sysnyx.settings')
+    return env
+
+
+def run(args, extra=()):
+    """
+    Run the interpreter with ``args`` in the project directory.
+
+    Returns:
+        tuple: (wall seconds, completed process)
+    """
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, *extra, *args],
+        cwd=settings.BASE_DIR,
+        env=_environ(),
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(
+            f"{' '.join(args)} exited with {completed.returncode}: {completed.stderr.strip()[-2000:]}"
+        )
+    return elapsed, completed
+
+
+def time_startup(args, repeat):
+    """
+    Wall seconds of ``repeat`` cold runs.
+
+    One untimed run goes first so bytecode compilation and a cold page
+    cache don't count against the scenario.
+    """
+    run(args)
+    return [run(args)[0] for _ in range(repeat)]
+
+
+def run_suite(repeat=5, only=None):
+    """
+    Time every scenario.
+
+    Args:
+        repeat: Runs per scenario; the fastest and the median are reported
+        only: Optional substring selecting scenarios by name
+
+    Returns:
+        dict: calibration_ms and per-scenario min_ms, median_ms and relative cost
+    """
+    calibration = min(time_startup(CALIBRATION, repeat))
+    cases = {}
+    for name, args in SCENARIOS.items():
+        if only and only not in name:
+            continue
+        times = time_startup(args, repeat)
+        cases[name] = {
+            'min_ms': round(min(times) * 1000, 1),
+            'median_ms': round(statistics.median(times) * 1000, 1),
+            'relative': round(min(times) / calibration, 3),
+        }
+    return {'calibration_ms': round(calibration * 1000, 1), 'cases': cases}
+
+
+def parse_importtime(stderr):
+    """
+    Parse ``-X importtime`` output.
+
+    Returns:
+        list: (module, self microseconds, cumulative microseconds, depth) in
+        the order imports finished
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        parts = line[len('import time:'):].split('|')
+        self_us, cumulative_us, name = int(parts[0]), int(parts[1]), parts[2]
+        stripped = name.lstrip(' ')
+        entries.append((stripped, self_us, cumulative_us, (len(name) - len(stripped) - 1) // 2))
+    return entries
+
+
+def import_profile(args):
+    """
+    Import costs of one cold run of a scenario.
+
+    Returns:
+        list: Entries as returned by parse_importtime
+    """
+    _, completed = run(args, extra=('-X', 'importtime'))
+    return parse_importtime(completed.stderr)
+
+
+def by_package(entries):
+    """
+    Self time summed by top-level package.
+
+    Returns:
+        list: (package, microseconds, modules) sorted most expensive first
+    """
+    totals = {}
+    for name, self_us, _, _ in entries:
+        package = name.split('.', 1)[0]
+        spent, count = totals.get(package, (0, 0))
+        totals[package] = (spent + self_us, count + 1)
+    return sorted(
+        ((package, spent, count) for package, (spent, count) in totals.items()),
+        key=lambda item: -item[1]
+    )
@@ -0,0 +1,118 @@
+"""
+Test helpers for query-budget performance contracts.
+
+A contract runs an endpoint against growing amounts of data and requires
+the number of SQL queries to stay the same. When it changes, the failure
+lists every statement by how often it ran at each size, so the query
+that scales with the data (usually an N+1 on a nested serializer) stands
+out.
+
+Test modules import ``locmem_cache`` to run every test in the module
+against a per-process LocMemCache instead of the Redis-backed default.
+"""
+import re
+from collections import Counter
+import pytest
+from django.db import connections
+
+
+CONTRACT_SIZES = (1, 100, 10000)
+
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+}
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r'IN \((?:(?:\?|%s), )*(?:\?|%s)\)')
+_SPACES = re.compile(r'\s+')
+
+
+@pytest.fixture(autouse=True)
+def locmem_cache(settings):
+    """Use LOCMEM_CACHES for every test in a module that imports this."""
+    settings.CACHES = LOCMEM_CACHES
+
+
+def normalize_sql(sql):
+    """Strip literals and IN-list lengths so repeats of one statement match."""
+    sql = _LITERALS.sub('?', sql)
+    sql = _IN_LISTS.sub('IN (...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+def count_queries(func, using='default'):
+    """
+    Run ``func`` and capture its queries.
+
+    Unlike CaptureQueriesContext this has no 9,000-query cap, so a runaway
+    N+1 is counted in full.
+
+    Returns:
+        tuple: (result, list of executed SQL strings)
+    """
+    queries = []
+
+    def record(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connections[using].execute_wrapper(record):
+        result = func()
+    return result, queries
+
+
+def query_report(runs):
+    """
+    Per-statement counts for each data size.
+
+    Args:
+        runs: dict of size -> list of SQL strings
+
+    Returns:
+        str: One line per distinct statement, most repeated first
+    """
+    sizes = list(runs)
+    counts = {size: Counter(normalize_sql(sql) for sql in queries) for size, queries in runs.items()}
+    statements = sorted(
+        set().union(*counts.values()),
+        key=lambda sql: (-counts[sizes[-1]][sql], sql)
+    )
+    header = ' '.join(f'{size:>7}' for size in sizes)
+    lines = [f'{header}  statement']
+    for sql in statements:
+        row = ' '.join(f'{counts[size][sql]:>7}' for size in sizes)
+        lines.append(f'{row}  {sql[:300]}')
+    return '\n'.join(lines)
+
+
+def assert_constant_queries(grow, call, sizes=CONTRACT_SIZES, reset=None, using='default'):
+    """
+    Assert a request costs the same number of queries at every data size.
+
+    Args:
+        grow: Callable bringing the data up to ``size`` child rows
+        call: Callable making the request; its result is checked by the caller
+        sizes: Increasing data sizes to measure at
+        reset: Optional callable run before each measurement (e.g. clear caches)
+        using: Database alias to watch
+
+    Returns:
+        dict: size -> result of ``call``
+
+    Raises:
+        AssertionError: With a per-statement report if the counts differ
+    """
+    results, runs = {}, {}
+    for size in sizes:
+        grow(size)
+        if reset is not None:
+            reset()
+        results[size], runs[size] = count_queries(call, using)
+
+    counts = {size: len(queries) for size, queries in runs.items()}
+    if len(set(counts.values())) > 1:
+        summary = ', '.join(f'{count} at {size}' for size, count in counts.items())
+        raise AssertionError(
+            f'Query count grows with data size ({summary}):\n{query_report(runs)}'
+        )
+    return results
@@ -0,0 +1,576 @@
+"""
+Test suite for project-wide infrastructure.
+"""
+import json
+import time
+from types import SimpleNamespace
+import pytest
+from django.contrib.auth.models import AnonymousUser, Group, Permission, User
+from django.core.cache import cache
+from django.test import RequestFactory
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from redis.exceptions import ConnectionError as RedisConnectionError
+from .authentication import LocalTokenCache, _cache_key, invalidate_users, local_cache, lookup_token_user
+from .cache import LocalLRU, TwoTierCache
+from .slowqueries import clear_samples, recent_samples
+from .metrics import MetricsRegistry, _as_file, _metrics_path, collect_all, flush, get_registry, render
+from .startup import by_package, parse_importtime, run
+from .testing import locmem_cache  # noqa: F401
+from .throttling import BucketRegistry, DeviceTokenBucketThrottle, parse_rate
+from payments.gateways import stripe_sdk
+
+
+@pytest.mark.django_db
+class TestCachedTokenAuthentication:
+    """Tests for cached token authentication."""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        cache.clear()
+        local_cache().clear()
+        self.user = User.objects.create_user(username='reader-auth', password='pass')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+    
+    def test_lookup_is_cached(self, django_assert_num_queries):
+        """Test only the first request queries the token."""
+        with django_assert_num_queries(1):
+            assert self.client.get('/api/sync/changes/?since=abc').status_code == 422
+        with django_assert_num_queries(0):
+            assert self.client.get('/api/sync/changes/?since=abc').status_code == 422
+        
+        # Another process: empty LRU, shared cache still warm
+        local_cache().clear()
+        with django_assert_num_queries(0):
+            assert self.client.get('/api/sync/changes/?since=abc').status_code == 422
+    
+    def test_deactivation_and_deletion_invalidate(self):
+        """Test cached users lose access as soon as they are disabled."""
+        assert self.client.get('/api/sync/changes/?since=abc').status_code == 422
+        self.user.is_active = False
+        self.user.save()
+        assert self.client.get('/api/sync/changes/?since=abc').status_code == 401
+        
+        self.user.is_active = True
+        self.user.save()
+        assert self.client.get('/api/sync/changes/?since=abc').status_code == 422
+        self.token.delete()
+        assert self.client.get('/api/sync/changes/?since=abc').status_code == 401
+    
+    def test_group_and_permission_changes_invalidate(self):
+        """Test m2m changes from either side evict the cached user."""
+        assert lookup_token_user(self.token.key).groups.count() == 0
+        group = Group.objects.create(name='night-audit')
+        
+        self.user.groups.add(group)
+        assert cache.get(_cache_key(self.token.key)) is None
+        lookup_token_user(self.token.key)
+        group.permissions.add(Permission.objects.get(codename='view_user'))
+        assert cache.get(_cache_key(self.token.key)) is None
+        assert lookup_token_user(self.token.key).has_perm('auth.view_user')
+        
+        group.user_set.remove(self.user)
+        assert local_cache().get(self.token.key) is None
+        assert not lookup_token_user(self.token.key).has_perm('auth.view_user')
+        
+        # Queryset updates send no signal and must evict explicitly
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        assert lookup_token_user(self.token.key).is_active
+        invalidate_users([self.user.pk])
+        assert not lookup_token_user(self.token.key).is_active
+    
+    def test_each_request_gets_its_own_user(self):
+        """Test per-request changes to the user don't reach other requests."""
+        first = lookup_token_user(self.token.key)
+        first.is_staff = True
+        first.has_perm('auth.view_user')
+        
+        second = lookup_token_user(self.token.key)
+        assert second is not first
+        assert second.is_staff is False
+        assert not hasattr(second, '_perm_cache')
+    
+    def test_local_cache_is_bounded(self):
+        """Test the LRU evicts the least recently used token."""
+        lru = LocalTokenCache(maxsize=2, ttl=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        assert lru.get('b') is None
+        assert lru.get('a') == 1
+        
+        expired = LocalTokenCache(maxsize=2, ttl=-1)
+        expired.set('a', 1)
+        assert expired.get('a') is None
+
+
+@pytest.mark.django_db
+class TestDeviceTokenBucketThrottle:
+    """Tests for per-device tap throttling."""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        settings.DEVICE_THROTTLE_BURST = {'reader': 3, 'staff': 3, 'guest': 1}
+        settings.DEVICE_THROTTLE_RATES = {'reader': '1/min', 'staff': '1/min', 'guest': '1/min'}
+        settings.DEVICE_THROTTLE_USER_BURST = {'reader': 5, 'staff': 5, 'guest': 1}
+        settings.DEVICE_THROTTLE_USER_RATES = {'reader': '1/min', 'staff': '1/min', 'guest': '1/min'}
+        settings.DEVICE_THROTTLE_SYNC_INTERVAL = 1.0
+        cache.clear()
+        local_cache().clear()
+        self.registry = BucketRegistry()
+        DeviceTokenBucketThrottle.registry = self.registry
+        user = User.objects.create_user(username='reader-throttle', password='pass')
+        self.token = Token.objects.create(user=user)
+        yield
+        DeviceTokenBucketThrottle.registry = None
+    
+    def tap(self, device_id, token=None):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {(token or self.token).key}', HTTP_X_DEVICE_ID=device_id)
+        return client.post('/api/billing/charge/none/', {'service_id': 1}, format='json')
+    
+    def test_parse_rate(self):
+        """Test rates convert to tokens per second."""
+        assert parse_rate('600/min') == 10
+        assert parse_rate('3600/hour') == 1
+        assert parse_rate('2/s') == 2
+    
+    def test_burst_then_throttled(self):
+        """Test a device gets its burst, then 429 with Retry-After."""
+        for _ in range(3):
+            assert self.tap('reader-1').status_code == 404
+        response = self.tap('reader-1')
+        assert response.status_code == 429
+        assert int(response['Retry-After']) > 0
+        
+        # Other readers keep their own buckets
+        other = Token.objects.create(user=User.objects.create_user(username='reader-throttle-2', password='pass'))
+        assert self.tap('reader-2', token=other).status_code == 404
+    
+    def test_readers_sharing_a_token_are_throttled_apart(self):
+        """Test readers on one service account get a bucket each."""
+        for _ in range(3):
+            assert self.tap('reader-1').status_code == 404
+        assert self.tap('reader-1').status_code == 429
+        assert self.tap('reader-2').status_code == 404
+        assert f'throttle:device:reader:user:{self.token.user_id}:device:reader-2' in self.registry._buckets
+    
+    def test_new_device_ids_stop_at_the_user_cap(self):
+        """Test rotating X-Device-ID doesn't buy readers or anonymous clients fresh tokens."""
+        for device_id in ('spoof-1', 'spoof-2', 'spoof-3', 'spoof-4', 'spoof-5'):
+            assert self.tap(device_id).status_code == 404
+        response = self.tap('spoof-6')
+        assert response.status_code == 429
+        assert int(response['Retry-After']) > 0
+        # The refused request didn't spend the new device's token
+        assert self.registry._buckets[
+            f'throttle:device:reader:user:{self.token.user_id}:device:spoof-6'
+        ].tokens == 3
+        
+        request = RequestFactory().post('/', HTTP_X_DEVICE_ID='spoof-5', REMOTE_ADDR='203.0.113.9')
+        request.user = AnonymousUser()
+        assert DeviceTokenBucketThrottle().device_ident(request) == 'ip:203.0.113.9'
+    
+    def test_staff_devices_get_their_own_buckets(self):
+        """Test staff handhelds sharing a login are throttled per device."""
+        staff = User.objects.create_user(username='staff-throttle', password='pass', is_staff=True)
+        token = Token.objects.create(user=staff)
+        for _ in range(3):
+            assert self.tap('handheld-1', token=token).status_code == 404
+        assert self.tap('handheld-1', token=token).status_code == 429
+        assert self.tap('handheld-2', token=token).status_code == 404
+        assert f'throttle:device:staff:user:{staff.pk}:device:handheld-2' in self.registry._buckets
+    
+    def test_credential_device_wins_over_header(self):
+        """Test a device bound to the credential can't be swapped through X-Device-ID."""
+        request = RequestFactory().post('/', HTTP_X_DEVICE_ID='spoof')
+        request.user = self.token.user
+        request.auth = SimpleNamespace(device_id='phone-1')
+        assert DeviceTokenBucketThrottle().device_ident(request) == f'user:{self.token.user_id}:device:phone-1'
+    
+    def test_new_buckets_spread_first_sync(self):
+        """Test new buckets don't all sync with the cache on first use."""
+        registry = BucketRegistry()
+        buckets = [registry.get(f'k{i}', 10, 1.0, 100.0, interval=1.0) for i in range(50)]
+        assert all(99.0 <= bucket.synced_at <= 100.0 for bucket in buckets)
+        assert len({bucket.synced_at for bucket in buckets}) > 1
+    
+    def test_processes_share_consumption(self, settings):
+        """Test a process syncing starts from the shared balance."""
+        for _ in range(2):
+            assert self.tap('reader-1').status_code == 404
+        
+        # The next sync reports both taps, leaving one token in the shared bucket
+        settings.DEVICE_THROTTLE_SYNC_INTERVAL = 0
+        assert self.tap('reader-1').status_code == 404
+        
+        # Another process gets that token, not a fresh burst
+        DeviceTokenBucketThrottle.registry = BucketRegistry()
+        assert self.tap('reader-1').status_code == 404
+        assert self.tap('reader-1').status_code == 429
+
+
+@pytest.mark.django_db
+class TestMetrics:
+    """Tests for request metrics and the /metrics endpoint."""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        settings.CACHES = {
+            'default': {'BACKEND': 'sysnyx.metrics.InstrumentedLocMemCache'}
+        }
+        settings.METRICS_DIR = ''
+        settings.METRICS_TOKEN = ''
+        cache.clear()
+        local_cache().clear()
+        get_registry().clear()
+        user = User.objects.create_user(username='reader-metrics', password='pass')
+        self.token = Token.objects.create(user=user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+    
+    def test_records_route_latency_queries_and_cache(self):
+        """Test a request is counted under its route pattern."""
+        self.client.get('/api/sync/changes/?since=abc')
+        self.client.get('/api/sync/changes/?since=abc')
+        counters, histograms = get_registry().collect()
+        route = (('route', '/api/sync/changes/'),)
+        
+        assert counters[('sysnyx_http_requests_total', (
+            ('method', 'GET'), ('route', '/api/sync/changes/'), ('status', '422')
+        ))] == 2
+        assert histograms[('sysnyx_http_request_duration_seconds', (('method', 'GET'),) + route)][-1] == 2
+        # The token query runs once; the second request is a shared cache hit
+        assert counters[('sysnyx_db_queries_total', route)] == 1
+        assert counters[('sysnyx_cache_requests_total', route + (('result', 'miss'),))] >= 1
+        assert counters[('sysnyx_cache_requests_total', route + (('result', 'hit'),))] >= 1
+    
+    def test_render_prometheus_text(self):
+        """Test histogram buckets are cumulative and labels are escaped."""
+        registry = MetricsRegistry(buckets=(0.1, 1.0))
+        labels = (('method', 'GET'), ('route', '/a"b/'))
+        registry.observe('sysnyx_http_request_duration_seconds', labels, 0.05)
+        registry.observe('sysnyx_http_request_duration_seconds', labels, 5)
+        registry.inc('sysnyx_db_queries_total', (('route', '/a"b/'),), 3)
+        text = render(*registry.collect(), buckets=registry.buckets)
+        
+        assert '# TYPE sysnyx_http_request_duration_seconds histogram' in text
+        assert 'sysnyx_http_request_duration_seconds_bucket{method="GET",route="/a\\"b/",le="0.1"} 1' in text
+        assert 'sysnyx_http_request_duration_seconds_bucket{method="GET",route="/a\\"b/",le="+Inf"} 2' in text
+        assert 'sysnyx_http_request_duration_seconds_count{method="GET",route="/a\\"b/"} 2' in text
+        assert 'sysnyx_db_queries_total{route="/a\\"b/"} 3' in text
+    
+    def test_workers_are_aggregated(self, tmp_path):
+        """Test totals are summed across worker files."""
+        labels = (('route', '/x/'),)
+        worker = MetricsRegistry()
+        worker.started -= 1
+        worker.inc('sysnyx_db_queries_total', labels, 2)
+        flush(worker, tmp_path)
+        
+        local = MetricsRegistry()
+        local.inc('sysnyx_db_queries_total', labels, 3)
+        counters, _ = collect_all(local, tmp_path)
+        assert counters[('sysnyx_db_queries_total', labels)] == 5
+    
+    def test_exited_workers_are_folded(self, tmp_path):
+        """Test files of exited workers are merged into the aggregate once and removed."""
+        labels = (('route', '/x/'),)
+        for pid in (999999991, 999999992):
+            dead = MetricsRegistry()
+            dead.inc('sysnyx_db_queries_total', labels, 2)
+            dead.observe('sysnyx_http_request_duration_seconds', labels, 0.2)
+            (tmp_path / f'metrics-{pid}-1.json').write_text(json.dumps(_as_file(*dead.collect())))
+        local = MetricsRegistry()
+        local.inc('sysnyx_db_queries_total', labels, 3)
+        
+        for _ in range(2):
+            counters, histograms = collect_all(local, tmp_path)
+            assert counters[('sysnyx_db_queries_total', labels)] == 7
+            assert histograms[('sysnyx_http_request_duration_seconds', labels)][-1] == 2
+        assert sorted(path.name for path in tmp_path.glob('metrics-*.json')) == sorted([
+            'metrics-aggregate.json', _metrics_path(tmp_path, local).name
+        ])
+    
+    def test_endpoint_fails_closed_without_token(self, settings):
+        """Test /metrics is refused when no token is configured, unless DEBUG is on."""
+        assert self.client.get('/metrics').status_code == 403
+        settings.DEBUG = True
+        assert self.client.get('/metrics').status_code == 200
+    
+    def test_endpoint_requires_token_when_set(self, settings):
+        """Test the scrape endpoint and its bearer token."""
+        settings.DEBUG = True
+        self.client.get('/api/sync/changes/?since=abc')
+        response = self.client.get('/metrics')
+        assert response.status_code == 200
+        assert response['Content-Type'].startswith('text/plain; version=0.0.4')
+        assert b'sysnyx_http_requests_total{method="GET",route="/api/sync/changes/",status="422"} 1' in response.content
+        
+        settings.DEBUG = False
+        settings.METRICS_TOKEN = 'scrape-secret'
+        scraper = APIClient()
+        assert scraper.get('/metrics').status_code == 403
+        scraper.credentials(HTTP_AUTHORIZATION='Bearer scrape-secret')
+        assert scraper.get('/metrics').status_code == 200
+
+
+@pytest.mark.django_db
+class TestSlowQuerySampler:
+    """Tests for slow-query sampling."""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        settings.SLOW_QUERY_ENABLED = True
+        settings.SLOW_QUERY_THRESHOLD_MS = 0
+        settings.SLOW_QUERY_SAMPLE_RATE = 1.0
+        settings.SLOW_QUERY_BUFFER_SIZE = 3
+        cache.clear()
+        local_cache().clear()
+        self.staff = User.objects.create_user(username='staff-slowq', password='pass', is_staff=True)
+        self.reader = User.objects.create_user(username='reader-slowq', password='pass')
+        clear_samples()
+    
+    def test_sample_has_sql_params_call_site_and_plan(self):
+        """Test a slow query is captured with its context."""
+        User.objects.filter(username='reader-slowq').first()
+        sample = recent_samples()[0]
+        
+        assert 'auth_user' in sample['sql']
+        assert sample['params'][0] == '<str len=12>'
+        assert sample['call_site'][0].startswith('sysnyx/tests.py:')
+        assert sample['plan'] and 'EXPLAIN failed' not in sample['plan'][0]
+    
+    def test_secrets_are_not_sampled(self, settings):
+        """Test token values stay out of params, SQL and plans unless raw capture is on."""
+        token = Token.objects.create(user=self.reader)
+        clear_samples()
+        Token.objects.filter(key=token.key).first()
+        User.objects.raw(f"SELECT * FROM auth_user WHERE username = '{token.key}'")[:1]
+        assert token.key not in json.dumps(recent_samples())
+        
+        settings.SLOW_QUERY_CAPTURE_PARAMS = True
+        Token.objects.filter(key=token.key).first()
+        assert recent_samples()[0]['params'][0] == repr(token.key)
+    
+    def test_buffer_is_bounded(self, settings):
+        """Test only the newest samples are kept."""
+        for pk in range(5):
+            User.objects.filter(pk=pk).exists()
+        samples = recent_samples()
+        assert len(samples) == 3
+        assert samples[0]['seq'] > samples[1]['seq'] > samples[2]['seq']
+        
+        settings.SLOW_QUERY_ENABLED = False
+        User.objects.filter(pk=1).exists()
+        assert recent_samples() == samples
+    
+    def test_request_context(self):
+        """Test samples name the request that issued them."""
+        token = Token.objects.create(user=self.reader)
+        clear_samples()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        client.get('/api/sync/changes/?since=abc')
+        
+        request = recent_samples()[0]['request']
+        assert request == {'method': 'GET', 'path': '/api/sync/changes/', 'view': 'sync-changes'}
+    
+    def test_staff_view(self):
+        """Test only staff can read and clear the buffer."""
+        User.objects.filter(pk=1).exists()
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        assert client.get('/api/diagnostics/slow-queries/').status_code == 403
+        
+        client.force_authenticate(self.staff)
+        response = client.get('/api/diagnostics/slow-queries/')
+        assert response.status_code == 200
+        assert response.data['enabled'] is True
+        assert len(response.data['samples']) == 1
+        
+        assert client.delete('/api/diagnostics/slow-queries/').status_code == 204
+        assert client.get('/api/diagnostics/slow-queries/').data['samples'] == []
+
+
+class TestStartup:
+    """Tests for cold-start tooling and lazily loaded dependencies."""
+    
+    def loaded(self, code, modules):
+        _, completed = run(('-c', f'{code}; import sys; print(*[m in sys.modules for m in {modules!r}])'))
+        return dict(zip(modules, completed.stdout.split()))
+    
+    def test_setup_skips_heavy_imports(self):
+        """Test Django setup loads neither Celery, DRF's serializers nor Stripe."""
+        loaded = self.loaded('import django; django.setup()', ['celery', 'rest_framework.serializers', 'stripe'])
+        assert set(loaded.values()) == {'False'}
+    
+    def test_worker_boot_skips_web_stack(self):
+        """Test a Celery worker registers its tasks without importing views, DRF or Stripe."""
+        loaded = self.loaded(
+            'from sysnyx.celery import app; app.loader.import_default_modules(); '
+            'assert "audit.tasks.verify_audit_chain" in app.tasks',
+            ['rest_framework.serializers', 'billing.views', 'stripe']
+        )
+        assert set(loaded.values()) == {'False'}
+    
+    def test_celery_app_export(self):
+        """Test the project package still exposes the Celery app tasks are bound to."""
+        from sysnyx import celery_app
+        from sync.tasks import prune_sync_changes
+        assert prune_sync_changes.app is celery_app
+    
+    def test_stripe_sdk_configured_on_first_use(self, settings):
+        """Test the Stripe SDK is imported once and given the secret key."""
+        settings.STRIPE_SECRET_KEY = 'sk_test_startup'
+        stripe_sdk.cache_clear()
+        try:
+            assert stripe_sdk() is stripe_sdk()
+            assert stripe_sdk().api_key == 'sk_test_startup'
+        finally:
+            stripe_sdk.cache_clear()
+    
+    def test_parse_importtime(self):
+        """Test -X importtime output is parsed with nesting depth."""
+        stderr = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |     json.decoder\n'
+            'import time:       300 |        420 |   json\n'
+            'import time:        50 |        470 | sysnyx.renderers\n'
+        )
+        entries = parse_importtime(stderr)
+        assert entries == [('json.decoder', 120, 120, 2), ('json', 300, 420, 1), ('sysnyx.renderers', 50, 470, 0)]
+        assert by_package(entries) == [('json', 420, 2), ('sysnyx', 50, 1)]
+
+
+class FakeRedisClient:
+    """Dict-backed stand-in for Django's RedisCacheClient, counting reads."""
+    
+    def __init__(self):
+        self.data = {}
+        self.reads = 0
+        self.published = []
+    
+    def get(self, key, default):
+        self.reads += 1
+        return self.data.get(key, default)
+    
+    def get_many(self, keys):
+        self.reads += 1
+        return {key: self.data[key] for key in keys if key in self.data}
+    
+    def set(self, key, value, timeout):
+        self.data[key] = value
+    
+    def add(self, key, value, timeout):
+        return self.data.setdefault(key, value) is value
+    
+    def incr(self, key, delta):
+        self.data[key] += delta
+        return self.data[key]
+    
+    def delete(self, key):
+        return self.data.pop(key, None) is not None
+    
+    def get_client(self, write=False):
+        return self
+    
+    def publish(self, channel, message):
+        self.published.append(message)
+    
+    def pubsub(self, **kwargs):
+        raise RedisConnectionError('no pub/sub in tests')
+
+
+class TestTwoTierCache:
+    """Tests for the in-process tier in front of Redis."""
+    
+    def backend(self, location, **options):
+        options.setdefault('LOCAL_PREFIXES', ['hot:'])
+        options.setdefault('RETRY_INTERVAL', 60)
+        return TwoTierCache(location, {'OPTIONS': options})
+    
+    def with_fake_redis(self, location):
+        backend = self.backend(location)
+        backend.__dict__['_cache'] = FakeRedisClient()
+        return backend, backend._cache
+    
+    def test_lru_bounds_expiry_and_copies(self, monkeypatch):
+        """Test the local store evicts, expires and hands out copies."""
+        store = LocalLRU(max_entries=2)
+        store.set('a', [1], None)
+        store.set('b', 2, None)
+        store.get('a').append(99)
+        store.set('c', 3, None)
+        assert store.get('a') == [1]
+        assert store.get('b') is None
+        
+        store.set('d', 4, 5)
+        now = time.monotonic()
+        monkeypatch.setattr(time, 'monotonic', lambda: now + 6)
+        assert store.get('d') is None
+    
+    def test_prefixed_keys_are_served_locally(self):
+        """Test only keys under LOCAL_PREFIXES skip Redis on repeat reads."""
+        backend, remote = self.with_fake_redis('redis://two-tier-local/0')
+        backend.set('hot:version', 7)
+        backend.set('cold:value', 8)
+        reads = remote.reads
+        assert [backend.get('hot:version') for _ in range(3)] == [7, 7, 7]
+        assert remote.reads == reads
+        assert [backend.get('cold:value') for _ in range(3)] == [8, 8, 8]
+        assert remote.reads == reads + 3
+        assert backend.get_many(['hot:version', 'cold:value']) == {'hot:version': 7, 'cold:value': 8}
+        assert remote.reads == reads + 4
+    
+    def test_writes_publish_and_messages_invalidate(self):
+        """Test writes announce the key and other processes' messages drop it."""
+        backend, remote = self.with_fake_redis('redis://two-tier-invalidate/0')
+        backend.set('hot:version', 1)
+        made_key = backend.make_key('hot:version')
+        assert remote.published == [f'{backend._tier.origin}|{made_key}']
+        
+        # Another process changed it
+        remote.data[made_key] = 2
+        backend.invalidated(remote.published[0].encode())
+        assert backend.get('hot:version') == 1
+        backend.invalidated(f'elsewhere|{made_key}'.encode())
+        assert backend.get('hot:version') == 2
+        
+        backend.set('cold:value', 3)
+        assert len(remote.published) == 1
+    
+    def test_falls_back_to_local_only_when_redis_is_down(self, caplog):
+        """Test an unreachable Redis degrades to process memory instead of raising."""
+        get_registry().clear()
+        backend = self.backend('redis://127.0.0.1:1/0', socket_connect_timeout=0.2)
+        assert backend.get('cold:value', 'default') == 'default'
+        assert backend.degraded
+        assert 'Redis cache unavailable' in caplog.text
+        
+        backend.set('cold:value', 1)
+        assert backend.get('cold:value') == 1
+        assert backend.add('counter', 10) is True
+        assert backend.add('counter', 0) is False
+        assert backend.incr('counter', 5) == 15
+        assert backend.delete('cold:value') is True
+        assert backend.get('cold:value') is None
+        counters, _ = get_registry().collect()
+        assert counters[('sysnyx_cache_fallbacks_total', ())] >= 7
+    
+    def test_recovery_drops_local_only_entries(self):
+        """Test values written while Redis was down don't shadow Redis once it is back."""
+        backend, remote = self.with_fake_redis('redis://two-tier-recovery/0')
+        backend._went_down(RedisConnectionError('gone'))
+        backend.set('cold:value', 'local')
+        assert backend.get('cold:value') == 'local'
+        assert remote.data == {}
+        
+        backend._tier.down_until = 0
+        remote.data[backend.make_key('cold:value')] = 'shared'
+        assert backend.get('cold:value') == 'shared'
+        assert not backend.degraded
+        assert len(backend._tier.store) == 0
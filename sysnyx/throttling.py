@@ -0,0 +1,252 @@
+"""
+Per-device token-bucket throttling for tap endpoints.
+
+Buckets are keyed on the authenticated principal and the device, and sized
+by client type: readers, staff and guest apps. Readers commonly share one
+service account (and so one token), so authenticated clients get a bucket
+per user and device: the device bound to their credential when there is
+one (as on guest sessions), otherwise their X-Device-ID. Every user also
+has an aggregate bucket across all of its devices, sized by
+DEVICE_THROTTLE_USER_RATES and DEVICE_THROTTLE_USER_BURST, so inventing
+device IDs never buys more than the user's cap. Anonymous clients get one
+bucket per IP.
+
+Buckets live in process memory, so an ordinary request costs no cache
+round trip. Every DEVICE_THROTTLE_SYNC_INTERVAL seconds a bucket reports
+what it consumed to a shared bucket in the cache and adopts the shared
+balance. On Redis this is one atomic Lua script; other backends use a plain
+read-modify-write. New buckets first sync at a random point within their
+first interval rather than all at once. Between syncs each process can
+overspend a device's balance by at most what it admits in one interval.
+"""
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+
+SYNC_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local consumed = tonumber(ARGV[3])
+local ttl = tonumber(ARGV[4])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate) - consumed
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], ttl)
+return tostring(tokens)
+"""
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """
+    Parse '600/min' style rates into tokens per second.
+    """
+    count, period = rate.split('/')
+    return int(count) / PERIODS[period[0]]
+
+
+class TokenBucket:
+    """A local token bucket that tracks consumption not yet synced."""
+    __slots__ = ('capacity', 'rate', 'tokens', 'updated', 'pending', 'synced_at')
+
+    def __init__(self, capacity, rate, now):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = float(capacity)
+        self.updated = now
+        self.pending = 0
+        self.synced_at = now
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self, now):
+        self.refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            self.pending += 1
+            return True
+        return False
+
+    def refund(self):
+        """Return a token taken for a request another bucket refused."""
+        self.tokens = min(self.capacity, self.tokens + 1)
+        self.pending -= 1
+
+    def wait(self):
+        """Seconds until the next token."""
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class BucketRegistry:
+    """Process-local buckets, least recently used evicted past ``maxsize``."""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def get(self, key, capacity, rate, now, interval=0.0):
+        # Called with self.lock held
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(capacity, rate, now)
+            # Spread first syncs so a wave of new buckets doesn't hit the cache together
+            bucket.synced_at = now - random.uniform(0, interval)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def clear(self):
+        with self.lock:
+            self._buckets.clear()
+
+
+_registry = BucketRegistry()
+_scripts = {}
+
+
+def _redis_client():
+    """The raw redis client behind the default cache, or None for other backends."""
+    backend = getattr(cache, '_cache', None)
+    get_client = getattr(backend, 'get_client', None)
+    if get_client is None or not hasattr(backend, '_client'):
+        return None
+    return get_client(write=True)
+
+
+def sync_shared(key, capacity, rate, consumed):
+    """
+    Report local consumption to the shared bucket.
+
+    Returns:
+        float or None: The shared balance, or None if the cache is unavailable
+    """
+    ttl = int(capacity / rate) + 60
+    try:
+        client = _redis_client()
+        if client is not None:
+            script = _scripts.get(id(client))
+            if script is None:
+                script = _scripts[id(client)] = client.register_script(SYNC_SCRIPT)
+            return float(script(keys=[key], args=[capacity, rate, consumed, ttl]))
+
+        now = time.time()
+        state = cache.get(key) or {'tokens': float(capacity), 'ts': now}
+        tokens = min(capacity, state['tokens'] + max(0.0, now - state['ts']) * rate) - consumed
+        cache.set(key, {'tokens': tokens, 'ts': now}, ttl)
+        return tokens
+    except Exception:
+        # Fall back to local limits alone rather than failing the request
+        logger.warning('Could not sync throttle bucket %s', key, exc_info=True)
+        return None
+
+
+class DeviceTokenBucketThrottle(BaseThrottle):
+    """
+    Token bucket per device and client type, under a cap per user.
+
+    Rates come from DEVICE_THROTTLE_RATES (refill) and DEVICE_THROTTLE_BURST
+    (capacity), keyed by 'reader', 'staff' and 'guest'; the per-user caps
+    from DEVICE_THROTTLE_USER_RATES and DEVICE_THROTTLE_USER_BURST.
+    """
+    registry = None
+
+    def client_type(self, request):
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return 'guest'
+        return 'staff' if user.is_staff else 'reader'
+
+    def device_ident(self, request):
+        """
+        Bucket identity: the authenticated principal and its device.
+
+        A device bound to the credential (a ``device_id`` on ``request.auth``)
+        wins over the X-Device-ID header. Anonymous clients are keyed on IP.
+        """
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return f'ip:{self.get_ident(request)}'
+        device_id = (
+            getattr(getattr(request, 'auth', None), 'device_id', '')
+            or request.META.get('HTTP_X_DEVICE_ID', '').strip()[:100]
+        )
+        if device_id:
+            return f'user:{user.pk}:device:{device_id}'
+        return f'user:{user.pk}'
+
+    def allow_request(self, request, view):
+        kind = self.client_type(request)
+        registry = self.registry or _registry
+        allowed, self.bucket = self._take(
+            registry,
+            f'throttle:device:{kind}:{self.device_ident(request)}',
+            settings.DEVICE_THROTTLE_BURST[kind],
+            parse_rate(settings.DEVICE_THROTTLE_RATES[kind]),
+        )
+        if not allowed:
+            return False
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return True
+
+        # However many devices it claims, a user stays within its cap
+        allowed, user_bucket = self._take(
+            registry,
+            f'throttle:user:{kind}:{user.pk}',
+            settings.DEVICE_THROTTLE_USER_BURST[kind],
+            parse_rate(settings.DEVICE_THROTTLE_USER_RATES[kind]),
+        )
+        if allowed:
+            return True
+        with registry.lock:
+            self.bucket.refund()
+        self.bucket = user_bucket
+        return False
+
+    def _take(self, registry, key, capacity, rate):
+        """
+        Take a token from one bucket.
+
+        Returns:
+            tuple: (allowed, bucket)
+        """
+        now = time.monotonic()
+        interval = settings.DEVICE_THROTTLE_SYNC_INTERVAL
+
+        with registry.lock:
+            bucket = registry.get(key, capacity, rate, now, interval)
+            if now - bucket.synced_at < interval:
+                return bucket.consume(now), bucket
+            consumed, bucket.pending = bucket.pending, 0
+            bucket.synced_at = now
+
+        # Due for a sync: adopt the shared balance before deciding
+        shared = sync_shared(key, capacity, rate, consumed)
+        with registry.lock:
+            now = time.monotonic()
+            if shared is not None:
+                # Requests admitted while syncing still count against it
+                bucket.tokens = min(capacity, shared - bucket.pending)
+                bucket.updated = now
+            return bucket.consume(now), bucket
+
+    def wait(self):
+        return self.bucket.wait()
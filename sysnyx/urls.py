@@ -4,6 +4,7 @@ URL configuration for sysnyx project.
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.authtoken.views import obtain_auth_token
+from .views import metrics, slow_queries
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -11,4 +12,8 @@ urlpatterns = [
     path('api/services/', include('services.urls')),
     path('api/billing/', include('billing.urls')),
     path('api/payments/', include('payments.urls')),
+    path('api/audit/', include('audit.urls')),
+    path('api/sync/', include('sync.urls')),
+    path('api/diagnostics/slow-queries/', slow_queries, name='slow-queries'),
+    path('metrics', metrics, name='metrics'),
 ]
@@ -0,0 +1,54 @@
+"""
+Project-level views.
+"""
+import hmac
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from .metrics import collect_all, render
+from .slowqueries import clear_samples, recent_samples
+
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint.
+
+    GET /metrics
+    Scrapers must send ``Authorization: Bearer <METRICS_TOKEN>``. Without a
+    token configured the endpoint is only open when DEBUG is on.
+    """
+    if request.method != 'GET':
+        return HttpResponse(status=405, headers={'Allow': 'GET'})
+    if settings.METRICS_TOKEN:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(supplied.encode(), settings.METRICS_TOKEN.encode()):
+            return HttpResponse(status=403)
+    elif not settings.DEBUG:
+        return HttpResponse(status=403)
+    counters, histograms = collect_all()
+    return HttpResponse(
+        render(counters, histograms),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def slow_queries(request):
+    """
+    Sampled slow queries, most recent first (staff only).
+
+    GET /api/diagnostics/slow-queries/
+    DELETE /api/diagnostics/slow-queries/ empties the buffer.
+    """
+    if request.method == 'DELETE':
+        clear_samples()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    return Response({
+        'enabled': settings.SLOW_QUERY_ENABLED,
+        'threshold_ms': settings.SLOW_QUERY_THRESHOLD_MS,
+        'samples': recent_samples(),
+    })